@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import string
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures')
+
+
+def load_fixture(filename):
+    """ Return the content of a fixture file
+    """
+    with open(os.path.join(FIXTURES_DIR, filename), 'r') as f:
+        return f.read()
+
+
+def generate_versions(package, nb_versions=40):
+    """ Return a list of versions for a package, always the same for a package
+    """
+    rand = random.Random(package)
+    versions = set()
+    while len(versions) < nb_versions:
+        parts = [rand.randint(0, 5), rand.randint(0, 25)]
+        if rand.random() < 0.7:
+            parts.append(rand.randint(0, 40))
+        versions.add('.'.join(str(part) for part in parts))
+
+    return sorted(versions)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """ Serve the fixture pages: /<site>/<package>/ returns a listing of the files of package
+    with the template of site (apache or sourceforge)
+    """
+
+    templates = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _get_template(self, name):
+        if name not in FixtureRequestHandler.templates:
+            FixtureRequestHandler.templates[name] = string.Template(load_fixture(name + '.html'))
+        return FixtureRequestHandler.templates[name]
+
+    def _render(self, site, package, path):
+        versions = generate_versions(package)
+        row = self._get_template(site + '_row')
+        rows = []
+        for version in versions:
+            filename = '{}-{}.tar.gz'.format(package, version)
+            rows.append(row.substitute(package=package, version=version, filename=filename))
+
+        return self._get_template(site).substitute(package=package, path=path, rows='\n'.join(rows), latest=versions[-1])
+
+    def do_GET(self):
+        path = self.path.split('?')[0].strip('/')
+        parts = path.split('/')
+
+        if len(parts) >= 2 and parts[0] in ['apache', 'sourceforge']:
+            content = self._render(parts[0], parts[1], path)
+        elif len(parts) >= 2 and parts[0] == 'home':
+            content = '<html><body><h1>{0}</h1><a href="/about">About</a> <a href="/news">News</a></body></html>'.format(parts[1])
+        else:
+            content = '<html><body><a href="/">Home</a></body></html>'
+
+        data = content.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FixtureServer(object):
+    """ Local HTTP server serving the fixture pages in a thread
+    """
+
+    def __init__(self, handler=FixtureRequestHandler):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._thread = None
+
+    def get_base_url(self):
+        """ Return the base URL of the server
+        """
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
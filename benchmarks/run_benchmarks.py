@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import io
+import json
+import time
+import getopt
+import shutil
+import logging
+import platform
+import tempfile
+import statistics
+import contextlib
+from datetime import datetime
+
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root_dir)
+
+import imp
+imp.load_module('spksrc_updater', *imp.find_module('lib', [root_dir]))
+
+from spksrc_updater.config import Config
+from spksrc_updater.cache import Cache
+from spksrc_updater.packages_manager import PackagesManager
+from spksrc_updater.package_search_update import PackageSearchUpdate
+from spksrc_updater.content_matcher import ContentMatcher
+from spksrc_updater.makefile_parser.makefile_parser import MakefileParser
+
+from benchmarks.tree_generator import generate_tree
+from benchmarks.fixture_server import FixtureServer, load_fixture, generate_versions
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Benchmarks(object):
+
+    def __init__(self, work_dir, nb_packages=100, nb_crawled=20, repeat=5):
+        """ Initialize the benchmarks and generate the synthetic spksrc tree
+        """
+        self._work_dir = work_dir
+        self._nb_packages = nb_packages
+        self._nb_crawled = nb_crawled
+        self._repeat = repeat
+        self._results = {}
+
+        self._server = FixtureServer()
+        self._server.start()
+
+        self._spksrc_dir = os.path.join(self._work_dir, 'spksrc')
+        self._packages = generate_tree(self._spksrc_dir, nb_packages, self._server.get_base_url())
+        self._packages_not_spk = [p for p in self._packages if not p.startswith('spk/')]
+
+        Config.set('spksrc_git_dir', self._spksrc_dir + os.path.sep)
+        Config.set('work_dir', self._work_dir)
+        Config.set('nb_jobs', 1)
+        # The fixture server is local: measure the code, not the politeness delays
+        Config.set('scheduler_enabled', False)
+        # Measure the crawl of the pages
+        Config.set('probe_enabled', False)
+
+    def close(self):
+        self._server.stop()
+
+    def get_results(self):
+        return self._results
+
+    def measure(self, name, func, setup=None, repeat=None):
+        """ Run func several times and save the durations in seconds
+        """
+        durations = []
+        for _ in range(repeat or self._repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+            durations.append(time.perf_counter() - start)
+
+        self._results[name] = {
+            'runs': len(durations),
+            'min': min(durations),
+            'mean': statistics.mean(durations),
+            'median': statistics.median(durations),
+            'max': max(durations),
+        }
+        _LOGGER.info("%-40s min: %.6fs mean: %.6fs", name, self._results[name]['min'], self._results[name]['mean'])
+
+    def _clear_cache(self):
+        MakefileParser.clear_includes_cache()
+        shutil.rmtree(Config.get('cache_dir'), ignore_errors=True)
+
+    def bench_parse_file(self):
+        def func():
+            MakefileParser.clear_includes_cache()
+            for package in self._packages:
+                MakefileParser().parse_file(os.path.join(self._spksrc_dir, package, 'Makefile'))
+
+        self.measure('parse_file', func)
+
+    def bench_packages_manager_initialize(self):
+        def func():
+            Config.set('cache_enabled', False)
+            PackagesManager().initialize([])
+            Config.set('cache_enabled', True)
+
+        self.measure('packages_manager_initialize', func, self._clear_cache)
+
+    def _search_updates_common(self):
+        for package in self._packages_not_spk[0:self._nb_crawled]:
+            search_update = PackageSearchUpdate(package, os.path.join(self._spksrc_dir, package, 'Makefile'))
+            search_update._search_updates_common()
+
+    def bench_search_updates_common(self):
+        # Download the pages from the local server and match the filenames
+        def func():
+            Config.set('cache_enabled', False)
+            self._search_updates_common()
+            Config.set('cache_enabled', True)
+
+        self.measure('search_updates_common_crawl', func, self._clear_cache)
+
+        # Match the filenames in the pages saved in cache
+        self._search_updates_common()
+        self.measure('search_updates_common_match', self._search_updates_common)
+
+    def bench_search_replay(self):
+        # Record the responses of the local server once, then match the pages replayed without network
+        archive = os.path.join(self._work_dir, 'transport.sqlite')
+        Config.set('transport_archive', archive)
+        Config.set('cache_enabled', False)
+        try:
+            for mode in ['record', 'replay']:
+                Config.set('transport_mode', mode)
+                PackageSearchUpdate._transport = None
+                if mode == 'record':
+                    self._search_updates_common()
+                else:
+                    self.measure('search_updates_common_replay', self._search_updates_common)
+        finally:
+            Config.set('transport_mode', 'live')
+            PackageSearchUpdate._transport = None
+            Config.set('cache_enabled', True)
+
+    def bench_content_match(self):
+        # Search the filenames in raw pages: a listing and adversarial pages for a backtracking regex
+        matcher = ContentMatcher('zlib-XXXVERXXX.tar.gz', PackageSearchUpdate.extensions_to_download)
+        pages = {
+            'listing': ''.join('<a href="/pub/zlib-{0}.tar.gz">zlib-{0}.tar.gz</a>\n'.format(v) for v in generate_versions('zlib', 2000)),
+            'long_versions': ('zlib-' + '1.' * 40 + 'x ') * 2000,
+            'long_words': 'a' * 1000000 + ' zlib-1.2.11.tar.gz',
+        }
+
+        for name, content in sorted(pages.items()):
+            self.measure('content_match_' + name, lambda: list(matcher.finditer(content)))
+
+    def bench_ftp_list(self):
+        lines = load_fixture('ftp_list.txt').splitlines() * 100
+
+        self.measure('ftp_list_parse', lambda: PackageSearchUpdate._parse_ftp_list(lines))
+
+    def bench_cache(self):
+        self._clear_cache()
+        manager = PackagesManager()
+        manager.initialize([])
+        cache = Cache(dir=os.path.join(self._work_dir, 'bench_cache'))
+        packages = manager._packages
+
+        self.measure('cache_save', lambda: cache.save('packages.pkl', packages))
+        self.measure('cache_load', lambda: cache.load('packages.pkl'))
+
+    def bench_graph(self):
+        self._clear_cache()
+        manager = PackagesManager()
+        manager.initialize([])
+        packages_spk = [p for p in self._packages if p.startswith('spk/')]
+
+        def pprint_deps():
+            for package in packages_spk:
+                manager.pprint_deps(package)
+
+        def pprint_parent_deps():
+            for package in self._packages_not_spk:
+                manager.pprint_parent_deps(package)
+
+        self.measure('pprint_deps', pprint_deps)
+        self.measure('pprint_parent_deps', pprint_parent_deps)
+        self.measure('pprint_unused', manager.pprint_unused)
+
+    def run(self, names=None):
+        """ Run all the benchmarks or only the benchmarks in names
+        """
+        for attr in sorted(dir(self)):
+            if attr.startswith('bench_') and (not names or attr[6:] in names):
+                getattr(self, attr)()
+
+
+def compare(results, baseline, threshold):
+    """ Print the ratio between results and baseline and return the list of regressions
+    """
+    regressions = []
+    print("{:<40} {:>12} {:>12} {:>8}".format("Benchmark", "Baseline", "Current", "Ratio"))
+    for name, result in sorted(results['benchmarks'].items()):
+        if name not in baseline['benchmarks']:
+            continue
+        base = baseline['benchmarks'][name]['min']
+        ratio = result['min'] / base if base > 0 else 1
+        state = ''
+        if ratio > threshold:
+            regressions.append(name)
+            state = ' REGRESSION'
+        print("{:<40} {:>11.6f}s {:>11.6f}s {:>7.2f}x{}".format(name, base, result['min'], ratio, state))
+
+    return regressions
+
+
+def help():
+    print("""
+Benchmarks of spksrc-updater on a synthetic spksrc tree.
+
+Usage:
+  run_benchmarks.py [options] [benchmark ...]
+
+Benchmarks:
+  parse_file, packages_manager_initialize, search_updates_common, search_replay, content_match, ftp_list, cache, graph
+
+Parameters:
+    -h --help                               Show this screen.
+    -n --packages=<number>                  Number of packages generated (Default: 100)
+    -c --crawled=<number>                   Number of packages crawled by search_updates_common (Default: 20)
+    -r --repeat=<number>                    Number of runs for each benchmark (Default: 5)
+    -o --output=<file>                      Write the results in a JSON file
+    -b --baseline=<file>                    Compare the results with a JSON file written by --output
+    -t --threshold=<ratio>                  Ratio from which a benchmark is a regression (Default: 1.2)
+    -w --work-dir=<directory>               Work directory (Default: temporary directory)
+""")
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:c:r:o:b:t:w:", [
+            "help",
+            "packages=",
+            "crawled=",
+            "repeat=",
+            "output=",
+            "baseline=",
+            "threshold=",
+            "work-dir=",
+        ])
+    except getopt.GetoptError as error:
+        help()
+        print(error)
+        sys.exit(2)
+
+    nb_packages = 100
+    nb_crawled = 20
+    repeat = 5
+    output = None
+    baseline = None
+    threshold = 1.2
+    work_dir = None
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            help()
+            sys.exit()
+        elif opt in ("-n", "--packages"):
+            nb_packages = int(arg)
+        elif opt in ("-c", "--crawled"):
+            nb_crawled = int(arg)
+        elif opt in ("-r", "--repeat"):
+            repeat = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-b", "--baseline"):
+            baseline = arg
+        elif opt in ("-t", "--threshold"):
+            threshold = float(arg)
+        elif opt in ("-w", "--work-dir"):
+            work_dir = arg
+
+    logging.basicConfig(format="[%(levelname)s]%(message)s", level=logging.INFO)
+    for name in ['spksrc_updater', 'urllib3']:
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    is_tmp_dir = work_dir is None
+    if is_tmp_dir:
+        work_dir = tempfile.mkdtemp(prefix='spksrc-updater-bench-')
+
+    benchmarks = Benchmarks(work_dir, nb_packages, nb_crawled, repeat)
+    try:
+        benchmarks.run(args)
+    finally:
+        benchmarks.close()
+        if is_tmp_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'params': {'packages': nb_packages, 'crawled': nb_crawled, 'repeat': repeat},
+        'benchmarks': benchmarks.get_results(),
+    }
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline:
+        with open(baseline, 'r') as f:
+            regressions = compare(results, json.load(f), threshold)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
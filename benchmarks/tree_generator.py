@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+
+
+MAKEFILE_CROSS = """PKG_NAME = {name}
+PKG_VERS = {version}
+PKG_EXT = tar.gz
+PKG_DIST_NAME = $(PKG_NAME)-$(PKG_VERS).$(PKG_EXT)
+PKG_DIST_SITE = {base_url}/{site}/$(PKG_NAME)
+PKG_DIR = $(PKG_NAME)-$(PKG_VERS)
+
+DEPENDS = {depends}
+
+HOMEPAGE = {base_url}/home/$(PKG_NAME)
+COMMENT  = Synthetic package $(PKG_NAME) generated for benchmarks.
+LICENSE  = GPLv2
+
+GNU_CONFIGURE = 1
+CONFIGURE_ARGS  = --disable-static --enable-shared
+CONFIGURE_ARGS += --with-$(PKG_NAME)-prefix=$(STAGING_INSTALL_PREFIX)
+
+include ../../mk/spksrc.{kind}-cc.mk
+"""
+
+MAKEFILE_SPK = """SPK_NAME = {name}
+SPK_VERS = {version}
+SPK_REV = 1
+SPK_ICON = src/{name}.png
+
+DEPENDS = {depends}
+
+MAINTAINER = SynoCommunity
+DESCRIPTION = Synthetic package $(SPK_NAME) generated for benchmarks.
+DISPLAY_NAME = {name}
+CHANGELOG = "Update to $(SPK_VERS)"
+
+HOMEPAGE = {base_url}/home/$(SPK_NAME)
+LICENSE  = GPLv2
+
+include ../../mk/spksrc.spk.mk
+"""
+
+MK_COMMON = """# Common variables
+comma:= ,
+empty:=
+space:= $(empty) $(empty)
+
+WORK_DIR ?= $(CURDIR)/work$(ARCH_SUFFIX)
+STAGING_INSTALL_PREFIX ?= $(WORK_DIR)/install/usr/local
+DISTRIB_DIR ?= ../../distrib
+PIP ?= pip
+"""
+
+MK_INCLUDE = """include ../../mk/spksrc.common.mk
+
+{variables}
+"""
+
+
+def _generate_version(rand):
+    """ Return a random version with 2 or 3 parts
+    """
+    parts = [rand.randint(0, 4), rand.randint(0, 20)]
+    if rand.random() < 0.7:
+        parts.append(rand.randint(0, 30))
+
+    return '.'.join(str(part) for part in parts)
+
+
+def _generate_mk_variables(rand, prefix, nb_variables):
+    """ Return assignments using the others variables like the spksrc mk files
+    """
+    lines = []
+    for i in range(nb_variables):
+        value = '{}_value_{}'.format(prefix.lower(), i)
+        if i > 0 and rand.random() < 0.5:
+            value += ' $({}_{})'.format(prefix, rand.randrange(i))
+        if rand.random() < 0.1:
+            value += ' $(PKG_NAME)'
+        lines.append('{}_{} ?= {}'.format(prefix, i, value))
+
+    return '\n'.join(lines)
+
+
+def write_file(path, content):
+    """ Write a file and create its parent directories
+    """
+    parent_dir = os.path.dirname(path)
+    if not os.path.exists(parent_dir):
+        os.makedirs(parent_dir)
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def generate_tree(root, nb_packages=100, base_url='http://127.0.0.1:8000', fan_out=4, seed=0):
+    """ Generate a synthetic spksrc tree with nb_packages cross, native and spk packages.
+    Each package depends on at most fan_out packages.
+    Return the list of packages.
+    """
+    rand = random.Random(seed)
+
+    for directory in ['cross', 'native', 'spk', 'toolchains', 'mk']:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    write_file(os.path.join(root, 'mk', 'spksrc.common.mk'), MK_COMMON)
+    for kind, prefix in [('cross-cc', 'CROSS'), ('native-cc', 'NATIVE'), ('spk', 'SPK')]:
+        write_file(os.path.join(root, 'mk', 'spksrc.{}.mk'.format(kind)),
+                   MK_INCLUDE.format(variables=_generate_mk_variables(rand, prefix, 200)))
+
+    nb_native = max(nb_packages // 5, 1)
+    nb_spk = max(nb_packages // 5, 1)
+    nb_cross = max(nb_packages - nb_native - nb_spk, 1)
+
+    sites = ['apache', 'sourceforge']
+    packages = {'cross': [], 'native': [], 'spk': []}
+    for kind, nb in [('native', nb_native), ('cross', nb_cross), ('spk', nb_spk)]:
+        for i in range(nb):
+            name = '{}{:04d}'.format(kind[0], i)
+            package = kind + '/' + name
+
+            # Dependencies are chosen in the cross packages already generated to avoid cycles
+            candidates = packages['cross'] if kind != 'native' else packages['native']
+            depends = rand.sample(candidates, min(len(candidates), rand.randint(0, fan_out)))
+            if kind == 'cross' and packages['native'] and rand.random() < 0.2:
+                depends.append(rand.choice(packages['native']))
+
+            if kind == 'spk':
+                depends = depends or [rand.choice(packages['cross'])]
+                content = MAKEFILE_SPK.format(name=name, version=_generate_version(rand), base_url=base_url,
+                                              depends=' '.join(depends))
+            else:
+                content = MAKEFILE_CROSS.format(name=name, version=_generate_version(rand), base_url=base_url,
+                                                site=rand.choice(sites), kind=kind, depends=' '.join(depends))
+
+            write_file(os.path.join(root, package, 'Makefile'), content)
+            packages[kind].append(package)
+
+    return packages['cross'] + packages['native'] + packages['spk']
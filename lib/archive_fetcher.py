@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import ftplib
+import hashlib
+import logging
+import tempfile
+import threading
+import contextlib
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .ftp_pool import FtpPool
+from .transport import LiveTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ArchiveFetcher(object):
+    """ Download the archives of the packages to compute their digests.
+    An archive is streamed by chunks through all the digest algorithms at once and saved in a cache
+    addressed by its SHA256: the archive of an URL already downloaded is not fetched again.
+    The archives are downloaded with the transport of the searches (HTTP or FTP) and the requests to each host
+    are limited by the scheduler of the searches.
+    """
+
+    # Algorithms of the digests file of spksrc: name in the file => name in hashlib
+    algorithms = [('SHA1', 'sha1'), ('SHA256', 'sha256'), ('MD5', 'md5')]
+
+    def __init__(self, cache_dir, max_parallel=4, chunk_size=65536, timeout=60, transport=None, scheduler=None):
+        self._cache_dir = cache_dir
+        self._max_parallel = max_parallel
+        self._chunk_size = chunk_size
+        self._timeout = timeout
+        self._transport = transport or LiveTransport(requests.Session(), FtpPool(timeout=timeout))
+        self._scheduler = scheduler
+        self._index_path = os.path.join(self._cache_dir, 'index.json')
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _get_index(self):
+        """ Return the index of the URLs downloaded: URL => digests and size of the archive
+        """
+        if self._index is None:
+            self._index = {}
+            if os.path.exists(self._index_path):
+                try:
+                    with open(self._index_path, 'r') as f:
+                        self._index = json.load(f)
+                except ValueError:
+                    _LOGGER.warning("Invalid index of the downloads: %s", self._index_path)
+
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, prefix='.index-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._index_path)
+
+    def get_path(self, sha256):
+        """ Return the path of an archive in the cache
+        """
+        return os.path.join(self._cache_dir, sha256[0:2], sha256)
+
+    @contextlib.contextmanager
+    def _request_slot(self, host):
+        """ Wait for the scheduler to send a request to a host
+        """
+        if self._scheduler is None:
+            yield {'retry_after': None}
+            return
+
+        with self._scheduler.request(host) as slot:
+            yield slot
+
+    def _download(self, url):
+        """ Stream an archive in a temporary file while computing its digests
+        Return the digests (algorithm in hashlib => hex digest) and the size
+        """
+        hashes = {name: hashlib.new(name) for _, name in self.algorithms}
+        sizes = [0]
+        os.makedirs(self._cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, prefix='.download-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                def write(chunk):
+                    for h in hashes.values():
+                        h.update(chunk)
+                    f.write(chunk)
+                    sizes[0] += len(chunk)
+
+                with self._request_slot(urlparse(url).netloc) as slot:
+                    try:
+                        self._transport.retrieve(url, write, self._chunk_size, self._timeout)
+                    except requests.exceptions.HTTPError as e:
+                        # The host can ask to slow down (429/503 with Retry-After)
+                        if self._scheduler:
+                            slot['retry_after'] = self._scheduler.get_retry_after(e.response)
+                        raise
+
+            digests = {name: h.hexdigest() for name, h in hashes.items()}
+            path = self.get_path(digests['sha256'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+        digests['size'] = sizes[0]
+        return digests
+
+    def fetch(self, url):
+        """ Return the digests of the archive of an URL (algorithm in hashlib => hex digest) and its size
+        The archive is only downloaded if it is not in the cache
+        """
+        with self._lock:
+            digests = self._get_index().get(url)
+        if digests and os.path.exists(self.get_path(digests['sha256'])):
+            _LOGGER.debug("Archive in cache: %s", url)
+            return digests
+
+        _LOGGER.info("Download archive: %s", url)
+        digests = self._download(url)
+        with self._lock:
+            self._get_index()[url] = digests
+            self._save_index()
+
+        return digests
+
+    def fetch_all(self, urls):
+        """ Download the archives in parallel
+        Return a dict URL => digests (None if the download failed)
+        """
+        def fetch(url):
+            try:
+                return self.fetch(url)
+            except (requests.exceptions.RequestException, ftplib.Error, OSError, EOFError) as e:
+                _LOGGER.warning("Error to download archive %s: %s", url, e)
+                return None
+
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self._max_parallel, len(urls)))) as executor:
+            return dict(zip(urls, executor.map(fetch, urls)))
+
+    @staticmethod
+    def write_digests(path, filename, digests, old_filename=None):
+        """ Rewrite the digests file of a package: the lines of old_filename (or filename) are replaced by the digests of filename
+        The lines of the other files and the order of the algorithms are kept
+        """
+        names = dict(ArchiveFetcher.algorithms)
+        lines = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+
+        result = []
+        replaced = False
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 3 and parts[0] in (old_filename, filename) and parts[1] in names:
+                result.append('{} {} {}'.format(filename, parts[1], digests[names[parts[1]]]))
+                replaced = True
+            else:
+                result.append(line)
+
+        if not replaced:
+            result += ['{} {} {}'.format(filename, algorithm, digests[name]) for algorithm, name in ArchiveFetcher.algorithms]
+
+        with open(path, 'w') as f:
+            f.write('\n'.join(result) + '\n')
@@ -4,8 +4,10 @@ import os
 import pickle
 import time
 import logging
+import tempfile
 
 from .config import Config
+from .metrics import Metrics
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,6 +17,9 @@ class Cache:
     def __init__(self, **kwargs):
         self._duration = kwargs.get('duration', Config.get("cache_duration"))
         self._dir = kwargs.get('dir', Config.get("cache_dir"))
+        self._metrics = kwargs.get('metrics') or Metrics()
+        # Paths already counted as a cache hit by check()
+        self._checked = set()
 
     def save(self, filename, data):
         """ Save cache in a file
@@ -24,8 +29,17 @@ class Cache:
         if not os.path.exists(parent_dir):
             os.makedirs(parent_dir)
 
-        with open(path, 'wb') as f:
-            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        # The file is replaced atomically: another process or thread can load it during the save
+        with self._metrics.span('cache_save'):
+            fd, tmp_path = tempfile.mkstemp(dir=parent_dir, prefix='.' + os.path.basename(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except:
+                os.remove(tmp_path)
+                raise
         _LOGGER.debug("Save in %s", path)
 
     def check(self, filename, duration=None):
@@ -40,7 +54,10 @@ class Cache:
             mtime = os.path.getmtime(path)
             if (mtime + c_duration) > time.time():
                 _LOGGER.debug("Valid cache for: %s", path)
+                self._metrics.increment('cache_hits')
+                self._checked.add(path)
                 return True
+        self._metrics.increment('cache_misses')
         return False
 
     def load(self, filename, duration=None):
@@ -52,9 +69,14 @@ class Cache:
 
         path = os.path.join(self._dir, filename)
         if not duration and os.path.exists(path) or duration and self.check(filename, duration):
-            with open(path, 'rb') as f:
-                return pickle.load(f)
+            if not duration and path not in self._checked:
+                self._metrics.increment('cache_hits')
+            with self._metrics.span('cache_load'):
+                with open(path, 'rb') as f:
+                    return pickle.load(f)
 
+        if not duration:
+            self._metrics.increment('cache_misses')
         return None
 
     def clear(self, filename):
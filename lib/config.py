@@ -65,6 +65,11 @@ configs = {
         'default': '%work_dir%/cache',
         'type': str
     },
+    'git_mirrors_dir': {
+        'description': 'Directory of the bare mirrors of the git upstreams, shared by the packages',
+        'default': '%work_dir%/git',
+        'type': str
+    },
     'cache_duration': {
         'description': 'Global cache duration',
         'default': '7d',
@@ -84,6 +89,272 @@ configs = {
         'convert': convert_duration
     },
 
+    'parser_max_possibilities': {
+        'description': 'Maximum number of possible values evaluated for a Makefile variable',
+        'default': 256,
+        'type': int
+    },
+    'parser_include_enabled': {
+        'description': 'Parse the files included in Makefiles (mk/*.mk) to get their variables',
+        'default': True,
+        'type': bool
+    },
+
+    'scheduler_enabled': {
+        'description': 'Limit the requests sent to each host by all the jobs',
+        'default': True,
+        'type': bool
+    },
+    'scheduler_rate': {
+        'description': 'Maximum number of requests per second to a host',
+        'default': 2.0,
+        'type': float
+    },
+    'scheduler_burst': {
+        'description': 'Number of requests which can be sent at once to a host before to apply the rate',
+        'default': 4,
+        'type': int
+    },
+    'scheduler_max_in_flight': {
+        'description': 'Maximum number of requests in progress to a host',
+        'default': 2,
+        'type': int
+    },
+    'scheduler_max_retries': {
+        'description': 'Number of retries of a request throttled by a host (code 429 or 503 with Retry-After)',
+        'default': 2,
+        'type': int
+    },
+    'scheduler_retry_after_max': {
+        'description': 'Maximum pause in seconds asked by a host with Retry-After',
+        'default': 120.0,
+        'type': float
+    },
+    'scheduler_lease': {
+        'description': 'Seconds after which a request in progress is no longer counted in flight for its host (e.g. its worker died)',
+        'default': 300.0,
+        'type': float
+    },
+
+    'crawl_max_parallel': {
+        'description': 'Maximum number of sibling pages (e.g. directories of versions) downloaded in parallel for a package',
+        'default': 4,
+        'type': int
+    },
+    'ftp_idle_timeout': {
+        'description': 'Delay in seconds to keep an unused FTP connection open',
+        'default': 60,
+        'type': int
+    },
+    'vcs_max_parallel': {
+        'description': 'Maximum number of git and svn commands (clone, fetch, update, log) running at the same time',
+        'default': 16,
+        'type': int
+    },
+    'vcs_timeout': {
+        'description': 'Timeout in seconds of a git or svn command',
+        'default': 600,
+        'type': int
+    },
+    'transport_mode': {
+        'description': 'Requests of the searches: live, record (save the responses in transport_archive) or replay (only use the responses saved)',
+        'default': 'live',
+        'type': str
+    },
+    'transport_archive': {
+        'description': 'Archive of the responses recorded and replayed',
+        'default': '%work_dir%/transport.sqlite',
+        'type': str
+    },
+    'match_page_budget': {
+        'description': 'Maximum duration in seconds to search the filenames in the content of a page (0 to disable)',
+        'default': 1.0,
+        'type': float
+    },
+    'probe_enabled': {
+        'description': 'Check with HEAD requests if the files of the next versions exist before to crawl the pages',
+        'default': True,
+        'type': bool
+    },
+    'probe_max_rounds': {
+        'description': 'Maximum number of times the next versions of the last version found are probed',
+        'default': 3,
+        'type': int
+    },
+    'probe_timeout': {
+        'description': 'Timeout in seconds of a HEAD request sent to probe a version',
+        'default': 10,
+        'type': int
+    },
+
+    'forge_github_api': {
+        'description': 'URL of the GitHub API to list the tags and releases of github.com packages (Scrap the HTML pages if empty)',
+        'default': 'https://api.github.com',
+        'type': str
+    },
+    'forge_github_token': {
+        'description': 'Token for the GitHub API (Without token, the API is used only if forge_github_anonymous is enabled)',
+        'default': '',
+        'type': str
+    },
+    'forge_github_anonymous': {
+        'description': 'Use the GitHub API without token: limited to 60 requests per hour for all the packages',
+        'default': False,
+        'type': bool
+    },
+    'forge_pypi_api': {
+        'description': 'URL of the PyPI JSON API to list the files of PyPI packages (Scrap the HTML pages if empty)',
+        'default': 'https://pypi.org/pypi',
+        'type': str
+    },
+    'forge_max_pages': {
+        'description': 'Maximum number of pages of a listing of a forge API (e.g. 100 tags by page for GitHub)',
+        'default': 10,
+        'type': int
+    },
+
+    'versions_database': {
+        'description': 'SQLite database with the history of the upstream versions found (Disabled if empty)',
+        'default': '%work_dir%/versions.sqlite',
+        'type': str
+    },
+    'database_since': {
+        'description': 'Date for the new_versions action, e.g. "2018-01-31" or "3 days ago" (Default: versions found by the last run)',
+        'default': '',
+        'type': str
+    },
+    'database_outdated_days': {
+        'description': 'Number of days for the outdated action',
+        'default': 30,
+        'type': int
+    },
+    'schedule_longest_first': {
+        'description': 'Search first the packages with the longest durations in the previous runs (requires versions_database)',
+        'default': True,
+        'type': bool
+    },
+    'schedule_stable_after': {
+        'description': 'Duration without new version after which a package is stable, e.g. "90d" (0 to disable)',
+        'default': 0,
+        'type': int,
+        'convert': convert_duration
+    },
+    'schedule_stable_interval': {
+        'description': 'A stable package is searched again only after this duration, the previous versions are used meanwhile',
+        'default': '7d',
+        'type': int,
+        'convert': convert_duration
+    },
+
+    'shard': {
+        'description': 'Part i/N of the packages searched by this machine, e.g. 2/4 (Disabled if empty)',
+        'default': '',
+        'type': str
+    },
+    'shard_group_deps': {
+        'description': 'Search a package in the same shard as its dependencies and its parents (e.g. to build them)',
+        'default': False,
+        'type': bool
+    },
+    'queue_file': {
+        'description': 'SQLite queue of the packages shared by the workers of the worker action',
+        'default': '',
+        'type': str
+    },
+    'queue_batch_size': {
+        'description': 'Number of packages claimed at once by a worker',
+        'default': 16,
+        'type': int
+    },
+    'queue_lease': {
+        'description': 'Duration after which the packages claimed by a worker which stopped are claimed again',
+        'default': '1h',
+        'type': int,
+        'convert': convert_duration
+    },
+    'results_file': {
+        'description': 'File to save the versions found by the search, to merge them with the merge action (Disabled if empty)',
+        'default': '',
+        'type': str
+    },
+
+    'output_format': {
+        'description': 'Output format of the actions: table, jsonl, csv',
+        'default': 'table',
+        'type': str
+    },
+    'output_file': {
+        'description': 'File to write the output of the actions (stdout if empty)',
+        'default': '',
+        'type': str
+    },
+
+    'report_file': {
+        'description': 'JSON file to write the run report: durations of the phases, packages and hosts',
+        'default': '%work_dir%/report.json',
+        'type': str
+    },
+
+    'prometheus_file': {
+        'description': 'Textfile for the node-exporter with the metrics of the run (Disabled if empty)',
+        'default': '',
+        'type': str
+    },
+
+    'serve_address': {
+        'description': 'Address of the HTTP server of the serve action',
+        'default': '127.0.0.1',
+        'type': str
+    },
+    'serve_port': {
+        'description': 'Port of the HTTP server of the serve action',
+        'default': 8080,
+        'type': int
+    },
+    'serve_socket': {
+        'description': 'Unix socket used by the serve action instead of the HTTP port (Disabled if empty)',
+        'default': '',
+        'type': str
+    },
+    'serve_refresh_interval': {
+        'description': 'Interval between the background refresh of all packages in the serve action (0 to disable)',
+        'default': '1d',
+        'type': int,
+        'convert': convert_duration
+    },
+
+    'watch_interval': {
+        'description': 'Interval in seconds between two checks of the Makefiles in the watch action',
+        'default': 2.0,
+        'type': float
+    },
+    'watch_debounce': {
+        'description': 'Delay in seconds without change before to handle a burst of changes in the watch action',
+        'default': 1.0,
+        'type': float
+    },
+
+    'profile_enabled': {
+        'description': 'Profile the search of each package in the workers with cProfile',
+        'default': False,
+        'type': bool
+    },
+    'profile_dir': {
+        'description': 'Directory for the stats of each profiled package',
+        'default': '%work_dir%/profile',
+        'type': str
+    },
+    'profile_file': {
+        'description': 'File to write the merged stats of the profiled run (.pstats)',
+        'default': '%work_dir%/profile.pstats',
+        'type': str
+    },
+    'profile_top': {
+        'description': 'Number of functions printed in the profile summary',
+        'default': 20,
+        'type': int
+    },
+
     'build_update_deps': {
         'description': 'Update deps before build the current package',
         'default': False,
@@ -99,6 +370,21 @@ configs = {
         'default': False,
         'type': bool
     },
+    'build_digests_enabled': {
+        'description': 'Download the archive of the new version to rewrite the digests file of the package',
+        'default': False,
+        'type': bool
+    },
+    'build_download_dir': {
+        'description': 'Cache of the archives downloaded, addressed by their SHA256',
+        'default': '%work_dir%/downloads',
+        'type': str
+    },
+    'build_download_max_parallel': {
+        'description': 'Maximum number of archives downloaded in parallel',
+        'default': 4,
+        'type': int
+    },
 
     # 'packages': {
     #     'description': 'List of packages in input',
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import string
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ContentMatch(object):
+    """ Result of ContentMatcher with the groups of the regex it replaces: 0, filename, version and extension
+    """
+
+    def __init__(self, start, end, groups):
+        self._start = start
+        self._end = end
+        self._groups = groups
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def group(self, name=0):
+        return self._groups[name]
+
+
+class ContentMatcher(object):
+    """ Find the filenames of a template (e.g. zlib-XXXVERXXX.tar.gz) in the raw content of a page in linear time.
+    The literal text before the version is searched first, then the version is read after each hit
+    without backtracking and the text after the version is matched at the possible ends of the version.
+    """
+
+    marker = 'XXXVERXXX'
+
+    digits = frozenset(string.digits)
+    alnum = frozenset(string.ascii_letters + string.digits)
+    alnum_underscore = frozenset(string.ascii_letters + string.digits + '_')
+    separators = frozenset('._-')
+
+    # Start of a version when there is no text before it in the template
+    regex_version_start = re.compile('(?<![0-9._-])[0-9]')
+    # Other occurrences of the version in the template: bounded to avoid backtracking
+    regex_other_version = '[0-9][0-9a-zA-Z._-]{0,63}'
+
+    def __init__(self, template, extensions, filename_start=0, with_path=True, max_version_length=64, max_path_length=1024):
+        """ template: text with the version replaced by marker
+        extensions: extensions which can replace the extension of the template
+        filename_start: position of the filename in the template (when the template is a path)
+        with_path: include the path (characters [\\w/:]) before the template in the match
+        """
+        self._with_path = with_path
+        self._max_version_length = max_version_length
+        self._max_path_length = max_path_length
+        self.timed_out = False
+
+        position = template.find(self.marker)
+        self._valid = position >= 0
+        if not self._valid:
+            return
+
+        self._prefix = template[0:position]
+        self._filename_in_prefix = filename_start <= position
+        self._filename_offset = filename_start
+
+        rest = template[position + len(self.marker):]
+        rest_filename_start = max(0, filename_start - position - len(self.marker))
+        regex_rest = self._to_regex(rest[0:rest_filename_start], []) + \
+            '(?P<filename>' + self._to_regex(rest[rest_filename_start:], extensions) + ')'
+        self._regex_rest = re.compile(regex_rest)
+
+    def _to_regex(self, text, extensions):
+        """ Return a regex for a text of the template: the first extension found can be replaced by the other extensions
+        """
+        extension_position = None
+        for extension in extensions:
+            index = text.find('.' + extension)
+            if index >= 0 and (extension_position is None or index < extension_position[0]):
+                extension_position = (index, extension)
+
+        if extension_position is None:
+            return re.escape(text).replace(self.marker, self.regex_other_version)
+
+        index, extension = extension_position
+        before = re.escape(text[0:index]).replace(self.marker, self.regex_other_version)
+        after = re.escape(text[index + len(extension) + 1:]).replace(self.marker, self.regex_other_version)
+
+        return before + '\\.(?P<extension>' + '|'.join(re.escape(e) for e in extensions) + ')' + after
+
+    def get_version_ends(self, content, start):
+        """ Return the positions where a version starting at start can end, in ascending order
+        The version has the format of PackageSearchUpdate.regex_version:
+        numbers separated by [._-] with letters before or after a digit, and suffixes -[a-zA-Z0-9_]+
+        """
+        end_max = min(len(content), start + self._max_version_length)
+        i = start
+        while i < end_max and content[i] in self.digits:
+            i += 1
+        if i == start:
+            return []
+        ends = list(range(start + 1, i + 1))
+        # Positions where the suffixes can start
+        suffixes_starts = []
+
+        # Parts separated by [._-]: each part starts or ends with a digit
+        while i + 1 < end_max and content[i] in self.separators:
+            if content[i] == '-':
+                suffixes_starts.append(i)
+            j = i + 1
+            while j < end_max and content[j] in self.alnum:
+                j += 1
+            if j == i + 1:
+                break
+            if content[i + 1] in self.digits:
+                ends.extend(range(i + 2, j + 1))
+            else:
+                ends.extend(p for p in range(i + 2, j + 1) if content[p - 1] in self.digits)
+                if content[j - 1] not in self.digits:
+                    break
+            i = j
+        suffixes_starts.append(i)
+
+        # Suffixes: -beta, -linux_x86
+        visited = set()
+        for i in suffixes_starts:
+            while i + 1 < end_max and content[i] == '-' and i not in visited:
+                visited.add(i)
+                j = i + 1
+                while j < end_max and content[j] in self.alnum_underscore:
+                    j += 1
+                if j == i + 1:
+                    break
+                ends.extend(range(i + 2, j + 1))
+                i = j
+
+        return sorted(set(ends))
+
+    def _get_anchors(self, content):
+        """ Yield the positions of the text before the version
+        """
+        if self._prefix:
+            position = content.find(self._prefix)
+            while position >= 0:
+                yield position
+                position = content.find(self._prefix, position + 1)
+        else:
+            for match in self.regex_version_start.finditer(content):
+                yield match.start()
+
+    def _get_path_start(self, content, position, limit):
+        """ Return the start of the path ([\\w/:]*) before a position, after the limit (end of the previous match)
+        """
+        limit = max(limit, position - self._max_path_length)
+        while position > limit and (content[position - 1].isalnum() or content[position - 1] in '_/:'):
+            position -= 1
+
+        return position
+
+    def finditer(self, content, budget=None):
+        """ Yield the matches (ContentMatch) of the template in content
+        budget: maximum duration in seconds, timed_out is set to True if the search was stopped
+        """
+        self.timed_out = False
+        if not self._valid:
+            return
+
+        deadline = time.perf_counter() + budget if budget else None
+        last_end = 0
+        for anchor in self._get_anchors(content):
+            if anchor < last_end:
+                continue
+            if deadline and time.perf_counter() > deadline:
+                self.timed_out = True
+                _LOGGER.debug("Budget of %.2fs exceeded to match %s", budget, self._prefix)
+                return
+
+            version_start = anchor + len(self._prefix)
+            for version_end in reversed(self.get_version_ends(content, version_start)):
+                match = self._regex_rest.match(content, version_end)
+                if not match:
+                    continue
+
+                start = self._get_path_start(content, anchor, last_end) if self._with_path else anchor
+                if self._filename_in_prefix:
+                    filename = content[anchor + self._filename_offset:match.end()]
+                else:
+                    filename = match.group('filename')
+                last_end = match.end()
+                yield ContentMatch(start, match.end(), {
+                    0: content[start:match.end()],
+                    'filename': filename,
+                    'version': content[version_start:version_end],
+                    'extension': match.groupdict().get('extension'),
+                })
+                break
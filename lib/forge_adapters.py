@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import abc
+import logging
+from urllib.parse import urlparse
+
+from .interning import Interning
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ForgeAdapter(abc.ABC):
+    """ Get the files of a project from the JSON API of a forge instead of scraping its HTML pages.
+    An adapter returns hrefs in the same format as the pages downloaded, so the same regex are used to find the versions.
+    """
+
+    # Hosts handled by the adapter
+    hosts = []
+
+    def __init__(self, api_url, token=None):
+        self._api_url = api_url.rstrip('/')
+        self._token = token
+
+    def get_headers(self):
+        """ Return the headers of the API requests
+        """
+        return {}
+
+    @classmethod
+    def match(cls, url_p):
+        """ Return True if the adapter can handle the URL
+        """
+        return url_p.netloc in cls.hosts
+
+    @abc.abstractmethod
+    def get_api_urls(self, url_p):
+        """ Return the list of API URLs to request: the hrefs found in all of them are merged
+        The next pages of a listing are given by the header Link of the responses
+        """
+
+    @abc.abstractmethod
+    def parse(self, data, url_p):
+        """ Return the hrefs found in the JSON data
+        """
+
+    @staticmethod
+    def _href(href, content=''):
+        return Interning.href(href, content)
+
+    @staticmethod
+    def get_adapter(url, api_urls, tokens=None):
+        """ Return an adapter for the URL or None
+        api_urls: dict with the API URL by adapter name (github, pypi)
+        tokens: dict with the optional token by adapter name
+        """
+        url_p = urlparse(url)
+        for name, cls in ADAPTERS.items():
+            if name in api_urls and cls.match(url_p):
+                return cls(api_urls[name], (tokens or {}).get(name) or None)
+
+        return None
+
+
+class GithubAdapter(ForgeAdapter):
+    """ List the tags and the releases assets of a GitHub repository
+    The files of a package can be the archives of the tags or files attached to the releases
+    """
+
+    hosts = ['github.com']
+
+    def get_headers(self):
+        headers = {'Accept': 'application/vnd.github+json'}
+        if self._token:
+            headers['Authorization'] = 'token ' + self._token
+        return headers
+
+    def _get_repository(self, url_p):
+        path_splitted = [p for p in url_p.path.split('/') if p]
+        if len(path_splitted) < 2:
+            return None
+
+        return path_splitted[0], path_splitted[1]
+
+    def get_api_urls(self, url_p):
+        repository = self._get_repository(url_p)
+        if not repository:
+            return []
+
+        base_url = '{}/repos/{}/{}'.format(self._api_url, *repository)
+        return [base_url + '/tags?per_page=100', base_url + '/releases?per_page=100']
+
+    def parse(self, data, url_p):
+        owner, repo = self._get_repository(url_p)
+        hrefs = []
+        for item in data:
+            if 'assets' in item:
+                # Releases
+                for asset in item['assets']:
+                    hrefs.append(self._href(asset['browser_download_url'], asset['name']))
+                tag = item.get('tag_name')
+            else:
+                # Tags
+                tag = item.get('name')
+
+            if tag:
+                for ext in ['tar.gz', 'zip']:
+                    hrefs.append(self._href('https://github.com/{}/{}/archive/{}.{}'.format(owner, repo, tag, ext), tag))
+
+        return hrefs
+
+
+class PypiAdapter(ForgeAdapter):
+    """ List the files of all releases of a PyPI package
+    """
+
+    hosts = ['files.pythonhosted.org', 'pypi.python.org', 'pypi.org']
+
+    def get_api_urls(self, url_p):
+        path_splitted = [p for p in url_p.path.split('/') if p]
+        if not path_splitted:
+            return []
+
+        # The name of the package is the last directory: /packages/source/p/<name>
+        return ['{}/{}/json'.format(self._api_url, path_splitted[-1])]
+
+    def parse(self, data, url_p):
+        hrefs = []
+        for version, files in data.get('releases', {}).items():
+            for f in files:
+                hrefs.append(self._href(f['url'], f.get('filename', '')))
+
+        return hrefs
+
+
+ADAPTERS = {
+    'github': GithubAdapter,
+    'pypi': PypiAdapter,
+}
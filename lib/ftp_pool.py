@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import ftplib
+import logging
+import threading
+import contextlib
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FtpPool(object):
+    """ Keep the FTP connections open to reuse them for the next listings of the same server.
+    The listings use MLSD when the server supports it, otherwise LIST is parsed.
+    """
+
+    # Unix listing: drwxr-xr-x 2 user group 4096 Jan 01 2018 name
+    regex_list_unix = re.compile(r'^(?P<type>[-dlbcps])[-rwxsStTl]{9}[+@.]?\s+\d+\s+\S+\s+\S+\s+\d+\s+\w{3}\s+\d{1,2}\s+(\d{1,2}:\d{2}|\d{4})\s(?P<name>.+)$')
+    # Unix listing without group: drwxr-xr-x 2 user 4096 Jan 01 2018 name
+    regex_list_unix_nogroup = re.compile(r'^(?P<type>[-dlbcps])[-rwxsStTl]{9}[+@.]?\s+\d+\s+\S+\s+\d+\s+\w{3}\s+\d{1,2}\s+(\d{1,2}:\d{2}|\d{4})\s(?P<name>.+)$')
+    # DOS listing: 01-31-18  10:00AM  <DIR>  name
+    regex_list_dos = re.compile(r'^\d{2}-\d{2}-\d{2,4}\s+\d{1,2}:\d{2}(AM|PM)?\s+(?P<type><DIR>|\d+)\s+(?P<name>.+)$', re.IGNORECASE)
+
+    def __init__(self, timeout=30, idle_timeout=60, max_idle=2):
+        self._timeout = timeout
+        self._idle_timeout = idle_timeout
+        self._max_idle = max_idle
+        # (host, port) => list of (connection, last use)
+        self._idle = {}
+        # (host, port) => True if MLSD is supported
+        self._mlsd = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, host, port, user, password):
+        ftp = ftplib.FTP(timeout=self._timeout)
+        ftp.connect(host, port or 21)
+        ftp.login(user or 'anonymous', password or '')
+        return ftp
+
+    def _get_idle(self, key):
+        """ Return an idle connection still alive or None
+        """
+        while True:
+            with self._lock:
+                connections = self._idle.get(key)
+                if not connections:
+                    return None
+                ftp, last_use = connections.pop()
+
+            if time.time() - last_use > self._idle_timeout:
+                self._close(ftp)
+                continue
+
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except (ftplib.Error, OSError, EOFError):
+                self._close(ftp)
+
+    @staticmethod
+    def _close(ftp):
+        try:
+            ftp.quit()
+        except (ftplib.Error, OSError, EOFError):
+            ftp.close()
+
+    @contextlib.contextmanager
+    def connection(self, host, port=None, user=None, password=None):
+        """ Yield a connection to the server, the connection is kept open for the next call
+        A connection which raised an error is closed
+        """
+        key = (host, port or 21, user)
+        ftp = self._get_idle(key) or self._connect(host, port, user, password)
+        try:
+            yield ftp
+        except:
+            self._close(ftp)
+            raise
+
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self._max_idle:
+                connections.append((ftp, time.time()))
+                ftp = None
+        if ftp:
+            self._close(ftp)
+
+    def list(self, host, path, port=None, user=None, password=None):
+        """ Return the list of entries (name, is_dir) of a directory
+        """
+        key = (host, port or 21)
+        with self.connection(host, port, user, password) as ftp:
+            if self._mlsd.get(key, True):
+                try:
+                    entries = []
+                    # No facts requested: OPTS MLST is not supported by all servers and type is a default fact
+                    for name, facts in ftp.mlsd(path or '/'):
+                        entry_type = facts.get('type', '').lower()
+                        if entry_type in ('cdir', 'pdir') or name in ('.', '..'):
+                            continue
+                        entries.append((name, entry_type == 'dir'))
+                    self._mlsd[key] = True
+                    return entries
+                except ftplib.error_perm as e:
+                    # 500/502: command not supported, keep the connection and use LIST
+                    if not str(e).startswith('50'):
+                        raise
+                    _LOGGER.debug("FTP %s: MLSD not supported, use LIST", host)
+                    self._mlsd[key] = False
+
+            ftp.cwd(path or '/')
+            lines = []
+            ftp.retrlines('LIST', lines.append)
+
+        return self.parse_list(lines)
+
+    def retrieve(self, host, path, callback, port=None, user=None, password=None, blocksize=65536):
+        """ Download a file: callback is called with each block of data
+        """
+        with self.connection(host, port, user, password) as ftp:
+            ftp.retrbinary('RETR ' + path, callback, blocksize)
+
+    @staticmethod
+    def parse_list(lines):
+        """ Parse the lines returned by LIST: return the list of entries (name, is_dir)
+        """
+        entries = []
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('total '):
+                continue
+
+            match = FtpPool.regex_list_unix.match(line) or FtpPool.regex_list_unix_nogroup.match(line)
+            if match:
+                name = match.group('name')
+                is_dir = match.group('type') == 'd'
+                if match.group('type') == 'l' and ' -> ' in name:
+                    # Symbolic link: keep the name, a link to a directory is a directory if it ends by /
+                    name, target = name.split(' -> ', 1)
+                    is_dir = target.endswith('/')
+            else:
+                match = FtpPool.regex_list_dos.match(line)
+                if match:
+                    name = match.group('name')
+                    is_dir = match.group('type').upper() == '<DIR>'
+                else:
+                    # Unknown format: the name is the last column
+                    name = line.split()[-1]
+                    is_dir = line[0] == 'd'
+
+            if name in ('.', '..'):
+                continue
+            entries.append((name, is_dir))
+
+        return entries
+
+    def close(self):
+        """ Close all idle connections
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for ftp, _ in connections:
+                self._close(ftp)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import time
+import asyncio
+import fcntl
+import shutil
+import hashlib
+import logging
+import contextlib
+from urllib.parse import urlparse
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GitMirrors(object):
+    """ Store of bare mirrors of the git upstreams, shared by all the packages.
+    A mirror is keyed by the normalized URL of the remote: the packages using the same upstream use the same mirror.
+    A fork (same host and same repository name) borrows the objects of the mirrors already in the store with
+    alternates, so only the objects which differ are downloaded.
+    The mirrors are never garbage collected: the objects borrowed by a fork can't disappear.
+    The git commands are run by a VcsBackend.
+    """
+
+    # Regex for the scp-like syntax: user@host:path
+    regex_scp_url = re.compile(r'^(?:[\w.-]+@)?(?P<host>[\w.-]+):(?!//)(?P<path>.+)$')
+
+    # Files in a mirror with the normalized URL and the date of the last fetch
+    url_filename = 'spksrc-url'
+    fetched_filename = 'spksrc-fetched'
+
+    def __init__(self, directory, backend):
+        self._directory = directory
+        self._backend = backend
+
+    @staticmethod
+    def normalize_url(url):
+        """ Return the key of a remote: host and path, without scheme, user, .git and trailing slash
+        https://GitHub.com/owner/repo.git/ and git@github.com:owner/repo => github.com/owner/repo
+        """
+        url = url.strip()
+        match = GitMirrors.regex_scp_url.match(url)
+        if match and '://' not in url:
+            host, path = match.group('host'), match.group('path')
+        else:
+            url_p = urlparse(url)
+            host = url_p.hostname or ''
+            if url_p.port:
+                host += ':' + str(url_p.port)
+            path = url_p.path
+
+        path = path.strip('/')
+        if path.endswith('.git'):
+            path = path[:-4]
+
+        return (host.lower() + '/' + path).strip('/')
+
+    def get_path(self, url):
+        """ Return the directory of the mirror of a remote
+        """
+        key = self.normalize_url(url)
+        name = re.sub(r'[^\w.-]+', '_', key)[-80:]
+        return os.path.join(self._directory, name + '-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[0:8] + '.git')
+
+    def exists(self, url):
+        return os.path.exists(os.path.join(self.get_path(url), self.url_filename))
+
+    @contextlib.asynccontextmanager
+    async def _lock(self, path):
+        """ Lock a mirror for the coroutines of the event loop and for the workers of all the processes
+        """
+        os.makedirs(self._directory, exist_ok=True)
+        async with self._backend.lock(path):
+            with open(path + '.lock', 'w') as f:
+                await asyncio.get_running_loop().run_in_executor(None, fcntl.flock, f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_related(self, url):
+        """ Return the paths of the mirrors of the forks of a remote: same host and same repository name
+        """
+        key = self.normalize_url(url)
+        host, name = key.split('/')[0], key.split('/')[-1].lower()
+        related = []
+        if not os.path.isdir(self._directory):
+            return related
+
+        for directory in sorted(os.listdir(self._directory)):
+            path = os.path.join(self._directory, directory)
+            url_path = os.path.join(path, self.url_filename)
+            if not os.path.exists(url_path):
+                continue
+            with open(url_path, 'r') as f:
+                other_key = f.read().strip()
+            if other_key != key and other_key.split('/')[0] == host and other_key.split('/')[-1].lower() == name:
+                related.append(path)
+
+        return related
+
+    async def _create(self, url, path):
+        """ Create the bare mirror of a remote, borrowing the objects of its forks
+        """
+        git = self._backend.git
+        await git('init', '--quiet', '--bare', path)
+        # The objects can be borrowed by other mirrors
+        await git('config', 'gc.auto', '0', cwd=path)
+        await git('config', 'remote.origin.url', url, cwd=path)
+        await git('config', 'remote.origin.fetch', '+refs/heads/*:refs/heads/*', cwd=path)
+        # With an explicit refspec, the tags deleted on the remote are pruned too
+        await git('config', '--add', 'remote.origin.fetch', '+refs/tags/*:refs/tags/*', cwd=path)
+
+        related = self.get_related(url)
+        if related:
+            _LOGGER.info("Mirror of %s borrows the objects of: %s", url, ', '.join(related))
+            with open(os.path.join(path, 'objects', 'info', 'alternates'), 'w') as f:
+                f.write(''.join(os.path.join(os.path.abspath(p), 'objects') + '\n' for p in related))
+
+        # HEAD of the mirror is the default branch of the remote
+        for line in (await git('ls-remote', '--symref', url, 'HEAD', cwd=path)).splitlines():
+            if line.startswith('ref: ') and line.endswith('\tHEAD'):
+                await git('symbolic-ref', 'HEAD', line[5:-5], cwd=path)
+
+    async def update(self, url, since=None):
+        """ Create or fetch the mirror of a remote and return its path
+        The mirror is not fetched again if it was fetched after since (e.g. the start of the run)
+        """
+        path = self.get_path(url)
+        async with self._lock(path):
+            url_path = os.path.join(path, self.url_filename)
+            fetched_path = os.path.join(path, self.fetched_filename)
+            if not os.path.exists(url_path):
+                # Remove a partial mirror
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                try:
+                    await self._create(url, path)
+                    await self._backend.git('fetch', '--quiet', '--prune', '--tags', 'origin', cwd=path)
+                except:
+                    shutil.rmtree(path, ignore_errors=True)
+                    raise
+
+                with open(url_path, 'w') as f:
+                    f.write(self.normalize_url(url) + '\n')
+            elif since is not None and os.path.exists(fetched_path) and os.path.getmtime(fetched_path) >= since:
+                _LOGGER.debug("Mirror of %s already fetched", url)
+                return path
+            else:
+                await self._backend.git('fetch', '--quiet', '--prune', '--tags', 'origin', cwd=path)
+
+            with open(fetched_path, 'w') as f:
+                f.write(str(time.time()) + '\n')
+
+        return path
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+import contextlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HostScheduler(object):
+    """ Limit the requests sent to each host: a token bucket (rate and burst),
+    a maximum of requests in flight and a pause asked by the host (429/503 with Retry-After).
+    The state can be shared between the pool workers with a multiprocessing.Manager dict and lock.
+    A request in flight holds a lease: the slot of a worker which died during a request is freed when its lease expires.
+    """
+
+    # Codes of responses asking to slow down
+    codes_throttled = (429, 503)
+
+    def __init__(self, rate=2.0, burst=4, max_in_flight=2, retry_after_default=10.0, retry_after_max=120.0, lease=300.0, state=None, lock=None):
+        self._rate = rate
+        self._burst = burst
+        self._max_in_flight = max_in_flight
+        self._retry_after_default = retry_after_default
+        self._retry_after_max = retry_after_max
+        self._lease = lease
+        # host => [tokens, last refill, expiration of the leases of the requests in flight, blocked until]
+        self._state = state if state is not None else {}
+        self._lock = lock if lock is not None else threading.Lock()
+
+    @staticmethod
+    def create(config, manager=None):
+        """ Create a scheduler with the options of the configuration
+        The scheduler is shared by the processes if a multiprocessing.Manager is given
+        """
+        kwargs = {
+            'rate': config.get('scheduler_rate'),
+            'burst': config.get('scheduler_burst'),
+            'max_in_flight': config.get('scheduler_max_in_flight'),
+            'retry_after_max': config.get('scheduler_retry_after_max'),
+            'lease': config.get('scheduler_lease')
+        }
+        if manager is not None:
+            kwargs['state'] = manager.dict()
+            kwargs['lock'] = manager.Lock()
+
+        return HostScheduler(**kwargs)
+
+    def _try_acquire(self, host):
+        """ Take a token for the host if possible
+        Return (0, lease) if the request can be sent, otherwise (delay to wait before to try again, None)
+        """
+        with self._lock:
+            now = time.time()
+            tokens, last, leases, blocked_until = self._state.get(host, [self._burst, now, [], 0.0])
+            tokens = min(self._burst, tokens + (now - last) * self._rate)
+            leases = [l for l in leases if l > now]
+
+            lease = None
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif len(leases) >= self._max_in_flight:
+                wait = 0.05
+            elif tokens < 1:
+                wait = (1 - tokens) / self._rate
+            else:
+                tokens -= 1
+                lease = now + self._lease
+                leases.append(lease)
+                wait = 0
+
+            # A manager dict does not see the changes of its values: set the whole value
+            self._state[host] = [tokens, now, leases, blocked_until]
+
+        return wait, lease
+
+    def acquire(self, host):
+        """ Wait until a request can be sent to the host
+        Return the lease of the request to release it
+        """
+        waited = 0.0
+        while True:
+            wait, lease = self._try_acquire(host)
+            if not wait:
+                break
+            wait = min(wait, 1.0)
+            time.sleep(wait)
+            waited += wait
+
+        if waited > 0:
+            _LOGGER.debug("Scheduler: Waited %.2fs for %s", waited, host)
+
+        return lease
+
+    def release(self, host, retry_after=None, lease=None):
+        """ Mark the request as done and pause the host if asked (in seconds)
+        Without lease, the oldest request in flight is released
+        """
+        with self._lock:
+            tokens, last, leases, blocked_until = self._state.get(host, [self._burst, time.time(), [], 0.0])
+            if lease in leases:
+                leases.remove(lease)
+            elif lease is None and leases:
+                leases.remove(min(leases))
+            if retry_after is not None:
+                blocked_until = max(blocked_until, time.time() + min(retry_after, self._retry_after_max))
+                # Restart slowly after the pause: the tokens are refilled from the end of the pause
+                tokens = 0
+                last = blocked_until
+            self._state[host] = [tokens, last, leases, blocked_until]
+
+    def get_retry_after(self, response):
+        """ Return the pause asked by a response in seconds (None if the host does not ask to slow down)
+        """
+        if response is None:
+            return None
+
+        if response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0':
+            # Rate limit of an API (GitHub) exhausted until the timestamp X-RateLimit-Reset
+            try:
+                return max(0.0, float(response.headers.get('X-RateLimit-Reset')) - time.time())
+            except (TypeError, ValueError):
+                return self._retry_after_default
+
+        if response.status_code not in HostScheduler.codes_throttled:
+            return None
+
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return self._retry_after_default if response.status_code == 429 else None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            date = parsedate_to_datetime(value)
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=timezone.utc)
+            return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return self._retry_after_default
+
+    @contextlib.contextmanager
+    def request(self, host):
+        """ Acquire a slot for the host, the caller can set the pause with the yielded dict:
+            with scheduler.request(host) as slot:
+                slot['retry_after'] = ...
+        """
+        slot = {'retry_after': None}
+        lease = self.acquire(host)
+        try:
+            yield slot
+        finally:
+            self.release(host, slot['retry_after'], lease)
+
+    @staticmethod
+    def interleave(packages, get_host):
+        """ Order packages to alternate their hosts (round robin on the hosts)
+        """
+        queues = {}
+        for package in packages:
+            queues.setdefault(get_host(package), []).append(package)
+
+        result = []
+        queues = list(queues.values())
+        while queues:
+            for queue in queues:
+                result.append(queue.pop(0))
+            queues = [queue for queue in queues if queue]
+
+        return result
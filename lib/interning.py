@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import logging
+import collections
+from urllib.parse import urlparse
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Interning(object):
+    """ Share the strings repeated in the inventory of the packages and in the pages cache
+    (package names, dependencies, hosts, paths, versions): equal strings become the same object,
+    so they are stored once in memory and pickled once in a file.
+    """
+
+    # The longer strings (e.g. the content of the pages) are rarely repeated
+    max_length = 256
+
+    @staticmethod
+    def intern_string(value):
+        if len(value) > Interning.max_length:
+            return value
+
+        return sys.intern(value)
+
+    @staticmethod
+    def intern(value):
+        """ Return a copy of a value (dict, list, set, tuple or named tuple) with its strings interned
+        """
+        value_type = type(value)
+        if value_type is str:
+            return Interning.intern_string(value)
+        if value_type in (dict, collections.OrderedDict):
+            return value_type((Interning.intern(k), Interning.intern(v)) for k, v in value.items())
+        if value_type is list:
+            return [Interning.intern(v) for v in value]
+        if value_type in (set, frozenset):
+            return value_type(Interning.intern(v) for v in value)
+        if isinstance(value, tuple):
+            items = [Interning.intern(v) for v in value]
+            # Named tuples (e.g. ParseResult) take their fields as arguments
+            return value_type(*items) if hasattr(value, '_fields') else value_type(items)
+
+        return value
+
+    @staticmethod
+    def urlparse(url):
+        """ Parse an url with its parts interned
+        """
+        return Interning.intern(urlparse(url))
+
+    @staticmethod
+    def href(href, content=''):
+        """ Return the record of a link found in a page
+        """
+        return {'href': Interning.intern_string(href), 'href_p': Interning.urlparse(href), 'content': Interning.intern_string(content)}
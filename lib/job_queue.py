@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import sqlite3
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class JobQueue(object):
+    """ Queue of the packages to search, shared by the workers of several processes or machines in a SQLite file.
+    A worker claims some jobs for a lease: the jobs of a worker which stopped are claimed again when the lease expires.
+    The jobs are claimed longest first, with the duration expected from the previous searches, so that the long searches do not end the run.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            package TEXT PRIMARY KEY,
+            duration REAL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            claimed REAL,
+            finished REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, claimed);
+    """
+
+    state_pending = 'pending'
+    state_running = 'running'
+    state_done = 'done'
+
+    def __init__(self, path, lease=3600, max_attempts=3):
+        """ lease: duration in seconds of a claim
+        max_attempts: number of claims of a job before to give up (e.g. a package which crashes the workers)
+        """
+        self._path = path
+        self._lease = lease
+        self._max_attempts = max_attempts
+        parent_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+
+        # The transactions are started explicitly to claim the jobs atomically
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(JobQueue.schema)
+
+    def close(self):
+        self._connection.close()
+
+    def add(self, packages, durations=None):
+        """ Add the packages which are not in the queue yet and return the number of jobs added
+        durations: expected duration of the search of each package, the packages never searched are claimed first
+        """
+        durations = durations or {}
+        self._connection.execute("BEGIN IMMEDIATE")
+        count = self._connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        self._connection.executemany("INSERT OR IGNORE INTO jobs (package, duration) VALUES (?, ?)",
+                                     [(p, durations.get(p)) for p in packages])
+        added = self._connection.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - count
+        self._connection.execute("COMMIT")
+
+        return added
+
+    def claim(self, worker, count, now=None):
+        """ Claim up to count jobs pending or whose lease expired, the longest first, and return their packages
+        """
+        now = now or time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._connection.execute("""
+                SELECT package FROM jobs
+                WHERE (state = ? OR state = ? AND claimed < ?) AND attempts < ?
+                ORDER BY state, duration IS NOT NULL, duration DESC, package LIMIT ?
+            """, (self.state_pending, self.state_running, now - self._lease, self._max_attempts, count)).fetchall()
+            packages = [row['package'] for row in rows]
+            self._connection.executemany("""
+                UPDATE jobs SET state = ?, worker = ?, claimed = ?, attempts = attempts + 1 WHERE package = ?
+            """, [(self.state_running, worker, now, package) for package in packages])
+            self._connection.execute("COMMIT")
+        except:
+            self._connection.execute("ROLLBACK")
+            raise
+
+        return packages
+
+    def finish(self, worker, packages, now=None):
+        """ Set the jobs of a worker done
+        """
+        self._connection.executemany("UPDATE jobs SET state = ?, finished = ? WHERE package = ? AND worker = ?",
+                                     [(self.state_done, now or time.time(), package, worker) for package in packages])
+
+    def release(self, worker, packages):
+        """ Put back the jobs of a worker in the queue (e.g. the worker is interrupted)
+        """
+        self._connection.executemany("""
+            UPDATE jobs SET state = ?, worker = NULL, claimed = NULL, attempts = attempts - 1
+            WHERE package = ? AND worker = ? AND state = ?
+        """, [(self.state_pending, package, worker, self.state_running) for package in packages])
+
+    def get_counts(self):
+        """ Return the number of jobs by state
+        """
+        return {row['state']: row['count'] for row in self._connection.execute("SELECT state, COUNT(*) AS count FROM jobs GROUP BY state")}
@@ -9,6 +9,9 @@ from datetime import datetime
 import parsedatetime
 from .config import Config
 from .packages_manager import PackagesManager
+from .output import Output
+from .shard import Shard
+from .job_queue import JobQueue
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,6 +22,8 @@ class Main(object):
 
     def __init__(self):
         self._packages = []
+        self._summary = False
+        self._args = []
         pass
 
     def version(self):
@@ -45,6 +50,17 @@ Action:
   - print_deps                              Prints all dependancies
   - print_parent_deps                       Prints all parent dependancies
   - print_unused                            Prints all packages not used by a SPK package or their deps
+  - new_versions                            Prints the versions found for the first time by the last search
+                                            (or since the date of the option database_since)
+  - outdated                                Prints the packages with a new version for more than database_outdated_days
+  - watch                                   Watch the Makefiles and search again the packages changed
+                                            (Options: watch_interval, watch_debounce)
+  - serve                                   Keep the packages in memory and answer JSON queries on a local socket:
+                                            /search, /search_all, /deps, /parent_deps, /unused, /status
+                                            (Options: serve_address, serve_port, serve_socket, serve_refresh_interval)
+  - worker                                  Search the packages of a queue shared with other workers until it is empty
+                                            (Options: queue_file, queue_batch_size, queue_lease)
+  - merge <file> [<file> ...]               Merge the results files of other machines (shards or workers) and print them
 
 Parameters:
   - Global:
@@ -56,11 +72,28 @@ Parameters:
     -p --packages=<package,package>         Packages to check for update
     -j --jobs                               Number of jobs (Default: max CPU core)
     -o --option "<key>=<value>"             Set an option
+    -F --format=<format>                    Output format: table, jsonl, csv (Default: {})
+       --output=<file>                      Write the output in a file instead of stdout
 
   - Cache:
     -c --disable-cache                      Disable cache
     -e --cache-duration=<duration>          Cache duration in seconds (Default: {})
 
+  - Report:
+    -t --report=<file>                      JSON file to write the run report (Default: {})
+    -s --summary                            Print a summary of the slowest packages and hosts
+       --prometheus=<file>                  Textfile for the node-exporter with the metrics of the run
+    -f --profile                            Profile the workers and print the hottest functions (Default: {})
+
+  - Transport:
+       --record=<file>                      Save the responses of the servers in an archive
+       --replay=<file>                      Use only the responses of an archive (offline and reproducible run)
+
+  - Distributed:
+       --shard=<i/N>                        Search only the part i of N of the packages (i from 1 to N)
+       --queue=<file>                       SQLite queue of the packages for the worker action
+       --results=<file>                     Save the versions found in a results file for the merge action
+
   - Build:
     -m --allow-major-release                Allow to update to next major version (Default: False)
     -a --allow-prerelease                   Allow prerelease version (Default: False)
@@ -92,11 +125,27 @@ Examples:
   - Search news version for ALL packages on a specify spksrc repository:
         python spksrc-updater.py -r ../spksrc search
 
-""".format(Config.get_default('work_dir'), Config.get('spksrc_git_dir'), Config.get_default('cache_duration'), str_options))
+  - Record the responses of a search, then replay them without network:
+        python spksrc-updater.py --record=/tmp/responses.sqlite search
+        python spksrc-updater.py -c --replay=/tmp/responses.sqlite search
+
+  - Split a search between two machines, then merge their results:
+        python spksrc-updater.py --shard=1/2 --results=/tmp/results-1.pkl search
+        python spksrc-updater.py --shard=2/2 --results=/tmp/results-2.pkl search
+        python spksrc-updater.py merge /tmp/results-1.pkl /tmp/results-2.pkl
+
+  - Start several workers sharing a queue of packages:
+        python spksrc-updater.py --queue=/shared/queue.sqlite --results=/tmp/results-$(hostname).pkl worker
+
+  - Start the server and query the new version of zlib:
+        python spksrc-updater.py -o serve_port=8080 serve
+        curl "http://127.0.0.1:8080/search?packages=cross/zlib"
+
+""".format(Config.get_default('work_dir'), Config.get('spksrc_git_dir'), Config.get_default('output_format'), Config.get_default('cache_duration'), Config.get_default('report_file'), Config.get_default('profile_file'), str_options))
 
     def read_args(self):
         try:
-            opts, args = getopt.getopt(sys.argv[1:], "hcvmaur:p:d:w:j:o:e:", [
+            opts, args = getopt.getopt(sys.argv[1:], "hcvmausfr:p:d:w:j:o:e:t:F:", [
                 "jobs="
                 "debug=",
                 "work-dir=",
@@ -109,6 +158,17 @@ Examples:
                 "update-deps",
                 "allow-major-release",
                 "allow-prerelease",
+                "report=",
+                "summary",
+                "format=",
+                "output=",
+                "prometheus=",
+                "profile",
+                "record=",
+                "replay=",
+                "shard=",
+                "queue=",
+                "results=",
             ])
         except getopt.GetoptError as error:
             self.help()
@@ -140,6 +200,37 @@ Examples:
                 Config.set('build_prerelease_allowed', True)
             elif opt in ("-u", "--update-deps"):
                 Config.set('build_update_deps', True)
+            elif opt in ("-F", "--format"):
+                if arg not in Output.formats:
+                    self.help()
+                    _LOGGER.error("Invalid output format: %s", arg)
+                    sys.exit(2)
+                Config.set('output_format', arg)
+            elif opt == "--output":
+                Config.set('output_file', arg)
+            elif opt in ("-t", "--report"):
+                Config.set('report_file', arg)
+            elif opt in ("-s", "--summary"):
+                self._summary = True
+            elif opt == "--prometheus":
+                Config.set('prometheus_file', arg)
+            elif opt in ("-f", "--profile"):
+                Config.set('profile_enabled', True)
+            elif opt in ("--record", "--replay"):
+                Config.set('transport_mode', opt[2:])
+                Config.set('transport_archive', arg)
+            elif opt == "--shard":
+                try:
+                    Shard.parse(arg)
+                except ValueError as error:
+                    self.help()
+                    _LOGGER.error(error)
+                    sys.exit(2)
+                Config.set('shard', arg)
+            elif opt == "--queue":
+                Config.set('queue_file', arg)
+            elif opt == "--results":
+                Config.set('results_file', arg)
             elif opt in ("-j", "--jobs"):
                 Config.set('nb_jobs', max(int(arg), 1))
             elif opt in ("-o", "--option"):
@@ -173,44 +264,151 @@ Examples:
     def _command_help(self):
         self.help()
 
+    def _pprint_summary(self):
+        if self._summary:
+            self._spksrc_manager.get_metrics().pprint_summary()
+        self._spksrc_manager.pprint_profile()
+
+    def _get_output(self, table, header=None):
+        output = Output(Config.get('output_format'), Config.get('output_file'))
+        output.set_table(table, header)
+        return output
+
+    def _get_output_next_version(self):
+        return self._get_output(
+            lambda r: "{:<30} {:<10} {:<30} {:<30}".format(r['package'], "YES" if r['is_new'] else "NO", r['version'], r['next_version']),
+            "{:<30} {:<10} {:<30} {:<30}".format("Package", "New ?", "Current version", "Next version"))
+
     def _command_search(self):
-        self._spksrc_manager.check_update_packages()
-        self._spksrc_manager.pprint_next_version()
+        output = self._get_output_next_version()
+        self._spksrc_manager.check_update_packages(
+            callback=lambda p: output.write(self._spksrc_manager.get_next_versions([p])[0]))
+        output.close()
+        self._pprint_summary()
 
     def _command_search_all(self):
-        self._spksrc_manager.check_update_packages()
-        self._spksrc_manager.pprint_all_new_versions()
+        output = self._get_output(
+            lambda r: "{} ({}):".format(r['package'], r['version']) + "".join("\n - {}".format(v) for v in r['versions']))
+        self._spksrc_manager.check_update_packages(
+            callback=lambda p: output.write(self._spksrc_manager.get_all_new_versions([p])[0]))
+        output.close()
+        self._pprint_summary()
 
     def _command_build(self):
         self._spksrc_manager.check_update_packages()
-        self._spksrc_manager.update_packages_version()
-        pass
-
-    def _command_print_deps(self):
-        print('Package dependencies:')
+        output = self._get_output(lambda r: "Updater: Update {} from {} to {}".format(r['package'], r['version'], r['next_version']))
+        for record in self._spksrc_manager.update_packages_version():
+            output.write(record)
+        output.close()
+        self._pprint_summary()
 
+    def _output_trees(self, get_tree, header):
         if not self._packages:
             self.help()
             print("-p <package> is required for this command")
             sys.exit(2)
 
-        for package in self._packages:
-            self._spksrc_manager.pprint_deps(package)
+        output = self._get_output(lambda r: '  ' * r['depth'] + " - " + r['package'], header)
+        for root in self._packages:
+            for depth, package in PackagesManager.iter_tree(get_tree(root)):
+                output.write({'root': root, 'depth': depth, 'package': package})
+        output.close()
+
+    def _command_print_deps(self):
+        self._output_trees(self._spksrc_manager.get_deps, 'Package dependencies:')
 
     def _command_print_parent_deps(self):
-        print('Package parents dependencies:')
+        self._output_trees(self._spksrc_manager.get_parent_deps, 'Package parents dependencies:')
 
-        if not self._packages:
+    def _command_print_unused(self):
+        output = self._get_output(lambda r: " - {}".format(r['package']), 'Package unused:')
+        for package in self._spksrc_manager.get_unused():
+            output.write({'package': package})
+        output.close()
+
+    def _open_versions_database(self):
+        database = self._spksrc_manager.get_versions_database()
+        if not database:
+            print("The option versions_database is required for this command")
+            sys.exit(2)
+        return database
+
+    def _command_new_versions(self):
+        database = self._open_versions_database()
+        since = None
+        if Config.get('database_since'):
+            cal = parsedatetime.Calendar()
+            date, _ = cal.parseDT(Config.get('database_since'), sourceTime=datetime.now())
+            since = date.timestamp()
+
+        output = self._get_output(
+            lambda r: "{:<30} {:<30} {}".format(r['package'], r['version'], datetime.fromtimestamp(r['first_seen']).strftime('%Y-%m-%d %H:%M')),
+            "{:<30} {:<30} {}".format("Package", "Version", "First seen"))
+        for record in database.get_new_versions(since):
+            if not self._packages or record['package'] in self._packages:
+                output.write(record)
+        output.close()
+        database.close()
+
+    def _command_outdated(self):
+        database = self._open_versions_database()
+        output = self._get_output(
+            lambda r: "{:<30} {:<30} {:<30} {}".format(r['package'], r['version'], r['next_version'], datetime.fromtimestamp(r['outdated_since']).strftime('%Y-%m-%d %H:%M')),
+            "{:<30} {:<30} {:<30} {}".format("Package", "Current version", "Next version", "Outdated since"))
+        for record in database.get_outdated(Config.get('database_outdated_days')):
+            if not self._packages or record['package'] in self._packages:
+                output.write(record)
+        output.close()
+        database.close()
+
+    def _command_worker(self):
+        if not Config.get('queue_file'):
             self.help()
-            print("-p <package> is required for this command")
+            print("--queue=<file> is required for this command")
             sys.exit(2)
 
-        for package in self._packages:
-            self._spksrc_manager.pprint_parent_deps(package)
+        queue = JobQueue(Config.get('queue_file'), Config.get('queue_lease'))
+        output = self._get_output_next_version()
+        self._spksrc_manager.run_worker(
+            queue, lambda p: output.write(self._spksrc_manager.get_next_versions([p])[0]))
+        output.close()
+        queue.close()
+        self._pprint_summary()
 
-    def _command_print_unused(self):
-        print('Package unused:')
-        self._spksrc_manager.pprint_unused()
+    def _command_merge(self):
+        if len(self._args) < 2:
+            self.help()
+            print("<file> is required for this command")
+            sys.exit(2)
+
+        output = self._get_output_next_version()
+        self._spksrc_manager.merge_results(
+            self._args[1:], lambda p: output.write(self._spksrc_manager.get_next_versions([p])[0]))
+        output.close()
+
+    def _command_watch(self):
+        from .watcher import Watcher
+        watcher = Watcher(Config.get('spksrc_git_dir'), ['cross', 'native', 'spk'],
+                          Config.get('watch_interval'), Config.get('watch_debounce'))
+        try:
+            while True:
+                packages = watcher.wait_changes()
+                changed = self._spksrc_manager.reindex_packages(packages)
+                if self._packages:
+                    changed = [p for p in changed if p in self._packages]
+                if changed:
+                    output = self._get_output_next_version()
+                    self._spksrc_manager.check_update_packages(
+                        changed, lambda p: output.write(self._spksrc_manager.get_next_versions([p])[0]))
+                    output.close()
+        except KeyboardInterrupt:
+            pass
+
+    def _command_serve(self):
+        from .server import Server
+        server = Server(self._spksrc_manager)
+        server.start()
+        server.serve_forever()
 
     def main(self):
         """
@@ -218,6 +416,7 @@ Examples:
         """
 
         args = self.read_args()
+        self._args = args
 
         logging.basicConfig(format=logging_format,level=Config.get('debug_level'))
 
@@ -1,47 +1,146 @@
 # -*- coding: utf-8 -*-
 
+import os
 import copy
+import itertools
+import collections
 import logging
 import pyparsing as pp
 
 _LOGGER = logging.getLogger(__name__)
 
+# Versions of the variable values. A version number is never reused, so a memoized value
+# can be checked by comparing the versions of the variables used to compute it.
+_VERSIONS = itertools.count(1)
+
 
 class MakefileParser(object):
 
-    def __init__(self):
+    # Maximum number of possible values generated for an expression or a variable
+    max_possibilities = 256
+
+    # Parse the files included with include, -include and sinclude directives
+    include_enabled = True
+
+    # Included files already parsed: path => (mtime, parser)
+    _includes_cache = {}
+
+    def __init__(self, max_possibilities=None, include_enabled=None):
         """ Initialize the Makefile parser and private variables
         """
         self._parser = self._get_parser()
+        self._parser_include = self._get_parser_include()
+        self._base_dir = None
+        self._includes = []
+        self._stale = set()
         self._vars_not_evaluate = {}
         self._vars = {}
+        self._vars_spans = {}
+        self._vars_version = {}
+        self._vars_references = {}
+        self._vars_dependents = {}
+        self._vars_snapshot = {}
+        # Assignments (operator, value) of the variables in the order of the lines of this file
+        self._vars_assigns = {}
+        self._memo = {}
+        self._evaluating = set()
+        self._affected = None
+        self._line_number = 0
         self._is_parsed = False
 
+        if max_possibilities:
+            self.max_possibilities = max_possibilities
+        if include_enabled is not None:
+            self.include_enabled = include_enabled
+
+    def _get_parser_enclosed(self):
+        """ Initialize the pyparsing parser for a value with calls $(...) or ${...}
+        """
+        enclosed = pp.Forward()
+        nested_parents = pp.nestedExpr('$(', ')', content=enclosed)
+        nested_brackets = pp.nestedExpr('${', '}', content=enclosed)
+        enclosed <<= (nested_parents | nested_brackets | pp.CharsNotIn('$(){}#\n')).leaveWhitespace()
+
+        return enclosed
+
+    def _get_parser_include(self):
+        """ Initialize the pyparsing parser for include directives
+        """
+        include = pp.oneOf(['include', '-include', 'sinclude'])('include')
+
+        return pp.lineStart + include + pp.White() + pp.ZeroOrMore(self._get_parser_enclosed())('files') + pp.Optional(pp.pythonStyleComment)('comment')
+
     def _get_parser(self):
         """ Initialize the pyparsing parser for Makefile
         """
         assign = pp.oneOf(['=', '?=', ':=', '::=', '+='])('assign')
         var_name = pp.Word(pp.alphas + '_', pp.alphanums + '_')('var')
 
-        enclosed = pp.Forward()
-        nested_parents = pp.nestedExpr('$(', ')', content=enclosed)
-        nested_brackets = pp.nestedExpr('${', '}', content=enclosed)
-        enclosed <<= (nested_parents | nested_brackets | pp.CharsNotIn('$(){}#\n')).leaveWhitespace()
+        enclosed = self._get_parser_enclosed()
 
-        return pp.lineStart + var_name + pp.ZeroOrMore(pp.White()) + assign + pp.ZeroOrMore(pp.White()) + pp.ZeroOrMore(enclosed)('value') + pp.Optional(pp.pythonStyleComment)('comment')
+        # Empty elements returning their location to get the column span of the value
+        value_start = pp.Empty().leaveWhitespace().setParseAction(lambda s, loc, toks: loc)('value_start')
+        value_end = pp.Empty().leaveWhitespace().setParseAction(lambda s, loc, toks: loc)('value_end')
+
+        return pp.lineStart + var_name + pp.ZeroOrMore(pp.White()) + assign + pp.ZeroOrMore(pp.White()) + value_start + pp.ZeroOrMore(enclosed)('value') + value_end + pp.Optional(pp.pythonStyleComment)('comment')
 
     def _generate_str_possibility(self, arr):
-        str_arr = []
-        str_arr.append('')
+        """ Generate lazily all the strings made by one possibility of each element of arr
+        """
+        for combination in itertools.product(*arr):
+            yield ''.join(combination)
 
-        for s_arr in arr:
-            new_arr = []
-            for curr_str in str_arr:
-                for k, v in enumerate(s_arr):
-                    new_arr.append(curr_str + v)
-            str_arr = new_arr
+    def _limit_possibilities(self, values, name):
+        """ Return at most max_possibilities values from an iterable and warn when values are dropped
+        """
+        values = list(itertools.islice(values, self.max_possibilities + 1))
+        if len(values) > self.max_possibilities:
+            if callable(name):
+                name = name()
+            _LOGGER.warning("Too many possible values for %s: only the first %d values are kept", name, self.max_possibilities)
+            values = values[:self.max_possibilities]
 
-        return str_arr
+        return values
+
+    def _to_text(self, parse_result):
+        """ Return the Makefile text of a parse result
+        """
+        return ''.join('$(' + self._to_text(res) + ')' if isinstance(res, pp.ParseResults) else res for res in parse_result)
+
+    def _get_references(self, parse_result):
+        """ Return the set of variables used by a parse result.
+        Return None if a variable name is computed: $($(VAR)_NAME) or $(value $(VAR))
+        """
+        references = set()
+        for res in parse_result:
+            if not isinstance(res, pp.ParseResults) or len(res) == 0:
+                continue
+
+            first = res[0]
+            if isinstance(first, pp.ParseResults):
+                return None
+
+            args = first.lstrip().split(' ', 1)
+            if len(res) == 1 and len(args) == 1:
+                # $(VAR)
+                if args[0].strip():
+                    references.add(args[0].strip())
+                continue
+
+            if len(args) == 1 or args[0] == 'value':
+                # $(VAR_$(NAME)) or $(value ...)
+                if len(res) > 1:
+                    return None
+                references.add(args[1].strip())
+                continue
+
+            # $(func args): get the variables used in the arguments
+            sub_references = self._get_references(res)
+            if sub_references is None:
+                return None
+            references |= sub_references
+
+        return references
 
     def _call_value(self, arguments, re_evaluate_values):
         """ Execute the call $(value VAR) from Makefile
@@ -93,28 +192,85 @@ class MakefileParser(object):
 
         return ['']
 
-    def evaluate_result(self, parse_result, re_evaluate_values=False, to_parse=False):
+    def _evaluate_call(self, parse_result, re_evaluate_values):
+        """ Return the values of a call $(...) and memoize them with the versions of the variables used
+        """
+        references = self._get_references([parse_result])
+        if references is None:
+            return self.evaluate_result(parse_result, re_evaluate_values, True)
+
+        references = sorted(references)
+        if re_evaluate_values:
+            for reference in references:
+                self.evaluate_var(reference)
+
+        snapshot = tuple(self._vars_version.get(reference) for reference in references)
+        memo = self._memo.get(id(parse_result))
+        if memo and memo[0] is parse_result and memo[1] == snapshot:
+            return memo[2]
+
+        values = self.evaluate_result(parse_result, re_evaluate_values, True)
+        self._memo[id(parse_result)] = (parse_result, snapshot, values)
+
+        return values
+
+    def _iter_result(self, parse_result, re_evaluate_values=False, to_parse=False):
+        """ Generate lazily the possible values of a parse result
+        """
         str_ret = []
         for res in parse_result:
 
             if isinstance(res, pp.ParseResults):
-                str_to_add = self.evaluate_result(
-                    res, re_evaluate_values, True)
-                str_ret.append(str_to_add)
+                str_ret.append(self._evaluate_call(res, re_evaluate_values))
             else:
                 str_ret.append([res])
 
-        str_gen = self._generate_str_possibility(str_ret)
-        if to_parse is True:
+        for s in self._generate_str_possibility(str_ret):
+            if to_parse is True:
+                yield from self.parse_call(s, re_evaluate_values)
+            else:
+                yield s
+
+    def evaluate_result(self, parse_result, re_evaluate_values=False, to_parse=False):
+        """ Return the possible values of a parse result
+        """
+        values = self._iter_result(parse_result, re_evaluate_values, to_parse)
+        return self._limit_possibilities(values, lambda: "'" + self._to_text(parse_result) + "'")
+
+    def _set_values(self, var, values):
+        """ Set the evaluated values of a variable and change its version if values are different
+        """
+        if self._vars.get(var) != values:
+            self._vars[var] = values
+            self._vars_version[var] = next(_VERSIONS)
 
-            new_arr = []
-            for s in str_gen:
-                new_arr += self.parse_call(s, re_evaluate_values)
-            str_ret = new_arr
+    def _add_references(self, var, value):
+        """ Add the variables used by a value to the references of a variable
+        and add the variable to the dependents of these variables
+        """
+        references = self._get_references(value) if isinstance(value, pp.ParseResults) else set()
+        if references is None or self._vars_references.get(var, set()) is None:
+            # Computed variable name: the variable may depend on any variable
+            references = None
+            self._vars_references[var] = None
         else:
-            str_ret = str_gen
+            self._vars_references[var] = self._vars_references.get(var, set()) | references
+
+        # Sets are never modified in place because they can be shared with an overlay
+        for reference in references if references is not None else [None]:
+            self._vars_dependents[reference] = self._vars_dependents.get(reference, set()) | {var}
 
-        return str_ret
+    def _add_span(self, var, line, start, end):
+        """ Save the position (line, start column, end column) of the value of an assignment
+        """
+        # Do not include the end of line in the span when the value is empty
+        line_length = len(line.rstrip('\n'))
+        end = min(end, line_length)
+        start = min(start, end)
+
+        if var not in self._vars_spans:
+            self._vars_spans[var] = []
+        self._vars_spans[var].append((self._line_number, start, end))
 
     def _parse_line(self, line):
         """ Parse one line of Makefile content
@@ -122,28 +278,155 @@ class MakefileParser(object):
         result = self._parser.searchString(line)
 
         if result:
-            if result[0]['var'] not in self._vars:
-                self._vars_not_evaluate[result[0]['var']] = []
-                self._vars_not_evaluate[result[0]['var']].append('')
-                self._vars[result[0]['var']] = []
-                self._vars[result[0]['var']].append('')
+            var = result[0]['var']
+            assign = result[0]['assign']
+            is_defined = var in self._vars_spans
+            self._add_span(var, line, result[0]['value_start'], result[0]['value_end'])
+            self._vars_assigns.setdefault(var, []).append((assign, result[0]['value'] if 'value' in result[0] else None))
+
+            if not is_defined and var in self._vars and assign in ['+=', '?=']:
+                # Append to the values of an included file: lists of the included parser are not modified
+                self._vars_not_evaluate[var] = list(self._vars_not_evaluate[var])
+                if assign == '?=':
+                    # The variable is already set by an included file: the assignment is ignored, as in make
+                    self._line_number += 1
+                    return
+            elif not is_defined:
+                self._vars_not_evaluate[var] = ['']
+                self._vars_references[var] = set()
+                self._vars[var] = ['']
+                self._vars_version[var] = next(_VERSIONS)
 
             if 'value' in result[0]:
-                if self._vars[result[0]['var']] and self._vars[result[0]['var']][0] == '':
-                    self._vars_not_evaluate[result[0]['var']].pop(0)
-                    self._vars[result[0]['var']].pop(0)
+                values = self._vars[var]
+                if values and values[0] == '':
+                    self._vars_not_evaluate[var].pop(0)
+                    values = values[1:]
+
+                _LOGGER.debug("_parse_line: evalute var: %s", var)
+                self._vars_not_evaluate[var].append(result[0]['value'])
+                self._add_references(var, result[0]['value'])
+                values = values + self.evaluate_result(result[0]['value'])
+                self._set_values(var, self._limit_possibilities(values, var))
+                self._vars_snapshot[var] = None
+
+        elif self.include_enabled and 'include' in line:
+            result = self._parser_include.searchString(line)
+            if result and 'files' in result[0]:
+                self._include(result[0]['files'], result[0]['include'] != 'include')
+
+        self._line_number += 1
+
+    @classmethod
+    def clear_includes_cache(cls):
+        """ Clear the included files already parsed
+        """
+        cls._includes_cache.clear()
 
-                _LOGGER.debug("_parse_line: evalute var: %s",
-                              result[0]['var'])
-                self._vars_not_evaluate[result[0]
-                                        ['var']].append(result[0]['value'])
-                self._vars[result[0]['var']
-                           ] += self.evaluate_result(result[0]['value'])
+    def _get_include_parser(self, path):
+        """ Return the parser of an included file. The file is parsed only once and the parser is shared.
+        Included files are relative to the directory of the main Makefile, as make is launched in this directory.
+        """
+        mtime = os.path.getmtime(path)
+        cached = MakefileParser._includes_cache.get(path)
+        if cached is not None:
+            # The parser is None while the file is parsed: recursive include
+            if cached[1] is None or cached[0] == mtime:
+                return cached[1]
+
+        _LOGGER.debug("_get_include_parser: parse included file: %s", path)
+        MakefileParser._includes_cache[path] = (mtime, None)
+        parser = MakefileParser(self.max_possibilities, self.include_enabled)
+        parser._base_dir = self._base_dir
+        parser.parse_file(path)
+        MakefileParser._includes_cache[path] = (mtime, parser)
+
+        return parser
+
+    def _include(self, files, optional):
+        """ Include the variables of Makefiles: the variables of the included files are read
+        from their shared parsers, only the variables using them are re-evaluated in this parser.
+        """
+        for filename in self.evaluate_result(files)[0].split():
+            path = os.path.normpath(os.path.join(self._base_dir or os.getcwd(), filename))
+            if not os.path.isfile(path):
+                if not optional:
+                    _LOGGER.debug("_include: included file not found: %s", path)
+                continue
+
+            parser = self._get_include_parser(path)
+            if parser is None or parser in self._includes:
+                continue
+            self._includes.append(parser)
+
+            # Variables of this parser are read before the variables of the included files
+            for name in ['_vars', '_vars_not_evaluate', '_vars_version', '_vars_references', '_vars_dependents', '_vars_snapshot', '_memo']:
+                table = getattr(self, name)
+                if not isinstance(table, collections.ChainMap):
+                    table = collections.ChainMap(table)
+                    setattr(self, name, table)
+                table.maps.append(getattr(parser, name))
+
+            # Variables assigned before the include line and in the included file
+            merged = set()
+            for var in self._vars_spans:
+                if var in parser._vars and self._merge_included_var(var, parser):
+                    merged.add(var)
+
+            # Variables of the included files using variables defined in this file are evaluated
+            # when they are requested
+            self._stale |= set(var for var in self.get_dependents(self._vars_spans.keys()) if var not in self._vars_spans)
+
+            # Re-evaluate the variables defined in this file which use variables of the included file
+            included = set(parser._vars.keys())
+            refreshed = set()
+            for var in self._vars_spans:
+                references = self._vars_references.get(var)
+                if references is None or references & included:
+                    refreshed.add(var)
+            refreshed |= merged
+            refreshed |= set(var for var in self.get_dependents(refreshed) if var in self._vars_spans)
+            for var in sorted(refreshed):
+                self.evaluate_var(var)
+
+    def _merge_included_var(self, var, parser):
+        """ Apply the assignments of an included file to a variable assigned before the include line, as make does:
+        = := ::= replace the values, += appends to them and ?= is ignored.
+        Return True if the values of the variable changed
+        """
+        # The variables of the files included by the included file are assigned with =
+        assigns = parser._vars_assigns.get(var) or [('=', value) for value in parser._vars_not_evaluate[var]]
+
+        values = list(self._vars_not_evaluate.maps[0][var])
+        changed = False
+        for assign, value in assigns:
+            if assign == '?=':
+                continue
+            if assign != '+=':
+                values = []
+            if value is not None:
+                values.append(value)
+            changed = True
+
+        if not changed:
+            return False
+
+        # An empty string is the value of a variable without assignment
+        values = [value for value in values if not isinstance(value, str) or value != ''] or ['']
+        self._vars_not_evaluate[var] = values
+        self._vars_references[var] = set()
+        for value in values:
+            self._add_references(var, value)
+        self._vars_snapshot[var] = None
+
+        return True
 
     def parse_file(self, file):
         """ Parse a Makefile file
         """
         _LOGGER.debug("parse_file: file: %s", file)
+        if self._base_dir is None:
+            self._base_dir = os.path.dirname(os.path.abspath(file))
         file = open(file, "r")
         for line in file:
             self._parse_line(line)
@@ -163,26 +446,43 @@ class MakefileParser(object):
         """ Delete all variables parsed from the Makefile
         """
         self._vars = {}
+        self._vars_version = {}
+        self._vars_snapshot = {}
 
     def del_var_values(self, var):
         """ Delete one variable parsed from the Makefile
         """
         if var in self._vars:
             del self._vars[var]
+            self._vars_version[var] = next(_VERSIONS)
 
     def get_vars_values(self):
         """ Get the values of all variables from the parsed Makefile
         """
+        for var in sorted(self._stale):
+            self.evaluate_var(var)
+
         return copy.copy(self._vars)
 
     def get_var_values(self, var, default=None):
         """ Get the values of a variable from the parsed Makefile
         """
+        if var in self._stale:
+            self.evaluate_var(var)
+
         if var in self._vars:
             return copy.copy(self._vars[var])
 
         return default
 
+    def get_var_spans(self, var, default=None):
+        """ Get the positions (line, start column, end column) of the values assigned to a variable
+        """
+        if var in self._vars_spans:
+            return copy.copy(self._vars_spans[var])
+
+        return default
+
     def set_var_values(self, var, value, value_not_evaluate=None):
         """ Set a value for a variable
         """
@@ -197,16 +497,137 @@ class MakefileParser(object):
             value_not_evaluate = [value_not_evaluate]
 
         self._vars_not_evaluate[var] = value_not_evaluate
+        self._vars_references[var] = set()
+        for v in value_not_evaluate:
+            self._add_references(var, v)
+        self._vars_snapshot[var] = None
         self._vars[var] = value
+        self._vars_version[var] = next(_VERSIONS)
+
+    def _get_var_dependents(self, var, table=None):
+        """ Return the direct dependents of a variable from all the tables (own, overlay and included)
+        """
+        if table is None:
+            table = self._vars_dependents
+
+        if isinstance(table, collections.ChainMap):
+            return set().union(*[self._get_var_dependents(var, t) for t in table.maps])
+
+        return table.get(var, set())
+
+    def get_dependents(self, variables, recursive=True):
+        """ Return the variables using one of the variables in parameter
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+
+        # Variables with a computed name (None) may depend on any variable
+        dependents = set(self._get_var_dependents(None))
+        to_check = list(variables)
+        while to_check:
+            var = to_check.pop()
+            for dependent in self._get_var_dependents(var):
+                if dependent not in dependents:
+                    dependents.add(dependent)
+                    if recursive:
+                        to_check.append(dependent)
+
+        return dependents
+
+    def evaluate_dependents(self, variables):
+        """ Re-evaluate all the variables using one of the variables in parameter
+        """
+        for var in sorted(self.get_dependents(variables)):
+            self.evaluate_var(var)
+
+    def overlay(self, values):
+        """ Return a parser where some variables are overridden and only the variables depending on them are re-evaluated.
+        values is a dict with the variable as key and the value(s) as value.
+        The overlay reads the variables of this parser without copying them and this parser is never modified.
+        """
+        overlay = copy.copy(self)
+        overlay._vars = collections.ChainMap({}, self._vars)
+        overlay._vars_not_evaluate = collections.ChainMap({}, self._vars_not_evaluate)
+        overlay._vars_spans = collections.ChainMap({}, self._vars_spans)
+        overlay._vars_version = collections.ChainMap({}, self._vars_version)
+        overlay._vars_references = collections.ChainMap({}, self._vars_references)
+        overlay._vars_dependents = collections.ChainMap({}, self._vars_dependents)
+        overlay._vars_snapshot = collections.ChainMap({}, self._vars_snapshot)
+        overlay._memo = collections.ChainMap({}, self._memo)
+        overlay._evaluating = set()
+
+        # Only the overridden variables and their dependents can change in the overlay
+        overlay._affected = set(values.keys()) | self.get_dependents(values.keys()) | self._stale
+        if self._affected is not None:
+            overlay._affected |= self._affected
+
+        for var, value in values.items():
+            overlay.set_var_values(var, value)
+        overlay.evaluate_dependents(values.keys())
+
+        return overlay
+
+    def evaluate_with(self, values, variables):
+        """ Return the values of variables evaluated with some variables overridden, without modifying this parser
+        """
+        overlay = self.overlay(values)
+
+        return {var: overlay.get_var_values(var) for var in variables}
+
+    def _evaluate_self_reference(self, var):
+        """ Return the values of a variable which can use itself (e.g. CFLAGS=$(CFLAGS) -g).
+        As while parsing, the variable used in an assignment has the values of the previous assignments.
+        """
+        values, version = self._vars.get(var), self._vars_version.get(var)
+        accumulated = []
+        try:
+            for value in self._vars_not_evaluate[var]:
+                self._vars[var] = accumulated
+                self._vars_version[var] = next(_VERSIONS)
+                accumulated = self._limit_possibilities(itertools.chain(accumulated, self.evaluate_result(value, True)), var)
+        finally:
+            # The version is kept when the values don't change, so the dependents are not re-evaluated
+            self._vars[var] = values
+            self._vars_version[var] = version
+
+        return accumulated
 
     def evaluate_var(self, var):
         """ Ask to re-evaluate the values of a variable by using the values of the others variables
         """
         _LOGGER.debug("evaluate_var: var: %s", var)
-        if var in self._vars_not_evaluate:
-            self._vars[var] = []
-            for v in self._vars_not_evaluate[var]:
-                self._vars[var] += self.evaluate_result(v, True)
+        if var not in self._vars_not_evaluate or var in self._evaluating:
+            return
+
+        # In an overlay, variables not depending on the overridden variables keep their values
+        if self._affected is not None and var not in self._affected:
+            return
+
+        # Variables of the included files keep their values when they don't use variables of this file
+        if self._affected is None and self._includes and var not in self._vars_spans and var not in self._stale:
+            return
+
+        self._evaluating.add(var)
+        try:
+            # Values are re-evaluated only when a variable used has a new version
+            references = self._vars_references.get(var)
+            snapshot = None
+            if references is not None:
+                references = sorted(references - {var})
+                for reference in references:
+                    self.evaluate_var(reference)
+                snapshot = tuple(self._vars_version.get(reference) for reference in references)
+                if var in self._vars and snapshot == self._vars_snapshot.get(var):
+                    return
+
+            if references is None or var in self._vars_references[var]:
+                values = self._evaluate_self_reference(var)
+            else:
+                values = itertools.chain.from_iterable(self.evaluate_result(v, True) for v in self._vars_not_evaluate[var])
+            self._set_values(var, self._limit_possibilities(values, var))
+            self._vars_snapshot[var] = snapshot
+        finally:
+            self._evaluating.discard(var)
 
     def is_containing_call(self, var):
         """ Check if a var contains a call like $(VALUE) or $(xxx yyy zzz)
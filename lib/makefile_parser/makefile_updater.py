@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import json
-import copy
 import logging
 import pyparsing as pp
 from .makefile_parser import MakefileParser
@@ -12,10 +12,10 @@ _LOGGER = logging.getLogger(__name__)
 
 class MakefileUpdater(MakefileParser):
 
-    def __init__(self):
+    def __init__(self, max_possibilities=None, include_enabled=None):
         """ Initialize the Makefile parser
         """
-        super().__init__()
+        super().__init__(max_possibilities, include_enabled)
         self._original_content = []
         self._updated_content = []
 
@@ -23,12 +23,14 @@ class MakefileUpdater(MakefileParser):
         """ Parse a Makefile file
         """
         _LOGGER.debug("parse_file: file: %s", file)
+        if self._base_dir is None:
+            self._base_dir = os.path.dirname(os.path.abspath(file))
         file = open(file, "r")
         for line in file:
             self._original_content.append(line)
             self._parse_line(line)
         file.close()
-        self._updated_content = self._original_content
+        self._updated_content = list(self._original_content)
         self._is_parsed = True
 
     def parse_text(self, text):
@@ -37,31 +39,28 @@ class MakefileUpdater(MakefileParser):
         splitted = text.split('\n')
         self._original_content = ["{}\n".format(i) for i in splitted[:-1]]
         self._original_content.append(splitted[-1])
-        self._updated_content = self._original_content
+        self._updated_content = list(self._original_content)
         super().parse_text(text)
 
-
-    def _get_parser_updater(self, func):
-        """ Return a parser which will replace value field by the function in parameter
+    def overlay(self, values):
+        """ Return an updater where some variables are overridden, with its own copy of the content
         """
-        parser = copy.copy(self._parser)
+        overlay = super().overlay(values)
+        overlay._updated_content = list(self._updated_content)
 
-        def pp_look_for_field(x, field):
-            if x.resultsName == field:
-                return x
-            try:
-                for v in x:
-                    res = pp_look_for_field(v, field)
-                    if res:
-                        return res
-            except:
-                return None
-            return None
+        return overlay
 
-        value_field = pp_look_for_field(parser, 'value')
-        value_field.setParseAction(func)
+    def _update_span(self, var, i_var_values, value):
+        """ Replace the value of the i-th assignment of a var in the content
+        """
+        line, start, end = self._vars_spans[var][i_var_values]
+        content = self._updated_content[line]
+        self._updated_content[line] = content[:start] + value + content[end:]
 
-        return parser
+        # Keep the span valid for the next updates (the list can be shared with an overlay)
+        spans = list(self._vars_spans[var])
+        spans[i_var_values] = (line, start, start + len(value))
+        self._vars_spans[var] = spans
 
     def update_content(self, var, idx=None):
         """ Update a var with his current value
@@ -78,18 +77,26 @@ class MakefileUpdater(MakefileParser):
         if not isinstance(idx, list):
             idx = [idx]
 
-        i_var_values = 0
-        for i, line in enumerate(self._updated_content):
-            result = self._parser.searchString(line)
-            if result:
-                if result[0]['var'] == var:
-                    if not idx or i_var_values in idx:
-                        parser_updater = self._get_parser_updater(lambda toks: self._vars[var][i_var_values])
-                        self._updated_content[i] = parser_updater.transformString(line) + '\n'
-                    i_var_values += 1
+        for i_var_values in range(len(self._vars_spans.get(var, []))):
+            if not idx or i_var_values in idx:
+                if i_var_values < len(self._vars[var]):
+                    self._update_span(var, i_var_values, self._vars[var][i_var_values])
 
         return True
 
+    def update_contents(self, variables):
+        """ Update several vars with their current values
+        variables is a list of var or a dict with var as key and idx as value
+        """
+        if not isinstance(variables, dict):
+            variables = {var: None for var in variables}
+
+        result = True
+        for var, idx in variables.items():
+            result = self.update_content(var, idx) and result
+
+        return result
+
     def write_output(self):
         """ Return content with update fields
         """
@@ -98,6 +105,5 @@ class MakefileUpdater(MakefileParser):
     def write_file(self, path):
         """ Write content with update fields in a file
         """
-        file = open(path, 'w')
-        file.write(self.write_output())
-        file.close
+        with open(path, 'w') as file:
+            file.write(self.write_output())
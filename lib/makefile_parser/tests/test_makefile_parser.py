@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 from makefile_parser.makefile_parser import MakefileParser
 
 
@@ -109,6 +113,202 @@ VALUE=56_$(TEST)_11"""
         self.assertEqual(self.parser.is_containing_call(
             'VALUE_WITH_COMMENT'), False)
 
+    def test_max_possibilities(self):
+        text = """A=1
+A=2
+A=3
+B=$(A)$(A)$(A)"""
+        tmp_parser = MakefileParser(max_possibilities=4)
+        with self.assertLogs('makefile_parser.makefile_parser', level='WARNING'):
+            tmp_parser.parse_text(text)
+        self.assertEqual(tmp_parser.get_var_values('A'), ['1', '2', '3'])
+        self.assertEqual(tmp_parser.get_var_values('B'), ['111', '112', '113', '121'])
+
+    def test_max_possibilities_multiple_assigns(self):
+        text = """A=1
+A=2
+B=$(A)$(A)
+B+=$(A)$(A)"""
+        tmp_parser = MakefileParser(max_possibilities=6)
+        with self.assertLogs('makefile_parser.makefile_parser', level='WARNING'):
+            tmp_parser.parse_text(text)
+        self.assertEqual(tmp_parser.get_var_values('B'), ['11', '12', '21', '22', '11', '12'])
+
+    def test_reevaluate_var_unchanged(self):
+        self.parser.evaluate_var('PKG_DIST_NAME')
+        self.assertEqual(self.parser.get_var_values(
+            'PKG_DIST_NAME'), ['boost_1_63_0.tar.bz2'])
+        self.parser.set_var_values('PKG_VERS', ['1.71.0'])
+        self.parser.evaluate_var('PKG_DIST_NAME')
+        self.assertEqual(self.parser.get_var_values(
+            'PKG_DIST_NAME'), ['boost_1_71_0.tar.bz2'])
+        self.parser.set_var_values('PKG_VERS', ['1.63.0'])
+        self.parser.evaluate_var('PKG_DIST_NAME')
+        self.assertEqual(self.parser.get_var_values(
+            'PKG_DIST_NAME'), ['boost_1_63_0.tar.bz2'])
+
+    def test_reevaluate_var_defined_later(self):
+        text = """VALUE=56_$(TEST)_11
+TEST=10"""
+        tmp_parser = MakefileParser()
+        tmp_parser.parse_text(text)
+        self.assertEqual(tmp_parser.get_var_values('VALUE'), ['56__11'])
+        tmp_parser.evaluate_var('VALUE')
+        self.assertEqual(tmp_parser.get_var_values('VALUE'), ['56_10_11'])
+
+    def test_reevaluate_recursive_var(self):
+        text = """CFLAGS=-O2
+CFLAGS=$(CFLAGS) -g"""
+        tmp_parser = MakefileParser()
+        tmp_parser.parse_text(text)
+        self.assertEqual(tmp_parser.get_var_values('CFLAGS'), ['-O2', '-O2 -g'])
+        tmp_parser.evaluate_var('CFLAGS')
+        self.assertEqual(tmp_parser.get_var_values('CFLAGS'), ['-O2', '-O2 -g'])
+        tmp_parser.evaluate_var('CFLAGS')
+        self.assertEqual(tmp_parser.get_var_values('CFLAGS'), ['-O2', '-O2 -g'])
+        # The variables used by the assignments are re-evaluated
+        tmp_parser = MakefileParser()
+        tmp_parser.parse_text("""OPT=2
+CFLAGS=-O$(OPT)
+CFLAGS=$(CFLAGS) -g""")
+        tmp_parser.set_var_values('OPT', ['3'])
+        tmp_parser.evaluate_var('CFLAGS')
+        tmp_parser.evaluate_var('CFLAGS')
+        self.assertEqual(tmp_parser.get_var_values('CFLAGS'), ['-O3', '-O3 -g'])
+        self.assertEqual(tmp_parser.evaluate_with({'OPT': '1'}, ['CFLAGS']), {'CFLAGS': ['-O1', '-O1 -g']})
+
+    def test_reevaluate_recursive_var_error(self):
+        tmp_parser = MakefileParser()
+        tmp_parser.parse_text("""CFLAGS=-O2
+CFLAGS=$(CFLAGS) -g""")
+        version = tmp_parser._vars_version['CFLAGS']
+        with mock.patch.object(tmp_parser, 'evaluate_result', side_effect=[['-O2'], ValueError('error')]):
+            with self.assertRaises(ValueError):
+                tmp_parser._evaluate_self_reference('CFLAGS')
+        # The values are restored
+        self.assertEqual(tmp_parser.get_var_values('CFLAGS'), ['-O2', '-O2 -g'])
+        self.assertEqual(tmp_parser._vars_version['CFLAGS'], version)
+
+    def test_get_dependents(self):
+        self.assertEqual(self.parser.get_dependents('PKG_VERS', False), {
+                         'PKG_DIR', 'PKG_DIST_SITE', 'PKG_DIST_SITE_VALUE'})
+        self.assertEqual(self.parser.get_dependents('PKG_VERS'), {
+                         'PKG_DIR', 'PKG_DIST_NAME', 'PKG_DIST_SITE', 'PKG_DIST_SITE_VALUE'})
+        self.assertEqual(self.parser.get_dependents('COMMENT'), set())
+
+    def test_evaluate_with(self):
+        values = self.parser.evaluate_with({'PKG_VERS': '1.71.0'}, ['PKG_DIST_NAME', 'PKG_DIST_SITE', 'PKG_NAME'])
+        self.assertEqual(values, {
+            'PKG_DIST_NAME': ['boost_1_71_0.tar.bz2'],
+            'PKG_DIST_SITE': ['http://sourceforge.net/projects/boost/files/boost/1.71.0'],
+            'PKG_NAME': ['boost'],
+        })
+        # The parser is not modified
+        self.assertEqual(self.parser.get_var_values('PKG_VERS'), ['1.63.0'])
+        self.assertEqual(self.parser.get_var_values('PKG_DIST_NAME'), ['boost_1_63_0.tar.bz2'])
+
+    def test_overlay(self):
+        overlay = self.parser.overlay({'PKG_VERS': 'XXXVERXXX', 'PKG_EXT': 'tar.xz'})
+        self.assertEqual(overlay.get_var_values('PKG_DIST_NAME'), ['boost_XXXVERXXX.tar.xz'])
+        self.assertEqual(overlay.get_var_values('PKG_DIST_SITE_VALUE'), [
+                         'http://sourceforge.net/projects/boost/files/boost/XXXVERXXX'])
+        self.assertEqual(self.parser.get_var_values('PKG_DIST_NAME'), ['boost_1_63_0.tar.bz2'])
+
+        overlay2 = overlay.overlay({'PKG_NAME': 'boost2'})
+        self.assertEqual(overlay2.get_var_values('PKG_DIST_NAME'), ['boost2_XXXVERXXX.tar.xz'])
+        self.assertEqual(overlay.get_var_values('PKG_DIST_NAME'), ['boost_XXXVERXXX.tar.xz'])
+
+
+class TestMakefileParserInclude(unittest.TestCase):
+    def setUp(self):
+        MakefileParser.clear_includes_cache()
+        self.root = tempfile.mkdtemp()
+        self.write('mk/spksrc.common.mk', """COMMON_SITE = http://mirror.example.com
+""")
+        self.write('mk/spksrc.cross-cc.mk', """include ../../mk/spksrc.common.mk
+PKG_DIST_SITE ?= $(COMMON_SITE)/$(PKG_NAME)
+CONFIGURE_ARGS = --prefix=/usr
+CFLAGS += -O2
+""")
+        self.write('cross/foo/Makefile', """PKG_NAME = foo
+PKG_VERS = 1.0
+PKG_DIST_NAME = $(PKG_NAME)-$(PKG_VERS).tar.gz
+MIRROR = $(COMMON_SITE)/mirror
+CONFIGURE_ARGS += --enable-foo
+include ../../mk/spksrc.cross-cc.mk
+-include ../../mk/missing.mk
+""")
+        self.write('cross/bar/Makefile', """PKG_NAME = bar
+PKG_DIST_SITE = http://bar.example.com
+include ../../mk/spksrc.cross-cc.mk
+""")
+        self.write('cross/baz/Makefile', """PKG_NAME = baz
+CFLAGS = -g
+include ../../mk/spksrc.cross-cc.mk
+PKG_DIST_SITE ?= http://ignored.example.com
+CONFIGURE_ARGS = --prefix=/opt
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        MakefileParser.clear_includes_cache()
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def parse(self, package):
+        parser = MakefileParser()
+        parser.parse_file(os.path.join(self.root, package, 'Makefile'))
+        return parser
+
+    def test_include_vars(self):
+        parser = self.parse('cross/foo')
+        self.assertEqual(parser.get_var_values('COMMON_SITE'), ['http://mirror.example.com'])
+        self.assertEqual(parser.get_var_values('MIRROR'), ['http://mirror.example.com/mirror'])
+        self.assertEqual(parser.get_var_values('PKG_DIST_SITE'), ['http://mirror.example.com/foo'])
+        # The included file assigns the variable after the Makefile
+        self.assertEqual(parser.get_var_values('CONFIGURE_ARGS'), ['--prefix=/usr'])
+
+    def test_include_override(self):
+        parser = self.parse('cross/bar')
+        self.assertEqual(parser.get_var_values('PKG_DIST_SITE'), ['http://bar.example.com'])
+
+    def test_include_order(self):
+        parser = self.parse('cross/baz')
+        # += of the included file appends to the values assigned before the include
+        self.assertEqual(parser.get_var_values('CFLAGS'), ['-g', '-O2'])
+        # ?= after the include is ignored, = after the include replaces the values of the included file
+        self.assertEqual(parser.get_var_values('PKG_DIST_SITE'), ['http://mirror.example.com/baz'])
+        self.assertEqual(parser.get_var_values('CONFIGURE_ARGS'), ['--prefix=/opt'])
+        # The shared parser is not modified
+        self.assertEqual(parser._includes[0].get_var_values('CFLAGS'), ['-O2'])
+
+    def test_include_parsed_once(self):
+        parser_foo = self.parse('cross/foo')
+        parser_bar = self.parse('cross/bar')
+        self.assertEqual(len(parser_foo._includes), 1)
+        self.assertIs(parser_foo._includes[0], parser_bar._includes[0])
+        # The shared parser is not modified by the packages
+        self.assertEqual(parser_foo._includes[0].get_var_values('PKG_DIST_SITE'), ['http://mirror.example.com/'])
+
+    def test_include_disabled(self):
+        parser = MakefileParser(include_enabled=False)
+        parser.parse_file(os.path.join(self.root, 'cross/foo/Makefile'))
+        self.assertEqual(parser.get_var_values('COMMON_SITE'), None)
+        self.assertEqual(parser.get_var_values('MIRROR'), ['/mirror'])
+
+    def test_include_overlay(self):
+        parser = self.parse('cross/foo')
+        values = parser.evaluate_with({'PKG_NAME': 'foo2'}, ['PKG_DIST_SITE', 'PKG_DIST_NAME'])
+        self.assertEqual(values, {
+            'PKG_DIST_SITE': ['http://mirror.example.com/foo2'],
+            'PKG_DIST_NAME': ['foo2-1.0.tar.gz'],
+        })
+        self.assertEqual(parser.get_var_values('PKG_DIST_SITE'), ['http://mirror.example.com/foo'])
+
 
 if __name__ == '__main__':
     unittest.main()
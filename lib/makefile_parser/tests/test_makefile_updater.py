@@ -164,5 +164,90 @@ VALUE=56_$(TEST)_11"""
         self.assertEqual(tmp_parser.update_content('TEST', idx=[1,2]), True)
         self.assertEqual(tmp_parser.write_output(), text_excepted)
 
+    def test_update_var_value_keep_spaces_and_comment(self):
+        text = """TEST = 10 # comment
+VALUE=56_$(TEST)_11"""
+        text_excepted = """TEST = 9876# comment
+VALUE=56_$(TEST)_11"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+        self.assertEqual(tmp_parser.get_var_spans('TEST'), [(0, 7, 10)])
+
+        tmp_parser.set_var_values('TEST', '9876')
+
+        self.assertEqual(tmp_parser.update_content('TEST'), True)
+        self.assertEqual(tmp_parser.write_output(), text_excepted)
+
+    def test_update_var_value_twice(self):
+        text = """AAAA=1000
+TEST=10"""
+        text_excepted = """AAAA=1000
+TEST=5"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+
+        tmp_parser.set_var_values('TEST', '123456')
+        self.assertEqual(tmp_parser.update_content('TEST'), True)
+        tmp_parser.set_var_values('TEST', '5')
+        self.assertEqual(tmp_parser.update_content('TEST'), True)
+        self.assertEqual(tmp_parser.write_output(), text_excepted)
+
+    def test_update_empty_var_value(self):
+        text = """TEST=
+VALUE=56_$(TEST)_11"""
+        text_excepted = """TEST=10
+VALUE=56_$(TEST)_11"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+
+        tmp_parser.set_var_values('TEST', '10')
+        self.assertEqual(tmp_parser.update_content('TEST'), True)
+        self.assertEqual(tmp_parser.write_output(), text_excepted)
+
+    def test_update_multiple_vars(self):
+        text = """PKG_NAME = boost
+PKG_VERS = 1.63.0
+PKG_EXT = tar.bz2
+PKG_DIST_NAME = $(PKG_NAME)_$(PKG_VERS).$(PKG_EXT)"""
+        text_excepted = """PKG_NAME = boost
+PKG_VERS = 1.71.0
+PKG_EXT = tar.xz
+PKG_DIST_NAME = $(PKG_NAME)_$(PKG_VERS).$(PKG_EXT)"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+
+        tmp_parser.set_var_values('PKG_VERS', '1.71.0')
+        tmp_parser.set_var_values('PKG_EXT', 'tar.xz')
+
+        self.assertEqual(tmp_parser.update_contents(['PKG_VERS', 'PKG_EXT']), True)
+        self.assertEqual(tmp_parser.write_output(), text_excepted)
+
+    def test_update_multiple_vars_with_call(self):
+        text = """PKG_VERS = 1.63.0
+PKG_DIST_NAME = boost_$(PKG_VERS).tar.bz2"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+
+        tmp_parser.set_var_values('PKG_VERS', '1.71.0')
+
+        self.assertEqual(tmp_parser.update_contents({'PKG_VERS': 0, 'PKG_DIST_NAME': None}), False)
+        self.assertEqual(tmp_parser.write_output(), """PKG_VERS = 1.71.0
+PKG_DIST_NAME = boost_$(PKG_VERS).tar.bz2""")
+
+    def test_update_overlay(self):
+        text = """PKG_VERS = 1.63.0
+PKG_DIST_NAME = boost_$(PKG_VERS).tar.bz2"""
+        tmp_parser = MakefileUpdater()
+        tmp_parser.parse_text(text)
+
+        overlay = tmp_parser.overlay({'PKG_VERS': '1.71.0'})
+        self.assertEqual(overlay.get_var_values('PKG_DIST_NAME'), ['boost_1.71.0.tar.bz2'])
+        self.assertEqual(overlay.update_content('PKG_VERS'), True)
+        self.assertEqual(overlay.write_output(), """PKG_VERS = 1.71.0
+PKG_DIST_NAME = boost_$(PKG_VERS).tar.bz2""")
+        self.assertEqual(tmp_parser.write_output(), text)
+        self.assertEqual(tmp_parser.get_var_values('PKG_DIST_NAME'), ['boost_1.63.0.tar.bz2'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import logging
+import threading
+import contextlib
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Metrics(object):
+    """ Lightweight timing spans and counters.
+    Data are plain dicts so they can be returned by the pool workers and merged in the main process.
+    """
+
+    # Upper bounds (in seconds) of the histograms buckets
+    buckets = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self, package=None):
+        self._package = package
+        self._phases = {}
+        self._hosts = {}
+        self._counters = {}
+        self._histograms = {}
+        # Pages can be downloaded by several threads
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # The metrics are sent to the workers of the pool: the lock can't be pickled
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """ Delete the data, e.g. before a new run of a long-running process (serve, watch)
+        """
+        with self._lock:
+            self._phases = {}
+            self._hosts = {}
+            self._counters = {}
+            self._histograms = {}
+
+    def set_package(self, package):
+        """ Set the package used for the next spans
+        """
+        self._package = package
+
+    @contextlib.contextmanager
+    def span(self, phase, host=None):
+        """ Measure the duration of a phase for the current package (and host)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start, host)
+
+    def add_time(self, phase, duration, host=None):
+        """ Add a duration to a phase for the current package (and host)
+        """
+        with self._lock:
+            phases = self._phases.setdefault(self._package, {})
+            stats = phases.setdefault(phase, [0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+
+            if host is not None:
+                stats = self._hosts.setdefault(host, {})
+                stats['time'] = stats.get('time', 0.0) + duration
+
+    def increment(self, counter, value=1, host=None):
+        """ Increment a global counter or a counter of a host
+        """
+        with self._lock:
+            if host is not None:
+                stats = self._hosts.setdefault(host, {})
+                stats[counter] = stats.get(counter, 0) + value
+            else:
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def observe(self, histogram, value, label=''):
+        """ Add a value (duration) in a histogram
+        """
+        stats = self._histograms.setdefault(histogram, {}).setdefault(label, {
+            'buckets': [0] * len(Metrics.buckets), 'count': 0, 'sum': 0.0})
+        for i, bound in enumerate(Metrics.buckets):
+            if value <= bound:
+                stats['buckets'][i] += 1
+        stats['count'] += 1
+        stats['sum'] += value
+
+    def get_data(self):
+        """ Return the data to merge them in another instance
+        """
+        return {'phases': self._phases, 'hosts': self._hosts, 'counters': self._counters, 'histograms': self._histograms}
+
+    def merge(self, data):
+        """ Merge the data of another instance
+        """
+        for package, phases in data['phases'].items():
+            for phase, (count, duration) in phases.items():
+                stats = self._phases.setdefault(package, {}).setdefault(phase, [0, 0.0])
+                stats[0] += count
+                stats[1] += duration
+
+        for host, counters in data['hosts'].items():
+            stats = self._hosts.setdefault(host, {})
+            for counter, value in counters.items():
+                stats[counter] = stats.get(counter, 0) + value
+
+        for counter, value in data['counters'].items():
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+        for histogram, labels in data.get('histograms', {}).items():
+            for label, values in labels.items():
+                stats = self._histograms.setdefault(histogram, {}).setdefault(label, {
+                    'buckets': [0] * len(Metrics.buckets), 'count': 0, 'sum': 0.0})
+                stats['buckets'] = [a + b for a, b in zip(stats['buckets'], values['buckets'])]
+                stats['count'] += values['count']
+                stats['sum'] += values['sum']
+
+    def get_counter(self, counter, default=0):
+        """ Return the value of a global counter
+        """
+        return self._counters.get(counter, default)
+
+    def get_hosts(self):
+        """ Return the counters of each host
+        """
+        return self._hosts
+
+    def get_histograms(self):
+        """ Return the histograms by label
+        """
+        return self._histograms
+
+    def get_phases(self):
+        """ Return the count and the duration of each phase for all packages
+        """
+        result = {}
+        for phases in self._phases.values():
+            for phase, (count, duration) in phases.items():
+                stats = result.setdefault(phase, {'count': 0, 'time': 0.0})
+                stats['count'] += count
+                stats['time'] += duration
+
+        return result
+
+    def get_packages_duration(self, phase='search'):
+        """ Return the duration of a phase for each package, slowest first
+        """
+        durations = [(package, phases[phase][1]) for package, phases in self._phases.items() if package and phase in phases]
+
+        return sorted(durations, key=lambda x: x[1], reverse=True)
+
+    def get_hosts_duration(self):
+        """ Return the duration of the requests for each host, slowest first
+        """
+        durations = [(host, stats.get('time', 0.0)) for host, stats in self._hosts.items()]
+
+        return sorted(durations, key=lambda x: x[1], reverse=True)
+
+    def get_report(self):
+        """ Return the report of the run
+        """
+        packages = {}
+        for package, phases in self._phases.items():
+            packages[package or ''] = {phase: {'count': count, 'time': duration} for phase, (count, duration) in phases.items()}
+
+        return {
+            'counters': self._counters,
+            'phases': self.get_phases(),
+            'hosts': self._hosts,
+            'histograms': self._histograms,
+            'packages': packages,
+        }
+
+    def save_report(self, path):
+        """ Save the report in a JSON file
+        """
+        with open(path, 'w') as f:
+            json.dump(self.get_report(), f, indent=2, sort_keys=True)
+        _LOGGER.info("Report saved in %s", path)
+
+    def pprint_summary(self, top=10):
+        """ Print a summary with the slowest packages and hosts
+        """
+        print("Run summary:")
+        for counter, value in sorted(self._counters.items()):
+            print(" - {:<30} {}".format(counter, value))
+
+        print("Phases:")
+        for phase, stats in sorted(self.get_phases().items(), key=lambda x: x[1]['time'], reverse=True):
+            print(" - {:<30} {:>10.3f}s {:>8}".format(phase, stats['time'], stats['count']))
+
+        print("Slowest packages:")
+        for package, duration in self.get_packages_duration()[0:top]:
+            print(" - {:<30} {:>10.3f}s".format(package, duration))
+
+        print("Slowest hosts:")
+        for host, duration in self.get_hosts_duration()[0:top]:
+            stats = self._hosts[host]
+            print(" - {:<30} {:>10.3f}s {:>8} requests {:>12} bytes {:>4} errors".format(
+                host, duration, stats.get('requests', 0), stats.get('bytes', 0), stats.get('errors', 0)))
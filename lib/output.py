@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import csv
+import json
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Output(object):
+    """ Write the records of an action as soon as they are available.
+    Formats:
+      - table: fixed-width text, one line per record
+      - jsonl: one JSON object per line
+      - csv: header from the keys of the first record, lists are joined with spaces
+    """
+
+    formats = ['table', 'jsonl', 'csv']
+
+    def __init__(self, output_format='table', path=None):
+        if output_format not in Output.formats:
+            raise ValueError("Unknown output format: {}".format(output_format))
+
+        self._format = output_format
+        self._path = path
+        self._file = None
+        self._csv_writer = None
+        self._table = str
+        self._header = None
+
+    def set_table(self, table, header=None):
+        """ Set the function to convert a record in a line and the header of the table
+        """
+        self._table = table
+        self._header = header
+
+    def _open(self):
+        if self._path:
+            self._file = open(self._path, 'w', newline='')
+        else:
+            self._file = sys.stdout
+
+        if self._format == 'table' and self._header is not None:
+            self._file.write(self._header + '\n')
+
+    def write(self, record):
+        """ Write a record
+        """
+        if self._file is None:
+            self._open()
+
+        if self._format == 'jsonl':
+            self._file.write(json.dumps(record) + '\n')
+        elif self._format == 'csv':
+            row = {k: ' '.join(v) if isinstance(v, list) else v for k, v in record.items()}
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=list(row.keys()), lineterminator='\n')
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(row)
+        else:
+            self._file.write(self._table(record) + '\n')
+
+        self._file.flush()
+
+    def close(self):
+        """ Close the output file
+        """
+        if self._file is None and self._format == 'table' and self._header is not None:
+            # Print the header of an empty table
+            self._open()
+
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+            _LOGGER.info("Output saved in %s", self._path)
+        self._file = None
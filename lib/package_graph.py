@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PackageGraph(object):
+    """ Graph of the dependencies between the packages.
+    The packages are small integer ids in the graph: the edges are sets of integers,
+    the names are only used to add the packages and to return the results.
+    """
+
+    def __init__(self):
+        # name => id and id => name
+        self._ids = {}
+        self._names = []
+        # id => ids of the dependencies and of the parents
+        self._depends = []
+        self._parents = []
+        # ids of the packages added (the other ids are only dependencies)
+        self._known = set()
+
+    def get_id(self, name):
+        """ Return the id of a package, added if it is unknown
+        """
+        package_id = self._ids.get(name)
+        if package_id is None:
+            package_id = len(self._names)
+            self._ids[name] = package_id
+            self._names.append(name)
+            self._depends.append(set())
+            self._parents.append(set())
+
+        return package_id
+
+    def get_name(self, package_id):
+        return self._names[package_id]
+
+    def get_names(self, package_ids):
+        return [self._names[package_id] for package_id in package_ids]
+
+    def add(self, name, depends):
+        """ Add a package and its dependencies (merged with the dependencies already added)
+        """
+        package_id = self.get_id(name)
+        self._known.add(package_id)
+        for depend in depends:
+            depend_id = self.get_id(depend)
+            self._depends[package_id].add(depend_id)
+            self._parents[depend_id].add(package_id)
+
+    def get_depends(self, name):
+        """ Return the dependencies of a package, sorted by name
+        """
+        package_id = self._ids.get(name)
+        if package_id is None:
+            return []
+
+        return sorted(self.get_names(self._depends[package_id]))
+
+    def get_parents(self, name):
+        """ Return the packages which depend on a package added, sorted by name
+        """
+        package_id = self._ids.get(name)
+        if package_id is None or package_id not in self._known:
+            return []
+
+        return sorted(self.get_names(self._parents[package_id]))
+
+    def get_descendants(self, names, expandable=None):
+        """ Return the names of the dependencies of the packages, and of their dependencies
+        expandable: names of the packages whose dependencies are followed beyond the first level (all if None)
+        """
+        expandable_ids = None if expandable is None else {self._ids[name] for name in expandable if name in self._ids}
+
+        found = set()
+        stack = []
+        for name in names:
+            package_id = self._ids.get(name)
+            if package_id is not None:
+                stack.extend(self._depends[package_id])
+
+        while stack:
+            package_id = stack.pop()
+            if package_id in found:
+                continue
+            found.add(package_id)
+            if expandable_ids is None or package_id in expandable_ids:
+                stack.extend(self._depends[package_id] - found)
+
+        return set(self.get_names(found))
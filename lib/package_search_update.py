@@ -5,25 +5,31 @@ import os
 import shutil
 import re
 import time
-import copy
 import logging
 import collections
 import pickle
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
-import git as git
-import svn as svn
-import svn.remote
-import svn.local
 import requests
-from ftplib import FTP
+import ftplib
 import json
 
-from urllib.parse import urlparse, ParseResult, unquote
+from urllib.parse import urlparse, ParseResult, unquote, quote
 from pkg_resources import parse_version
 from bs4 import BeautifulSoup
 
 from .config import Config
 from .cache import Cache
+from .metrics import Metrics
+from .host_scheduler import HostScheduler
+from .forge_adapters import ForgeAdapter
+from .ftp_pool import FtpPool
+from .git_mirrors import GitMirrors
+from .vcs_backend import VcsBackend, VcsError
+from .content_matcher import ContentMatcher
+from .transport import Transport
+from .interning import Interning
 # from .tools import Tools
 from .makefile_parser.makefile_parser import MakefileParser
 
@@ -49,31 +55,167 @@ class PackageSearchUpdate(object):
     regex_extensions_replace_from = "|".join([re.escape(re.escape("." + e)) for e in extensions_to_download])
     regex_extensions_replace_to = "|".join([re.escape(e) for e in extensions_to_download])
 
+    # HTTP session shared by the searches of a process (keep-alive connections)
+    _session = None
+    _session_pid = None
+
+    # Scheduler of the requests by host (shared by the workers of a pool)
+    _scheduler = None
+
+    # FTP connections kept open by the searches of a process
+    _ftp_pool = None
+    _ftp_pool_pid = None
+
+    # Transport of the requests of a process (live, record or replay)
+    _transport = None
+    _transport_pid = None
+
+    # Backend of the git and svn commands of a process
+    _vcs_backend = None
+    _vcs_backend_pid = None
+
+    # Methods searched with the commands of the VCS backend
+    methods_vcs = ['git', 'svn']
+
     def __init__(self, package, path):
         self._package = package
         self._path = path
         self._cache_dir = os.path.join(Config.get('cache_dir'), self._package)
-        self._cache = Cache(dir=self._cache_dir, duration=Config.get("cache_duration_search_update_download"))
+        self._metrics = Metrics(package)
+        self._cache = Cache(dir=self._cache_dir, duration=Config.get("cache_duration_search_update_download"), metrics=self._metrics)
         self._urls_downloaded = {}
+        # Pages downloaded in parallel before to be handled by _get_url_data
+        self._prefetched = {}
         self._parser = None
         self._versions = {}
+        # True if the versions were loaded from the cache instead of searched
+        self._versions_cached = False
         self._current_version = None
+        # The git mirrors fetched after this date are not fetched again
+        self._fetch_since = None
 
         _LOGGER.debug("[Package:%s] path: %s", self._package, path)
 
+    @classmethod
+    def get_session(cls):
+        """ Return the HTTP session of the current process
+        The session is not reused in a forked worker to not share its connections
+        """
+        if cls._session is None or cls._session_pid != os.getpid():
+            cls._session = requests.Session()
+            cls._session.headers['User-Agent'] = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:52.0) Gecko/20100101 Firefox/52.0'
+            cls._session_pid = os.getpid()
+
+        return cls._session
+
+    @classmethod
+    def get_ftp_pool(cls):
+        """ Return the pool of FTP connections of the current process
+        """
+        if cls._ftp_pool is None or cls._ftp_pool_pid != os.getpid():
+            cls._ftp_pool = FtpPool(idle_timeout=Config.get('ftp_idle_timeout'))
+            cls._ftp_pool_pid = os.getpid()
+
+        return cls._ftp_pool
+
+    @classmethod
+    def get_transport(cls):
+        """ Return the transport of the requests of the current process
+        """
+        if cls._transport is None or cls._transport_pid != os.getpid():
+            cls._transport = Transport.create(Config.get('transport_mode'), cls.get_session(), cls.get_ftp_pool(),
+                                              Config.get('transport_archive'))
+            cls._transport_pid = os.getpid()
+
+        return cls._transport
+
+    @classmethod
+    def get_vcs_backend(cls):
+        """ Return the backend of the git and svn commands of the current process
+        """
+        if cls._vcs_backend is None or cls._vcs_backend_pid != os.getpid():
+            cls._vcs_backend = VcsBackend(max_parallel=Config.get('vcs_max_parallel'), timeout=Config.get('vcs_timeout'))
+            cls._vcs_backend_pid = os.getpid()
+
+        return cls._vcs_backend
+
+    @classmethod
+    def set_scheduler(cls, scheduler):
+        """ Set the scheduler of the requests by host used by the current process
+        """
+        cls._scheduler = scheduler
+
+    @classmethod
+    def get_scheduler(cls):
+        """ Return the scheduler of the requests by host (None if disabled or if the responses are replayed)
+        """
+        enabled = Config.get('scheduler_enabled') and Config.get('transport_mode') != 'replay'
+        if cls._scheduler is None and enabled:
+            cls._scheduler = HostScheduler.create(Config)
+
+        return cls._scheduler if enabled else None
+
+    @contextlib.contextmanager
+    def _request_slot(self, host):
+        """ Wait for the scheduler to send a request to a host
+        """
+        scheduler = self.get_scheduler()
+        if scheduler is None:
+            yield {'retry_after': None}
+            return
+
+        with scheduler.request(host) as slot:
+            yield slot
+
+    def _http_get(self, url, host, headers=None):
+        """ Get an URL, retry after a pause when the host throttles the requests
+        """
+        scheduler = self.get_scheduler()
+        retries = Config.get('scheduler_max_retries')
+        while True:
+            with self._request_slot(host) as slot:
+                req = self.get_transport().get(url, headers)
+                if scheduler:
+                    slot['retry_after'] = scheduler.get_retry_after(req)
+
+            if slot['retry_after'] is None or retries <= 0:
+                return req
+
+            retries -= 1
+            self._metrics.increment('throttled', host=host)
+            _LOGGER.info("[Package:%s]: Host %s throttles requests, retry after %.1fs", self._package, host, slot['retry_after'])
+
+    def set_fetch_since(self, since):
+        """ Set the start of the run: the shared git mirrors are fetched once by run
+        """
+        self._fetch_since = since
+
     def set_parser(self, parser):
         """ Set parser instance
         """
         self._parser = parser
 
+    def clear_cache(self):
+        """ Delete the pages and the versions found in cache (e.g. after a change of the Makefile)
+        """
+        self._cache.clear('list.pkl')
+        self._cache.clear('versions.pkl')
+
+    def get_metrics(self):
+        """ Get metrics instance
+        """
+        return self._metrics
+
     def get_parser(self):
         """ Get parser instance
         """
         if not self._parser:
-            self._parser = MakefileParser()
+            self._parser = MakefileParser(max_possibilities=Config.get('parser_max_possibilities'),
+                                          include_enabled=Config.get('parser_include_enabled'))
 
         if not self._parser.is_parsed():
-            self._parser.parse_file(self._path)
+            with self._metrics.span('parse'):
+                self._parser.parse_file(self._path)
 
         return self._parser
 
@@ -135,64 +277,47 @@ class PackageSearchUpdate(object):
 
         return self._current_version
 
-    def _search_updates_git(self):
+    async def _search_updates_git(self):
         """ Search new tags or commits in git repository
         """
         url = self.get_url()
 
-        # Temp path to clone reository
-        git_path = os.path.join(self._cache_dir, 'git')
         # Get current Hash of package
         git_hash = self.get_version()
 
         _LOGGER.info("[Package:%s]: Current git hash: %s", self._package, git_hash)
 
-        # State file to determine when the repository is cloned
-        git_is_cloned = os.path.join(self._cache_dir, '.git_clone')
-        if not os.path.exists(git_is_cloned):
-            # Remove partial cloned dir
-            if os.path.exists(git_path):
-                shutil.rmtree(git_path)
-
-            # Clone repository
-            _LOGGER.info("[Package:%s]: Clone repository: %s", self._package, url)
-            try:
-                git.Repo.clone_from(url, git_path)
-            except git.GitCommandError as exception:
-                _LOGGER.info("[Package:%s]: Error to clone git", self._package)
-                return
-
-            # Touch the state file
-            open(git_is_cloned, 'w').close()
-            _LOGGER.info("[Package:%s]: Repository cloned", self._package)
-
-        # Fetch and pull
-        _LOGGER.info("[Package:%s]: Fetch and pull git", self._package)
-        repo = git.Repo(git_path)
-        for remote in repo.remotes:
-            remote.fetch()
-            remote.pull()
-
-        new_versions = collections.OrderedDict()
-
-        tags = repo.tags
-        if len(tags) > 0:
-            # Has tag: List new tags
-            _LOGGER.info("[Package:%s]: Has tags: Get new versions from tags", self._package)
-            tags.sort(key=lambda t: t.commit.committed_datetime)
-            for c in repo.iter_commits(git_hash + '..HEAD'):
-                tag = next((tag for tag in repo.tags if tag.commit == c), None)
-                if tag is not None:
-                    new_versions[str(tag)] = {'hash': str(tag)}
-        else:
-            # No tags: list new commits
-            _LOGGER.info("[Package:%s]: No tags: Get new versions from commits", self._package)
-            for c in repo.iter_commits(git_hash + '..HEAD'):
-                new_versions[str(c)] = {'hash': str(c)}
+        # Remove the clone of the package made before the shared mirrors
+        for path in [os.path.join(self._cache_dir, 'git'), os.path.join(self._cache_dir, '.git_clone')]:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+        # Bare mirror shared by the packages using the same upstream
+        backend = self.get_vcs_backend()
+        mirrors = GitMirrors(Config.get('git_mirrors_dir'), backend)
+        is_cloned = mirrors.exists(url)
+        _LOGGER.info("[Package:%s]: %s mirror: %s", self._package, 'Fetch' if is_cloned else 'Clone', url)
+        try:
+            if not is_cloned:
+                self._metrics.increment('clones')
+            with self._metrics.span('git_fetch' if is_cloned else 'git_clone'):
+                git_path = await mirrors.update(url, self._fetch_since)
+        except VcsError as exception:
+            _LOGGER.info("[Package:%s]: Error to fetch git: %s", self._package, exception)
+            return
+
+        # New tags if the repository has tags, otherwise new commits
+        try:
+            new_versions = await backend.git_new_versions(git_path, git_hash)
+        except VcsError as exception:
+            _LOGGER.info("[Package:%s]: Error to read git log: %s", self._package, exception)
+            return
 
         return new_versions
 
-    def _search_updates_svn(self):
+    async def _search_updates_svn(self):
         """ Search new tags or revision in subversion repository
         """
         url = self.get_url()
@@ -208,6 +333,8 @@ class PackageSearchUpdate(object):
 
         _LOGGER.info("[Package:%s]: Current svn revision: %s", self._package, svn_rev)
 
+        backend = self.get_vcs_backend()
+
         # State file to determine when the repository is checkout
         svn_is_checkout = os.path.join(self._cache_dir, '.svn_checkout')
         if not os.path.exists(svn_is_checkout):
@@ -218,33 +345,49 @@ class PackageSearchUpdate(object):
             # Checkout repository
             _LOGGER.info("[Package:%s]: Checkout repository: %s", self._package, url)
             try:
-                repo = svn.remote.RemoteClient(url)
-                repo.checkout(svn_path)
-            except:
-                _LOGGER.info("[Package:%s]: Error to checkout svn", self._package)
+                self._metrics.increment('clones')
+                with self._metrics.span('svn_checkout'):
+                    await backend.svn('checkout', '--quiet', url, svn_path)
+            except VcsError as exception:
+                _LOGGER.info("[Package:%s]: Error to checkout svn: %s", self._package, exception)
                 return
 
             # Touch the state file
             open(svn_is_checkout, 'w').close()
             _LOGGER.info("[Package:%s]: Repository checkout", self._package)
 
-        repo = svn.local.LocalClient(svn_path)
+        try:
+            # Update repository
+            _LOGGER.info("[Package:%s]: Update svn", self._package)
+            with self._metrics.span('svn_update'):
+                await backend.svn('update', '--quiet', cwd=svn_path)
+
+            # Get new revision in /tags repository
+            _LOGGER.info("[Package:%s]: Get new revisions in /tags directory", self._package)
+            revisions = await backend.svn_new_revisions(svn_path, svn_rev_next)
+        except VcsError as exception:
+            _LOGGER.info("[Package:%s]: Error to update svn: %s", self._package, exception)
+            return
 
-        # Update repository
-        _LOGGER.info("[Package:%s]: Update svn", self._package)
-        repo.update()
+        # Return in reversed order
+        return collections.OrderedDict((rev, {'rev': rev}) for rev in reversed(revisions))
 
-        new_versions = collections.OrderedDict()
+    @staticmethod
+    def _get_ftp_hrefs(entries):
+        """ Return the hrefs of the entries (name, is_dir) of a FTP directory
+        """
+        hrefs = []
+        for name, is_dir in entries:
+            href = quote(name) + ('/' if is_dir else '')
+            hrefs.append(Interning.href(href))
 
-        # Get new revision in /tags repository
-        _LOGGER.info("[Package:%s]: Get new revisions in /tags directory", self._package)
-        tags_rev = repo.log_default(
-            None, None, None, '^/tags', None, svn_rev_next, None)
-        for rev in tags_rev:
-            new_versions[str(rev.revision)] = {'rev': str(rev.revision)}
+        return hrefs
 
-        # Return in reversed order
-        return collections.OrderedDict(reversed(list(new_versions.items())))
+    @staticmethod
+    def _parse_ftp_list(files):
+        """ Return the hrefs of the lines returned by the LIST command on FTP
+        """
+        return PackageSearchUpdate._get_ftp_hrefs(FtpPool.parse_list(files))
 
     def _download_content(self, url, old_url):
         """ Download the content of an url (HTTP or FTP)
@@ -259,42 +402,43 @@ class PackageSearchUpdate(object):
         history = []
         if url_p.scheme == 'ftp':
             # Get content page on FTP
+            self._metrics.increment('requests', host=url_p.netloc)
             try:
-                ftp = FTP(url_p.netloc)
-                ftp.login()
-                ftp.cwd(url_p.path)
-                files = []
-                ftp.retrlines('LIST', files.append)
-                hrefs = []
-                for f in files:
-                    infos = f.split(' ')
-                    file = infos[-1]
-                    if infos[0][0] == 'd':
-                        file += '/'
-                    hrefs.append({'href': file, 'href_p': urlparse(file), 'content': ''})
-            except:
-                _LOGGER.info('Error to connect on FTP')
+                with self._metrics.span('download', host=url_p.netloc), self._request_slot(url_p.netloc):
+                    entries = self.get_transport().list_ftp(url_p.hostname, unquote(url_p.path), url_p.port, url_p.username, url_p.password)
+                hrefs = self._get_ftp_hrefs(entries)
+            except (ftplib.Error, OSError, EOFError) as e:
+                self._metrics.increment('errors', host=url_p.netloc)
+                _LOGGER.info("[Package:%s]: Error to list FTP directory %s: %s", self._package, url, e)
                 return None
+
+            self._metrics.increment('pages_fetched')
+            self._metrics.increment('bytes_downloaded', sum(len(name) for name, _ in entries))
         else:
             # Get content page on HTTP
             try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:52.0) Gecko/20100101 Firefox/52.0'
-                }
-                req = requests.get(url, allow_redirects=True, headers=headers)
+                self._metrics.increment('requests', host=url_p.netloc)
+                with self._metrics.span('download', host=url_p.netloc):
+                    req = self._http_get(url, url_p.netloc)
             except:
                 # Catch server not found
+                self._metrics.increment('errors', host=url_p.netloc)
                 _LOGGER.info("[Package:%s]: Error to download page: %s", self._package, url)
                 return None
 
             # If code 200
             if req.status_code == requests.codes.ok:
+                self._metrics.increment('pages_fetched')
+                self._metrics.increment('bytes_downloaded', len(req.content))
+                self._metrics.increment('bytes', len(req.content), host=url_p.netloc)
                 hrefs = []
                 # Get url after redirection
                 url = req.url.rstrip('/')
                 # Get history of redirection
                 history = req.history
 
+                html_parse_start = time.perf_counter()
+
                 # Text filter to avoid ads
                 content = req.text
                 content_filtered = ''
@@ -337,20 +481,199 @@ class PackageSearchUpdate(object):
                         base_url = 'http://' + project + '.googlecode.com/files/'
                         for info in j['downloads']:
                             href = base_url + info['filename']
-                            hrefs.append({'href': href, 'href_p': urlparse(href), 'content': ''})
+                            hrefs.append(Interning.href(href))
                 else:
                     soup = BeautifulSoup(content, "html5lib")
                     for item in soup.find_all("a"):
                         href = item.get('href')
                         if href:
-                            hrefs.append({'href': href, 'href_p': urlparse(href), 'content': str(item.next).strip()})
+                            hrefs.append(Interning.href(href, str(item.next).strip()))
+
+                self._metrics.add_time('html_parse', time.perf_counter() - html_parse_start)
             else:
                 # In case of code different to 200
+                self._metrics.increment('errors', host=url_p.netloc)
                 _LOGGER.info("[Package:%s]: Error to download page: %s", self._package, url)
                 return None
 
         return {'type': url_p.scheme, 'url': url, 'url_p': url_p, 'hrefs': hrefs, 'history': history, 'content': content}
 
+    def _get_forge_data(self, url):
+        """ Get the files of the project from the JSON API of a forge (GitHub, PyPI)
+        Return True if files of the package were found: the pages are crawled otherwise
+        """
+        api_urls = {}
+        # The anonymous requests are limited to 60 per hour: a run would be throttled after 30 packages
+        if Config.get('forge_github_api') and (Config.get('forge_github_token') or Config.get('forge_github_anonymous')):
+            api_urls['github'] = Config.get('forge_github_api')
+        if Config.get('forge_pypi_api'):
+            api_urls['pypi'] = Config.get('forge_pypi_api')
+
+        adapter = ForgeAdapter.get_adapter(url, api_urls, {'github': Config.get('forge_github_token')})
+        if not adapter:
+            return False
+
+        url_p = urlparse(url)
+        pages = {}
+        api_urls = adapter.get_api_urls(url_p)
+        nb_pages = {api_url: 1 for api_url in api_urls}
+        while api_urls:
+            api_url = api_urls.pop(0)
+            api_url_p = urlparse(api_url)
+            _LOGGER.info("[Package:%s]: Download forge API: %s", self._package, api_url)
+            self._metrics.increment('requests', host=api_url_p.netloc)
+            try:
+                with self._metrics.span('download', host=api_url_p.netloc):
+                    req = self._http_get(api_url, api_url_p.netloc, adapter.get_headers())
+            except requests.exceptions.RequestException:
+                req = None
+
+            if req is None or req.status_code != requests.codes.ok:
+                self._metrics.increment('errors', host=api_url_p.netloc)
+                _LOGGER.info("[Package:%s]: Error to download forge API: %s", self._package, api_url)
+                continue
+
+            self._metrics.increment('pages_fetched')
+            self._metrics.increment('bytes_downloaded', len(req.content))
+            self._metrics.increment('bytes', len(req.content), host=api_url_p.netloc)
+
+            # Next page of the listing
+            next_url = req.links.get('next', {}).get('url')
+            if next_url and next_url not in nb_pages and nb_pages[api_url] < Config.get('forge_max_pages'):
+                nb_pages[next_url] = nb_pages[api_url] + 1
+                api_urls.append(next_url)
+
+            try:
+                hrefs = adapter.parse(req.json(), url_p)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                _LOGGER.info("[Package:%s]: Invalid data from forge API %s: %s", self._package, api_url, e)
+                continue
+
+            if hrefs:
+                pages[api_url] = {'type': api_url_p.scheme, 'url': api_url, 'url_p': api_url_p, 'hrefs': hrefs, 'history': [], 'content': ''}
+
+        # The files of the package can be elsewhere (e.g. a release asset of a repository whose tags are found)
+        regex_filename = self._generate_regex_filename()
+        if not any(regex_filename.search(unquote(href['href_p'].path)) for data in pages.values() for href in data['hrefs']):
+            if pages:
+                _LOGGER.info("[Package:%s]: No file of the package found by the forge API", self._package)
+            return False
+
+        self._urls_downloaded.update(pages)
+        return True
+
+    @staticmethod
+    def get_next_versions(version):
+        """ Return the candidates of the next version: patch, minor and major bumps of a version made of numbers
+        The separators and the width of the numbers are kept: 1_2_09 => 1_2_10, 1_3_00, 2_0_00
+        A version with two numbers has a patch version too: 1.0 => 1.0.1, 1.1, 2.0
+        Return an empty list when the next versions can't be guessed (e.g. 1.2rc1 or a date 20180131)
+        """
+        if not re.match('^[0-9]{1,3}([._-][0-9]+)+$', version):
+            return []
+
+        parts = re.split('([._-])', version)
+        candidates = []
+        if len(parts) < 5:
+            candidates.append(version + parts[-2] + '1')
+        for i in reversed(range(0, len(parts), 2)):
+            bumped = list(parts)
+            bumped[i] = str(int(parts[i]) + 1).zfill(len(parts[i]))
+            for j in range(i + 2, len(parts), 2):
+                # Keep the leading zeros: 09 => 00
+                bumped[j] = '0'.zfill(len(parts[j]) if parts[j].startswith('0') else 1)
+            candidates.append(''.join(bumped))
+
+        return candidates
+
+    def _get_version_url(self, version):
+        """ Return the URL of the file of a version by evaluating PKG_DIST_SITE/PKG_DIST_NAME with it
+        """
+        values = self.get_parser().evaluate_with({'PKG_VERS': version}, ['PKG_DIST_NAME', 'PKG_DIST_SITE'])
+        if not values['PKG_DIST_NAME'] or not values['PKG_DIST_SITE']:
+            return None
+
+        return values['PKG_DIST_SITE'][0] + '/' + values['PKG_DIST_NAME'][0]
+
+    def _probe_url(self, url):
+        """ Send a HEAD request to check if a file exists
+        Return True if the file exists, False if not and None if the answer is not conclusive
+        """
+        url_p = urlparse(url)
+        if url_p.scheme not in ['http', 'https']:
+            return None
+
+        self._metrics.increment('probes', host=url_p.netloc)
+        try:
+            with self._request_slot(url_p.netloc):
+                req = self.get_transport().head(url, timeout=Config.get('probe_timeout'))
+        except requests.exceptions.RequestException:
+            self._metrics.increment('errors', host=url_p.netloc)
+            return None
+
+        if req.status_code == requests.codes.ok:
+            # Some servers answer a HTML page for the missing files
+            return not req.headers.get('Content-Type', '').startswith('text/html')
+        if req.status_code in [requests.codes.not_found, requests.codes.gone]:
+            return False
+
+        return None
+
+    def _probe_next_versions(self, url):
+        """ Check with HEAD requests if the files of the next versions exist, then the next versions of the last version found
+        The probe is conclusive only if the file of the current version is found: the server answers to HEAD requests
+        and the URL is built like the URLs of the other versions.
+        Return True if next versions were found: the files found are added to the downloaded pages.
+        The next version can't always be guessed (e.g. 1.2.3 => 1.2.5 or 1.3), so the pages are crawled when none is found.
+        """
+        current_url = self.get_url()
+        candidates = self.get_next_versions(self._version)
+        if not candidates or not current_url:
+            return False
+
+        found = []
+        urls_probed = set()
+        with self._metrics.span('probe'):
+            for probe_round in range(Config.get('probe_max_rounds')):
+                urls = {}
+                for version in candidates:
+                    version_url = self._get_version_url(version)
+                    if version_url and version_url not in urls_probed and version_url != current_url:
+                        urls[version] = version_url
+                if probe_round == 0:
+                    if not urls:
+                        # The URL doesn't depend on the version
+                        return False
+                    urls[self._version] = current_url
+                if not urls:
+                    break
+                urls_probed.update(urls.values())
+
+                _LOGGER.info("[Package:%s]: Probe versions: %s", self._package, ', '.join(urls.keys()))
+                max_parallel = max(1, min(Config.get('crawl_max_parallel'), len(urls)))
+                with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+                    results = dict(zip(urls.keys(), executor.map(self._probe_url, urls.values())))
+
+                if probe_round == 0 and not results.pop(self._version):
+                    _LOGGER.info("[Package:%s]: Probe not conclusive, file of current version not found: %s", self._package, current_url)
+                    return False
+
+                versions_found = [version for version, exists in results.items() if exists]
+                if not versions_found:
+                    break
+                found += [urls[version] for version in versions_found]
+                candidates = self.get_next_versions(max(versions_found, key=parse_version))
+
+        if not found:
+            _LOGGER.info("[Package:%s]: Probe found no next version", self._package)
+            return False
+
+        _LOGGER.info("[Package:%s]: Probe found %d next version(s)", self._package, len(found))
+        hrefs = [Interning.href(href) for href in [current_url] + found]
+        self._urls_downloaded[url] = {'type': urlparse(url).scheme, 'url': url, 'url_p': urlparse(url), 'hrefs': hrefs, 'history': [], 'content': ''}
+
+        return True
+
     def _search_download_urls(self):
         """ Search link or content link which contains 'download'
         Return link found
@@ -446,8 +769,32 @@ class PackageSearchUpdate(object):
                         urls.append(url_found)
         return urls
 
-    def _get_url_data(self, url, depth=0, can_remove_version=True):
-        """ Get data for an url.
+    def _prefetch_contents(self, urls):
+        """ Download sibling pages (e.g. the directories of the versions) in parallel
+        The number of downloads in parallel is bounded by crawl_max_parallel (and the scheduler for each host)
+        """
+        # The pages are saved with the URLs requested by _get_url_data(url, 0, False)
+        urls_to_request = {}
+        for url in urls:
+            url_to_request = self._get_url_to_request(url, 0, False)
+            if url_to_request and url_to_request not in self._urls_downloaded and url_to_request not in self._prefetched:
+                urls_to_request.setdefault(url_to_request, url)
+
+        max_parallel = min(Config.get('crawl_max_parallel'), len(urls_to_request))
+        if max_parallel < 2:
+            return
+
+        def download(item):
+            url_to_request, url = item
+            _LOGGER.info("[Package:%s]: Download url page: %s", self._package, url_to_request)
+            return self._download_content(url_to_request, url)
+
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            for url_to_request, content_request in zip(urls_to_request, executor.map(download, urls_to_request.items())):
+                self._prefetched[url_to_request] = content_request
+
+    def _get_url_to_request(self, url, depth=0, can_remove_version=True):
+        """ Return the URL of the page to request for an url (None if there is no page for this depth)
         Depth define the path to remove from the url
         """
         url_p = urlparse(url)
@@ -538,14 +885,27 @@ class PackageSearchUpdate(object):
         if not url_to_request:
             url_to_request = url_to_request_base + '/'.join(path_splitted)
 
+        return url_to_request
+
+    def _get_url_data(self, url, depth=0, can_remove_version=True):
+        """ Get data for an url.
+        Depth define the path to remove from the url
+        """
+        url_to_request = self._get_url_to_request(url, depth, can_remove_version)
+        if not url_to_request:
+            return None
+
         # Avoid to download page more than one time
         if url_to_request in self._urls_downloaded:
             _LOGGER.info("[Package:%s]: Url page already download: %s", self._package, url_to_request)
             return None
 
-        # Download page content
-        _LOGGER.info("[Package:%s]: Download url page: %s", self._package, url_to_request)
-        content_request = self._download_content(url_to_request, url)
+        # Download page content
+        if url_to_request in self._prefetched:
+            content_request = self._prefetched.pop(url_to_request)
+        else:
+            _LOGGER.info("[Package:%s]: Download url page: %s", self._package, url_to_request)
+            content_request = self._download_content(url_to_request, url)
 
         # In case of empty result, return None
         if not content_request:
@@ -568,38 +928,23 @@ class PackageSearchUpdate(object):
 
         return True
 
-    def _generate_regex_filename_path(self):
-        """ Return a regex to find the filename with version, extension and path
+    def _generate_content_matcher(self):
+        """ Return a matcher to find the filename with version, extension and path in the content of a page
         """
-        tmp_parser = copy.copy(self.get_parser())
-        tmp_parser.set_var_values('PKG_VERS', 'XXXVERXXX')
-        tmp_parser.evaluate_var('PKG_DIST_NAME')
-        filename = tmp_parser.get_var_values('PKG_DIST_NAME')
-
-        regex_path = '((([\w/:]*)))'
-        if 'XXXVERXXX' not in filename[0]:
-            tmp_parser.evaluate_var('PKG_DIST_SITE')
-            pkg_site_p = urlparse(
-                tmp_parser.get_var_values('PKG_DIST_SITE')[0])
-            path = pkg_site_p.path.rstrip('/') + '/'
-            regex_path = re.escape(path).replace(
-                'XXXVERXXX', PackageSearchUpdate.regex_version)
+        values = self.get_parser().evaluate_with({'PKG_VERS': ContentMatcher.marker}, ['PKG_DIST_NAME', 'PKG_DIST_SITE'])
+        filename = values['PKG_DIST_NAME'][0]
 
-        regex_filename_path = '(' + regex_path + '(?P<filename>' + re.escape(filename[0]).replace('XXXVERXXX', PackageSearchUpdate.regex_version) + '))'
-        _LOGGER.debug("regex_filename_path_before: %s", regex_filename_path)
-        regex_filename_path = re.sub('(' + PackageSearchUpdate.regex_extensions_replace_from + ')',
-                                     '\.(?P<extension>' + PackageSearchUpdate.regex_extensions_replace_to + ')', regex_filename_path)
-        _LOGGER.debug("regex_filename_path: %s", regex_filename_path)
+        if ContentMatcher.marker in filename:
+            return ContentMatcher(filename, PackageSearchUpdate.extensions_to_download)
 
-        return re.compile(regex_filename_path)
+        # The version is in the path of the site
+        path = urlparse(values['PKG_DIST_SITE'][0]).path.rstrip('/') + '/'
+        return ContentMatcher(path + filename, PackageSearchUpdate.extensions_to_download, filename_start=len(path), with_path=False)
 
     def _generate_regex_filename(self):
         """ Return a regex to find the filename with version and extension
         """
-        tmp_parser = copy.copy(self.get_parser())
-        tmp_parser.set_var_values('PKG_VERS', 'XXXVERXXX')
-        tmp_parser.evaluate_var('PKG_DIST_NAME')
-        filename = tmp_parser.get_var_values('PKG_DIST_NAME')
+        filename = self.get_parser().evaluate_with({'PKG_VERS': 'XXXVERXXX'}, ['PKG_DIST_NAME'])['PKG_DIST_NAME']
 
         regex_filename = '(?P<filename>' + re.escape(filename[0]).replace(
             'XXXVERXXX', PackageSearchUpdate.regex_version) + ')($|/)'
@@ -612,7 +957,6 @@ class PackageSearchUpdate(object):
     def _generate_regex_version(self):
         """ Return a regex to find the version based on the current version
         """
-        tmp_parser = copy.copy(self.get_parser())
         regex_version = re.escape(self._version)
         regex_version = re.sub(
             '\-[a-zA-Z0-9_]+', '\-[a-zA-Z0-9_]+', regex_version)
@@ -645,56 +989,61 @@ class PackageSearchUpdate(object):
         cache_filename = 'list.pkl'
         download = not self._cache.check(cache_filename)
         if download:
-            depth = 0
-            while True:
-                check = self._get_url_data(url, depth)
-                if not check:
-                    break
-                depth += 1
-
-            # Check home page
-            home_page = self.get_parser().get_var_values('HOMEPAGE')
-            if home_page:
-                _LOGGER.info("[Package:%s]: Search in home page", self._package)
+            # The API of a forge lists the files in one small request and the files of the next versions
+            # are often found with a few HEAD requests: crawl the pages otherwise
+            if not self._get_forge_data(url) and not (Config.get('probe_enabled') and self._probe_next_versions(url)):
                 depth = 0
                 while True:
-                    check = self._get_url_data(home_page[0], depth)
+                    check = self._get_url_data(url, depth)
                     if not check:
                         break
                     depth += 1
 
-            # Check download page
-            download_page = self.get_parser().get_var_values('DOWNLOAD_PAGE')
-            if download_page:
-                _LOGGER.info("[Package:%s]: Search in download page", self._package)
-                depth = 0
-                while True:
-                    check = self._get_url_data(download_page[0], depth)
-                    if not check:
-                        break
-                    depth += 1
-
-            # Check for download URL in the page
-            #download_urls = self._search_download_urls()
-            download_urls = []
-            if len(download_urls) > 0:
-                _LOGGER.info("[Package:%s]: Found download link in page:", self._package)
-                for url in download_urls:
-                    _LOGGER.info("[Package:%s]: Download link: %s", self._package, url)
-                    self._get_url_data(url)
-
-            # Check for version URL in the page
-            version_urls = self._search_version_urls()
-            if len(version_urls) > 0:
-                _LOGGER.info("[Package:%s]: Found version link in page:", self._package)
-                for url in version_urls:
-                    self._get_url_data(url, 0, False)
+                # Check home page
+                home_page = self.get_parser().get_var_values('HOMEPAGE')
+                if home_page:
+                    _LOGGER.info("[Package:%s]: Search in home page", self._package)
+                    depth = 0
+                    while True:
+                        check = self._get_url_data(home_page[0], depth)
+                        if not check:
+                            break
+                        depth += 1
+
+                # Check download page
+                download_page = self.get_parser().get_var_values('DOWNLOAD_PAGE')
+                if download_page:
+                    _LOGGER.info("[Package:%s]: Search in download page", self._package)
+                    depth = 0
+                    while True:
+                        check = self._get_url_data(download_page[0], depth)
+                        if not check:
+                            break
+                        depth += 1
+
+                # Check for download URL in the page
+                #download_urls = self._search_download_urls()
+                download_urls = []
+                if len(download_urls) > 0:
+                    _LOGGER.info("[Package:%s]: Found download link in page:", self._package)
+                    for url in download_urls:
+                        _LOGGER.info("[Package:%s]: Download link: %s", self._package, url)
+                        self._get_url_data(url)
+
+                # Check for version URL in the page
+                version_urls = self._search_version_urls()
+                if len(version_urls) > 0:
+                    _LOGGER.info("[Package:%s]: Found version link in page:", self._package)
+                    self._prefetch_contents(version_urls)
+                    for url in version_urls:
+                        self._get_url_data(url, 0, False)
 
             self._cache.save(cache_filename, self._urls_downloaded)
         else:
-            self._urls_downloaded = self._cache.load(cache_filename)
+            self._urls_downloaded = Interning.intern(self._cache.load(cache_filename))
 
         _LOGGER.info("[Package:%s]: Check for filename in pages", self._package)
+        match_start = time.perf_counter()
 
         # Get regex for filename
         regex_filename = self._generate_regex_filename()
@@ -745,11 +1094,11 @@ class PackageSearchUpdate(object):
 
         # If no result found : Try to find directly in content page (maybe javascript is used to display)
         if not new_versions:
-            # Get regex for filename and path
-            regex_filename_path = self._generate_regex_filename_path()
+            # Get matcher for filename and path
+            content_matcher = self._generate_content_matcher()
             for url, data in self._urls_downloaded.items():
                 if len(data['content']) > 0:
-                    for match in regex_filename_path.finditer(data['content']):
+                    for match in content_matcher.finditer(data['content'], Config.get('match_page_budget')):
                         version_curr = match.group('version').replace('_', '.')
                         version_curr_p = parse_version(version_curr)
                         href = str(match.group(0))
@@ -791,6 +1140,12 @@ class PackageSearchUpdate(object):
                                 elif scheme not in new_versions[version_curr]['urls'][urls.index(url_filename)]['schemes']:
                                     new_versions[version_curr]['urls'][urls.index(url_filename)]['schemes'].append(scheme)
 
+                    if content_matcher.timed_out:
+                        self._metrics.increment('match_timeouts')
+                        _LOGGER.info("[Package:%s]: Search in content of %s stopped after %ss", self._package, url, Config.get('match_page_budget'))
+
+        self._metrics.add_time('match', time.perf_counter() - match_start)
+
         # Sort by version desc
         new_versions = collections.OrderedDict(
             sorted(new_versions.items(), key=lambda x: parse_version(x[0]), reverse=False))
@@ -805,9 +1160,13 @@ class PackageSearchUpdate(object):
     def search_updates(self):
         """ Search for all new versions
         """
+        if self.get_method() in self.methods_vcs:
+            return self.get_vcs_backend().run_sync(self.search_updates_async())
+
         cache_filename = 'versions.pkl'
         if self._cache.check(cache_filename):
             self._versions = self._cache.load(cache_filename)
+            self._versions_cached = True
             return self._versions
 
         method = self.get_method()
@@ -826,6 +1185,46 @@ class PackageSearchUpdate(object):
 
         return self._versions
 
+    async def search_updates_async(self):
+        """ Search for all new versions of a git or svn package
+        The commands of the VCS backend overlap with the searches of the other packages run in the same event loop
+        """
+        cache_filename = 'versions.pkl'
+        if self._cache.check(cache_filename):
+            self._versions = self._cache.load(cache_filename)
+            self._versions_cached = True
+            return self._versions
+
+        method = self.get_method()
+        if method not in self.methods_vcs:
+            _LOGGER.warning("Method '%s' is not searched with the VCS backend", method)
+            return self._versions
+
+        self._versions = await getattr(self, '_search_updates_' + method)() or {}
+
+        self._cache.save(cache_filename, self._versions)
+
+        return self._versions
+
+    def is_versions_cached(self):
+        return self._versions_cached
+
+    def load_versions(self):
+        """ Load the versions found by the previous search, even if the cache is expired (None if not found)
+        """
+        versions = self._cache.load('versions.pkl')
+        if versions is not None:
+            self._versions = versions
+            self._versions_cached = True
+
+        return versions
+
+    def save_versions(self, versions):
+        """ Save in the cache the versions found by another search (e.g. on another machine)
+        """
+        self._versions = versions
+        self._cache.save('versions.pkl', versions)
+
     def get_informations(self):
         depends = self.get_parser().get_var_values('DEPENDS', [])
         build_depends = self.get_parser().get_var_values('BUILD_DEPENDS', [])
@@ -841,6 +1240,7 @@ class PackageSearchUpdate(object):
             "version": self.get_version(),
             "versions": self._versions,
             "method": self.get_method(),
+            "url": self.get_url(),
             "depends": depends,
             "build_depends": build_depends,
             "all_depends": all_depends
@@ -1,14 +1,29 @@
 # -*- coding: utf-8 -*-
 
 import os
+import math
+import contextlib
+import time
+import pickle
+import socket
 import logging
 
 from pkg_resources import parse_version
 import git as git
-from multiprocessing import Pool
+from multiprocessing import Pool, Manager
+from urllib.parse import urlparse
 
 from .config import Config
 from .cache import Cache
+from .metrics import Metrics
+from .profiler import Profiler
+from .prometheus_exporter import PrometheusExporter
+from .versions_database import VersionsDatabase
+from .host_scheduler import HostScheduler
+from .shard import Shard
+from .interning import Interning
+from .package_graph import PackageGraph
+from .archive_fetcher import ArchiveFetcher
 from .tools import Tools
 from .makefile_parser.makefile_updater import MakefileUpdater
 from .package_search_update import PackageSearchUpdate
@@ -25,21 +40,62 @@ class PackagesManager(object):
         self._packages_requested = {}
         self._packages = {}
         self._packages_spk = {}
-
-        self._cache = Cache(duration=Config.get("cache_duration_packages_manager"))
-
-    def initialize(self, packages_requested):
+        self._packages_searched = set()
+        self._packages_all_requested = True
+
+        self._metrics = Metrics()
+        self._profiler = Profiler(Config.get('profile_dir'))
+        self._profile_stats = None
+        # Start of the last search: the shared git mirrors are fetched once by run
+        self._run_started = None
+        # Graph of the dependencies, built again when the packages change
+        self._graph = None
+        self._cache = Cache(duration=Config.get("cache_duration_packages_manager"), metrics=self._metrics)
+
+    def initialize(self, packages_requested, use_cache=True):
         """ Initialize package requested and get list of packages from spksrc repository
+        use_cache: False to parse the Makefiles again instead of loading the packages list from the cache
         """
-        self.generate_packages_list()
-        self.generate_packages_spk_list()
+        self.generate_packages_list(use_cache)
+        self.generate_packages_spk_list(use_cache)
 
         self._packages_requested = packages_requested
+        self._packages_all_requested = not packages_requested
         if not self._packages_requested:
             self._packages_requested = list(self._packages.keys())
 
         self._packages_requested.sort()
 
+        # Part of the packages searched by this machine
+        if Config.get('shard'):
+            shard = Shard.parse(Config.get('shard'))
+            get_depends = self._get_depends if Config.get('shard_group_deps') else None
+            self._packages_requested = shard.select(self._packages_requested, get_depends)
+            _LOGGER.info("Shard %s: %d packages", shard, len(self._packages_requested))
+
+    def _get_depends(self, package):
+        """ Return the dependencies of a package
+        """
+        if package not in self._packages:
+            return []
+
+        return sorted(self._packages[package]['informations']['all_depends'])
+
+    def get_packages_requested(self):
+        """ Return the packages requested
+        """
+        return self._packages_requested
+
+    def has_package(self, package, spk=False):
+        """ Return True if the package is a cross/ or native/ package (or a spk/ package)
+        """
+        return package in self._packages or spk and package in self._packages_spk
+
+    def is_searched(self, package):
+        """ Return True if the new versions of the package were searched
+        """
+        return package in self._packages_searched
+
     def check_spksc_dir(self):
         check = os.path.exists(Config.get('spksrc_git_dir'))
         check = check & os.path.isdir(Config.get('spksrc_git_dir'))
@@ -139,31 +195,26 @@ class PackagesManager(object):
                 _LOGGER.warning("Package %s doesn't exist !", package)
                 return
 
-            parser = MakefileUpdater()
+            # Parser and search_update are only used to extract the informations:
+            # the inventory keeps plain data to stay small in cache and in workers
             search_update = PackageSearchUpdate(package, makefile_path)
-            search_update.set_parser(parser)
 
             informations = search_update.get_informations()
-            packages[package] = {
+            packages[Interning.intern_string(package)] = Interning.intern({
                 'makefile_path': makefile_path,
-                'parser': parser,
-                'search_update': search_update,
                 'informations': informations,
-                'parents': []
-            }
+            })
+            self._graph = None
 
             for dep in informations['all_depends']:
                 self.generate_package_informations(packages, dep)
-                if dep in self._packages and dep not in self._packages[dep]['parents']:
-                    self._packages[dep]['parents'].append(package)
-                if dep in self._packages_spk and dep not in self._packages_spk[dep]['parents']:
-                    self._packages_spk[dep]['parents'].append(package)
 
-    def generate_packages_list(self):
+    def generate_packages_list(self, use_cache=True):
         """ XXX
         """
         cache_filename = 'packages.pkl'
-        self._packages = self._cache.load(cache_filename)
+        self._packages = Interning.intern(self._cache.load(cache_filename)) if use_cache else None
+        self._graph = None
 
         if not self._packages:
             packages = self._find_packages(os.path.join(Config.get('spksrc_git_dir'), 'cross')) + self._find_packages(os.path.join(Config.get('spksrc_git_dir'), 'native'))
@@ -175,11 +226,12 @@ class PackagesManager(object):
             self._cache.save(cache_filename, self._packages)
 
 
-    def generate_packages_spk_list(self):
+    def generate_packages_spk_list(self, use_cache=True):
         """ XXX
         """
         cache_filename = 'packages_spk.pkl'
-        self._packages_spk = self._cache.load(cache_filename)
+        self._packages_spk = Interning.intern(self._cache.load(cache_filename)) if use_cache else None
+        self._graph = None
 
         if not self._packages_spk:
             packages = self._find_packages(os.path.join(Config.get('spksrc_git_dir'), 'spk'))
@@ -190,27 +242,389 @@ class PackagesManager(object):
 
             self._cache.save(cache_filename, self._packages_spk)
 
+    def reindex_packages(self, packages):
+        """ Parse again the Makefiles of packages changed on disk and update the dependencies graph
+        Return the cross/ and native/ packages changed (to search their new versions again)
+        """
+        changed = []
+        for package in packages:
+            if package.split(os.path.sep)[0] == 'spk':
+                packages_list = self._packages_spk
+            else:
+                packages_list = self._packages
+
+            # The dependencies graph is built again with the new dependencies
+            packages_list.pop(package, None)
+            self._graph = None
+
+            if not os.path.exists(self.get_makefile_path(package)):
+                _LOGGER.info("[Package:%s]: Package deleted", package)
+                if package in self._packages_requested:
+                    self._packages_requested.remove(package)
+                continue
+
+            _LOGGER.info("[Package:%s]: Makefile changed", package)
+            self.generate_package_informations(packages_list, package)
+
+            if packages_list is self._packages:
+                # The SPK list keeps its own entries for the packages used by SPK packages
+                if package in self._packages_spk:
+                    self._packages_spk[package]['informations'] = self._packages[package]['informations']
+                self.get_search_update(package).clear_cache()
+                changed.append(package)
+                if self._packages_all_requested and package not in self._packages_requested:
+                    self._packages_requested.append(package)
+                    self._packages_requested.sort()
+
+        self._cache.save('packages.pkl', self._packages)
+        self._cache.save('packages_spk.pkl', self._packages_spk)
+
+        return changed
+
+    def get_search_update(self, package):
+        """ Create a search_update instance for a package
+        """
+        search_update = PackageSearchUpdate(package, self._packages[package]['makefile_path'])
+        search_update.set_fetch_since(self._run_started)
+
+        return search_update
+
+    def get_updater(self, package):
+        """ Create a Makefile updater for a package and parse its Makefile
+        """
+        parser = MakefileUpdater(max_possibilities=Config.get('parser_max_possibilities'),
+                                 include_enabled=Config.get('parser_include_enabled'))
+        parser.parse_file(self._packages[package]['makefile_path'])
+
+        return parser
+
+    def get_metrics(self):
+        """ Get metrics instance
+        """
+        return self._metrics
+
     def package_search_update(self, package):
+        if Config.get('profile_enabled'):
+            return self._profiler.run(package, self._package_search_update, package)
+
+        return self._package_search_update(package)
+
+    def _package_search_update(self, package):
+
+        search_update = self.get_search_update(package)
+        metrics = search_update.get_metrics()
+
+        with metrics.span('search'):
+            start = time.perf_counter()
+            search_update.search_updates()
+            duration = time.perf_counter() - start
+            metrics.observe('search', duration, search_update.get_method())
+
+        # The duration of a search served by the cache is not the expected duration of the package
+        return [package, search_update.get_informations(), metrics.get_data(), None if search_update.is_versions_cached() else duration]
+
+    async def _package_search_update_async(self, package):
+
+        search_update = self.get_search_update(package)
+        metrics = search_update.get_metrics()
+
+        with metrics.span('search'):
+            start = time.perf_counter()
+            await search_update.search_updates_async()
+            duration = time.perf_counter() - start
+            metrics.observe('search', duration, search_update.get_method())
+
+        return [package, search_update.get_informations(), metrics.get_data(), None if search_update.is_versions_cached() else duration]
 
-        search_update = self._packages[package]['search_update']
+    def _is_package_vcs(self, package):
+        """ Return True if a package is searched with the VCS backend (the profiled searches are run by the pool)
+        """
+        if Config.get('profile_enabled'):
+            return False
 
-        search_update.search_updates()
+        return self._packages[package]['informations'].get('method') in PackageSearchUpdate.methods_vcs
+
+    def get_versions_database(self):
+        """ Open the database of the upstream versions (None if disabled)
+        """
+        if not Config.get('versions_database'):
+            return None
 
-        return [package, search_update.get_informations()]
+        return VersionsDatabase(Config.get('versions_database'))
 
-    def check_update_packages(self):
-        """ Print all dependencies
+    def _add_search_result(self, result, callback, database=None, run_id=None):
+        """ Store the result of the search of a package
+        """
+        # The informations are unpickled from the workers or the results files
+        self._packages[result[0]]['informations'] = Interning.intern(result[1])
+        self._packages_searched.add(result[0])
+        self._metrics.merge(result[2])
+        if database:
+            next_version = self.get_next_version(result[0])
+            database.add_versions(run_id, result[0], result[1]['versions'])
+            database.set_package(result[0], result[1]['version'], next_version['version'] if next_version else None)
+            if result[3] is not None:
+                database.add_search(run_id, result[0], result[3])
+            database.commit()
+        if callback:
+            callback(result[0])
+
+    @staticmethod
+    def _is_stable(search, now):
+        """ Return True if a package had no new version for schedule_stable_after (since its first search if no version
+        was ever found) and was searched less than schedule_stable_interval ago
         """
-        pool = Pool(processes=Config.get('nb_jobs'))
+        last_changed = search['last_changed'] or search['first_searched']
 
-        packages = pool.map(self.package_search_update, self._packages_requested)
+        return now - last_changed > Config.get('schedule_stable_after') and now - search['last_searched'] < Config.get('schedule_stable_interval')
+
+    def _get_stable_results(self, packages, searches):
+        """ Return the packages to search and the previous results of the stable packages searched recently
+        A package is stable when no new version was found for schedule_stable_after
+        """
+        stable_after = Config.get('schedule_stable_after')
+        if not stable_after:
+            return packages, []
 
+        now = time.time()
+        packages_searched = []
+        results = []
         for package in packages:
-            self._packages[package[0]]['informations'] = package[1]
+            search = searches.get(package)
+            if search and self._is_stable(search, now):
+                search_update = self.get_search_update(package)
+                if search_update.load_versions() is not None:
+                    results.append([package, search_update.get_informations(), search_update.get_metrics().get_data(), None])
+                    continue
+            packages_searched.append(package)
+
+        return packages_searched, results
+
+    @staticmethod
+    def _get_duration_band(package, searches):
+        """ Return the band of the expected duration of a package, the longest first: the durations of a band are within a factor of 2
+        The packages never searched are in the first band
+        """
+        if package not in searches:
+            return -float('inf')
+
+        return -math.floor(math.log2(max(searches[package]['duration'], 0.1)))
+
+    def _order_packages(self, packages, searches):
+        """ Order the packages by their expected durations, the longest first, to not start the slow searches at the end of the run,
+        then alternate the hosts of the packages with close durations (band of _get_duration_band)
+        """
+        if not Config.get('schedule_longest_first'):
+            return HostScheduler.interleave(packages, self._get_package_host)
+
+        bands = {}
+        for package in sorted(packages, key=lambda p: -searches[p]['duration'] if p in searches else -float('inf')):
+            bands.setdefault(self._get_duration_band(package, searches), []).append(package)
+
+        result = []
+        for band in sorted(bands.keys()):
+            result += HostScheduler.interleave(bands[band], self._get_package_host)
+
+        return result
+
+    def _get_package_host(self, package):
+        """ Return the host of the URL of a package
+        """
+        url = self._packages[package]['informations'].get('url')
+
+        return urlparse(url).netloc if url else ''
+
+    def check_update_packages(self, packages_requested=None, callback=None):
+        """ Search the new versions of the packages requested
+        callback is called with the package name as soon as the search of a package is done
+        """
+        if packages_requested is None:
+            packages_requested = self._packages_requested
+
+        database, run_id = self._start_run()
+
+        packages = []
+        with self._metrics.span('run'):
+            if len(packages_requested) == 1:
+                # Avoid to start a pool for a single package
+                packages.append(self.package_search_update(packages_requested[0]))
+                self._add_search_result(packages[-1], callback, database, run_id)
+            else:
+                # Durations and changes of the packages in the previous runs
+                searches = database.get_searches() if database else {}
+                with self._start_pool() as pool:
+                    packages = self._search_packages(pool, packages_requested, searches, callback, database, run_id)
+
+        self._finish_run(database, run_id, packages)
+
+    def _start_run(self):
+        """ Start a run of searches and return the versions database (if enabled) and the id of the run
+        """
+        if Config.get('profile_enabled'):
+            self._profiler.prepare()
+
+        # The report and the exporter describe this run only (serve and watch search several times)
+        self._metrics.reset()
+
+        database = self.get_versions_database()
+        run_id = database.start_run() if database else None
+        self._run_started = time.time()
+
+        return database, run_id
+
+    @contextlib.contextmanager
+    def _start_pool(self):
+        """ Start the pool of the searches
+        """
+        with Manager() as manager:
+            # The requests to each host are limited for all the workers
+            scheduler = HostScheduler.create(Config, manager)
+            with Pool(processes=Config.get('nb_jobs'), initializer=PackageSearchUpdate.set_scheduler, initargs=(scheduler,)) as pool:
+                yield pool
+
+    def _search_packages(self, pool, packages_requested, searches, callback, database, run_id):
+        """ Search the packages with a pool started by _start_pool and return the results of the packages searched
+        """
+        packages_requested, results_stable = self._get_stable_results(packages_requested, searches)
+        for result in results_stable:
+            _LOGGER.info("[Package:%s] Stable package searched recently: previous versions used", result[0])
+            self._add_search_result(result, callback)
+        self._metrics.increment('packages_skipped', len(results_stable))
+
+        # The git and svn packages are searched in an event loop of the main process:
+        # their commands wait on the network without taking a worker of the pool
+        packages_vcs = [p for p in packages_requested if self._is_package_vcs(p)]
+        packages_pool = [p for p in packages_requested if p not in packages_vcs]
+
+        packages = []
+
+        def add_result(result):
+            packages.append(result)
+            self._add_search_result(result, callback, database, run_id)
+
+        results = pool.imap_unordered(self.package_search_update, self._order_packages(packages_pool, searches))
+        if packages_vcs:
+            # The results of the pool are added while the VCS searches run
+            PackageSearchUpdate.get_vcs_backend().run_all(
+                [self._package_search_update_async(package) for package in self._order_packages(packages_vcs, searches)],
+                add_result, results)
+        else:
+            for result in results:
+                add_result(result)
+
+        return packages
+
+    def _finish_run(self, database, run_id, packages):
+        """ Finish a run of searches: save the results, the report and the metrics
+        """
+        if database:
+            database.finish_run(run_id)
+            database.close()
+
+        self._metrics.increment('packages_checked', len(packages))
+        self._metrics.increment('packages_with_updates', len([p for p in packages if self.has_new_version(p[0])]))
 
         cache_filename = 'packages.pkl'
         self._cache.save(cache_filename, self._packages)
 
+        if Config.get('results_file'):
+            self.save_results(Config.get('results_file'))
+
+        if Config.get('report_file'):
+            self._metrics.save_report(Config.get('report_file'))
+
+        if Config.get('prometheus_file'):
+            PrometheusExporter(self._metrics).write(Config.get('prometheus_file'))
+
+        if Config.get('profile_enabled'):
+            self._profile_stats = self._profiler.merge(Config.get('profile_file'))
+
+    def run_worker(self, queue, callback=None):
+        """ Search the packages of a queue shared with other workers (processes or machines) until it is empty
+        The packages requested are added to the queue if they are not in it yet, with their expected durations:
+        the longest are claimed first. The pool is started once for all the batches claimed by the worker
+        """
+        worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        database, run_id = self._start_run()
+        searches = database.get_searches() if database else {}
+        durations = {package: search['duration'] for package, search in searches.items()}
+        _LOGGER.info("Worker %s: %d packages added to the queue", worker, queue.add(self._packages_requested, durations))
+
+        packages = []
+        with self._metrics.span('run'):
+            with self._start_pool() as pool:
+                while True:
+                    packages_claimed = queue.claim(worker, Config.get('queue_batch_size'))
+                    if not packages_claimed:
+                        break
+
+                    try:
+                        packages.extend(self._search_packages(pool, packages_claimed, searches, callback, database, run_id))
+                    except BaseException:
+                        queue.release(worker, packages_claimed)
+                        raise
+                    queue.finish(worker, packages_claimed)
+
+        self._finish_run(database, run_id, packages)
+
+        _LOGGER.info("Worker %s: queue is empty (%s)", worker, queue.get_counts())
+
+    def save_results(self, path):
+        """ Save the informations of the packages searched to merge them with the results of other machines
+        """
+        results = {
+            'created': time.time(),
+            'packages': {package: self._packages[package]['informations'] for package in self._packages_searched},
+        }
+
+        parent_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(results, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def merge_results(self, paths, callback=None):
+        """ Merge the results saved by other machines (shards or workers):
+        the versions of the packages are saved in the inventory, the versions cache and the versions database
+        The most recent results of a package are kept, callback is called with the name of each package merged
+        """
+        results = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                results.append(pickle.load(f))
+
+        packages = {}
+        for result in sorted(results, key=lambda r: r['created']):
+            packages.update(result['packages'])
+
+        database = self.get_versions_database()
+        run_id = database.start_run() if database else None
+
+        merged = []
+        for package, informations in sorted(packages.items()):
+            if package not in self._packages:
+                _LOGGER.warning("Package %s doesn't exist !", package)
+                continue
+
+            self.get_search_update(package).save_versions(informations['versions'])
+            self._add_search_result([package, informations, Metrics().get_data(), None], callback, database, run_id)
+            merged.append(package)
+
+        if database:
+            database.finish_run(run_id)
+            database.close()
+
+        self._cache.save('packages.pkl', self._packages)
+
+        return merged
+
+    def pprint_profile(self):
+        """ Print the hottest functions of the profiled run
+        """
+        if self._profile_stats:
+            Profiler.pprint_summary(self._profile_stats, Config.get('profile_top'))
+
     def check_version_isvalid(self, current, new):
         if not Config.get('build_prerelease_allowed') and new['is_prerelease']:
             return False
@@ -249,103 +663,217 @@ class PackagesManager(object):
         return result
 
 
+    def has_new_version(self, package):
+        """ Return True if the package can be updated
+        """
+        next_version = self.get_next_version(package)
+
+        return next_version is not None and self._packages[package]['informations']['version'] != next_version['version']
+
     def get_package(self, package):
         """ Return package informations
         """
         return self._packages[package]
 
 
-    def pprint_next_version(self):
-        """ Print the next version to update using the parameters (allow_major_release, ...)
+    def get_next_versions(self, packages_requested=None):
+        """ Return the next version to update using the parameters (allow_major_release, ...)
         """
-        print("{:<30} {:<10} {:<30} {:<30}".format("Package", "New ?", "Current version", "Next version"))
-        for package in self._packages_requested:
+        if packages_requested is None:
+            packages_requested = self._packages_requested
+
+        result = []
+        for package in packages_requested:
             next_version = self.get_next_version(package)
-            new_version_state = "NO"
+            current_version = self._packages[package]['informations']['version']
             new_version = ""
             if next_version:
                 new_version = next_version['version']
-                if self._packages[package]['informations']['version'] != new_version:
-                    new_version_state = "YES"
 
-            print("{:<30} {:<10} {:<30} {:<30}".format(package, new_version_state, self._packages[package]['informations']['version'], new_version))
+            result.append({
+                'package': package,
+                'is_new': bool(new_version) and current_version != new_version,
+                'version': current_version,
+                'next_version': new_version
+            })
+
+        return result
+
+    def pprint_next_version(self, packages_requested=None):
+        """ Print the next version to update using the parameters (allow_major_release, ...)
+        """
+        print("{:<30} {:<10} {:<30} {:<30}".format("Package", "New ?", "Current version", "Next version"))
+        for info in self.get_next_versions(packages_requested):
+            new_version_state = "YES" if info['is_new'] else "NO"
+            print("{:<30} {:<10} {:<30} {:<30}".format(info['package'], new_version_state, info['version'], info['next_version']))
+
+    def get_all_new_versions(self, packages_requested=None):
+        """ Return new versions on packages
+        """
+        if packages_requested is None:
+            packages_requested = self._packages_requested
+
+        result = []
+        for package in packages_requested:
+            informations = self._packages[package]['informations']
+            result.append({
+                'package': package,
+                'version': informations['version'],
+                'versions': list(informations['versions'].keys())
+            })
+
+        return result
 
     def pprint_all_new_versions(self):
         """ Print new versions on packages
         """
-        for package in self._packages_requested:
-            print("{} ({}):".format(package, self._packages[package]['informations']['version']))
-            for (version, _) in self._packages[package]['informations']['versions'].items():
+        for info in self.get_all_new_versions():
+            print("{} ({}):".format(info['package'], info['version']))
+            for version in info['versions']:
                 print(" - {}".format(version))
 
+    def get_graph(self):
+        """ Return the graph of the dependencies of the cross/, native/ and spk/ packages
+        """
+        if self._graph is None:
+            self._graph = PackageGraph()
+            for packages in (self._packages, self._packages_spk):
+                for package, record in packages.items():
+                    self._graph.add(package, record['informations']['all_depends'])
+
+        return self._graph
+
+    def get_unused(self):
+        """ Return packages not used by a SPK package or their deps
+        """
+        used_packages = self.get_graph().get_descendants(self._packages_spk, self._packages)
+
+        return sorted(self._packages.keys() - used_packages)
+
     def pprint_unused(self):
         """ Print unused package
         """
-        def sublist_in_list(sublist, l):
-            return set(sublist) & set(l) == set(l)
-        unused_packages = []
-
-        def search_used_packages(package):
-            used_packages = []
-            if package in self._packages:
-                depends = self._packages[package]['informations']['all_depends']
-                used_packages += depends
-                for dep in set(depends):
-                    used_packages += search_used_packages(dep)
-            return used_packages
-
-        used_packages = []
-        for package in self._packages_spk:
-            depends = self._packages_spk[package]['informations']['all_depends']
-            used_packages += depends
-            for dep in set(depends):
-                used_packages += search_used_packages(dep)
-
-        unused_packages = sorted(self._packages.keys() - set(used_packages))
-        for package in unused_packages:
+        for package in self.get_unused():
             print(" - {}".format(package))
 
+    def get_deps(self, package):
+        """ Return the tree of dependencies for a package
+        """
+        graph = self.get_graph()
 
-    def pprint_deps(self, package, depth=0):
-        """ Print all dependencies for a package
+        return {'package': package, 'depends': [self.get_deps(dep) for dep in graph.get_depends(package)]}
+
+    def get_parent_deps(self, package):
+        """ Return the tree of parent dependencies for a package
+        """
+        graph = self.get_graph()
+
+        return {'package': package, 'depends': [self.get_parent_deps(dep) for dep in graph.get_parents(package)]}
+
+    @staticmethod
+    def iter_tree(tree, depth=0):
+        """ Iterate on a tree of dependencies: yield (depth, package)
         """
-        print('  ' * depth + " - " + package)
-        depends = []
-        if package in self._packages:
-            depends += self._packages[package]['informations']['all_depends']
-        if package in self._packages_spk:
-            depends += self._packages_spk[package]['informations']['all_depends']
+        yield depth, tree['package']
+        for dep in tree['depends']:
+            yield from PackagesManager.iter_tree(dep, depth + 1)
 
-        for deps in set(depends):
-            self.pprint_deps(deps, depth + 1)
+    @staticmethod
+    def _pprint_tree(tree):
+        for depth, package in PackagesManager.iter_tree(tree):
+            print('  ' * depth + " - " + package)
+
+    def pprint_deps(self, package):
+        """ Print all dependencies for a package
+        """
+        self._pprint_tree(self.get_deps(package))
 
-    def pprint_parent_deps(self, package, depth=0):
+    def pprint_parent_deps(self, package):
         """ Print all parent dependencies for a package
         """
-        print('  ' * depth + " - " + package)
-        parents = []
-        if package in self._packages:
-            parents += self._packages[package]['parents']
-        if package in  self._packages_spk:
-            parents += self._packages_spk[package]['parents']
-        for deps in set(parents):
-            self.pprint_parent_deps(deps, depth + 1)
+        self._pprint_tree(self.get_parent_deps(package))
 
 
     def update_packages_version(self):
         """ Update makefile and write next version
+        Return the packages updated
         """
+        updated = []
+        updaters = {}
+        archives = {}
         for package in self._packages_requested:
             next_version = self.get_next_version(package)
             if next_version:
                 new_version = next_version['version']
                 if self._packages[package]['informations']['version'] != new_version:
+                    # Parser is only created for the packages to update
+                    parser = self.get_updater(package)
                     if self._packages[package]['informations']['method'] == 'common':
-                        self._packages[package]['parser'].set_var_values('PKG_VERS', new_version)
-                        self._packages[package]['parser'].update_content('PKG_VERS')
-                        print("Updater: Update {} from {} to {}".format(package, self._packages[package]['informations']['version'], new_version))
-                    self._packages[package]['parser'].write_file(self._packages[package]['makefile_path'])
+                        # The overlay re-evaluates only the variables using PKG_VERS
+                        old_filename = self._get_dist_filename(parser)
+                        parser = parser.overlay({'PKG_VERS': new_version})
+                        parser.update_contents(['PKG_VERS'])
+                        updated.append({
+                            'package': package,
+                            'version': self._packages[package]['informations']['version'],
+                            'next_version': new_version
+                        })
+                        archives[package] = {
+                            'url': self._get_dist_url(parser),
+                            'filename': self._get_dist_filename(parser),
+                            'old_filename': old_filename
+                        }
+                    updaters[package] = parser
+
+        # Write each Makefile once all the updates are applied
+        for package, parser in updaters.items():
+            parser.write_file(self._packages[package]['makefile_path'])
+
+        if Config.get('build_digests_enabled'):
+            self.update_packages_digests(archives, updated)
+
+        return updated
+
+    @staticmethod
+    def _get_dist_filename(parser):
+        """ Return the name of the archive in the digests file
+        """
+        filename = parser.get_var_values('PKG_DIST_FILE') or parser.get_var_values('PKG_DIST_NAME')
+
+        return filename[0] if filename else None
+
+    @staticmethod
+    def _get_dist_url(parser):
+        """ Return the URL of the archive to download
+        """
+        site = parser.get_var_values('PKG_DIST_SITE')
+        name = parser.get_var_values('PKG_DIST_NAME')
+        if not site or not name:
+            return None
 
+        return site[0] + '/' + name[0]
+
+    def update_packages_digests(self, archives, updated):
+        """ Download the archives of the new versions in parallel and rewrite the digests file of the packages
+        archives: dict package => url, filename and old_filename of the archive
+        updated: records returned by update_packages_version, 'digests' is set to True if the digests file was rewritten
+        """
+        archives = {package: archive for package, archive in archives.items() if archive['url'] and archive['filename']}
+        # The downloads are sent like the requests of the searches: same transport and same limits by host
+        fetcher = ArchiveFetcher(Config.get('build_download_dir'), max_parallel=Config.get('build_download_max_parallel'),
+                                 transport=PackageSearchUpdate.get_transport(), scheduler=PackageSearchUpdate.get_scheduler())
+        results = fetcher.fetch_all([archive['url'] for archive in archives.values()])
+
+        for record in updated:
+            package = record['package']
+            digests = results.get(archives[package]['url']) if package in archives else None
+            record['digests'] = digests is not None
+            if digests is None:
+                _LOGGER.warning("[Package:%s] digests file not updated", package)
+                continue
+
+            path = os.path.join(os.path.dirname(self._packages[package]['makefile_path']), 'digests')
+            ArchiveFetcher.write_digests(path, archives[package]['filename'], digests, archives[package]['old_filename'])
 
 
 
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import glob
+import shutil
+import pstats
+import cProfile
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    """ Profile the tasks run in the pool workers.
+    Each task writes its own stats file, the main process merges them at the end of the run.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def prepare(self):
+        """ Remove the stats files of a previous run
+        """
+        if os.path.exists(self._directory):
+            shutil.rmtree(self._directory)
+        os.makedirs(self._directory)
+
+    def run(self, name, func, *args, **kwargs):
+        """ Call the function with cProfile enabled and write the stats of the task
+        """
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            filename = "{}-{}.pstats".format(name.replace(os.path.sep, '_'), os.getpid())
+            profile.dump_stats(os.path.join(self._directory, filename))
+
+    def get_stats_files(self):
+        """ Return the stats files written by the tasks
+        """
+        return sorted(glob.glob(os.path.join(self._directory, '*.pstats')))
+
+    def merge(self, output):
+        """ Merge the stats of all tasks in a single file
+        Return the merged pstats.Stats or None if there is no stats
+        """
+        files = self.get_stats_files()
+        if not files:
+            return None
+
+        stats = pstats.Stats(files[0], stream=io.StringIO())
+        for filename in files[1:]:
+            stats.add(filename)
+
+        stats.dump_stats(output)
+        _LOGGER.info("Profile of %d tasks saved in %s", len(files), output)
+
+        return stats
+
+    @staticmethod
+    def pprint_summary(stats, top=20):
+        """ Print the hottest functions sorted by cumulative and internal time
+        """
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(top)
+        stats.sort_stats('tottime').print_stats(top)
+        print(stream.getvalue())
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import tempfile
+import logging
+
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PrometheusExporter(object):
+    """ Write the metrics of a run in the textfile format of the node-exporter
+    """
+
+    prefix = 'spksrc_updater_'
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self._lines = []
+
+    @staticmethod
+    def _escape(value):
+        """ Escape a label value
+        """
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _add(self, name, kind, description, samples):
+        """ Add a metric and its samples: list of (suffix, labels, value)
+        """
+        name = PrometheusExporter.prefix + name
+        self._lines.append("# HELP {} {}".format(name, description))
+        self._lines.append("# TYPE {} {}".format(name, kind))
+        for suffix, labels, value in samples:
+            str_labels = ''
+            if labels:
+                str_labels = '{' + ','.join('{}="{}"'.format(k, self._escape(v)) for k, v in labels) + '}'
+            self._lines.append("{}{}{} {}".format(name, suffix, str_labels, value))
+
+    def _add_gauge(self, name, description, value):
+        self._add(name, 'gauge', description, [('', None, value)])
+
+    def _add_hosts(self, name, counter, description):
+        samples = [('', [('host', host)], stats.get(counter, 0))
+                   for host, stats in sorted(self._metrics.get_hosts().items())]
+        self._add(name, 'gauge', description, samples)
+
+    def _add_histogram(self, name, histogram, label_name, description):
+        samples = []
+        for label, stats in sorted(self._metrics.get_histograms().get(histogram, {}).items()):
+            for bound, count in zip(Metrics.buckets, stats['buckets']):
+                samples.append(('_bucket', [(label_name, label), ('le', bound)], count))
+            samples.append(('_bucket', [(label_name, label), ('le', '+Inf')], stats['count']))
+            samples.append(('_sum', [(label_name, label)], stats['sum']))
+            samples.append(('_count', [(label_name, label)], stats['count']))
+        self._add(name, 'histogram', description, samples)
+
+    def generate(self):
+        """ Return the content of the textfile
+        """
+        self._lines = []
+
+        run = self._metrics.get_phases().get('run', {'time': 0.0})
+        hits = self._metrics.get_counter('cache_hits')
+        misses = self._metrics.get_counter('cache_misses')
+
+        self._add_gauge('last_run_timestamp_seconds', 'Timestamp of the end of the last run', int(time.time()))
+        self._add_gauge('run_duration_seconds', 'Duration of the search of the last run', run['time'])
+        self._add_gauge('packages_checked', 'Number of packages checked', self._metrics.get_counter('packages_checked'))
+        self._add_gauge('packages_with_updates', 'Number of packages with a new version', self._metrics.get_counter('packages_with_updates'))
+        self._add_gauge('pages_fetched', 'Number of pages downloaded', self._metrics.get_counter('pages_fetched'))
+        self._add_gauge('bytes_downloaded', 'Number of bytes downloaded', self._metrics.get_counter('bytes_downloaded'))
+        self._add_gauge('cache_hits', 'Number of valid cache files used', hits)
+        self._add_gauge('cache_misses', 'Number of missing or expired cache files', misses)
+        self._add_gauge('cache_hit_ratio', 'Ratio of valid cache files used', hits / (hits + misses) if hits + misses else 0)
+        self._add_hosts('host_requests', 'requests', 'Number of requests by host')
+        self._add_hosts('host_errors', 'errors', 'Number of failed requests by host')
+        self._add_histogram('search_duration_seconds', 'search', 'method', 'Duration of the search of a package by download method')
+
+        return '\n'.join(self._lines) + '\n'
+
+    def write(self, path):
+        """ Write the textfile atomically to avoid a partial read by the node-exporter
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.generate())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+
+        _LOGGER.info("Prometheus metrics saved in %s", path)
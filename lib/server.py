@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from .config import Config
+from .packages_manager import PackagesManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ServerRequestHandler(BaseHTTPRequestHandler):
+    """ Handle the JSON API requests: /search, /search_all, /deps, /parent_deps, /unused, /status
+    """
+
+    def address_string(self):
+        # The client address of a Unix socket is not a (host, port) tuple
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        _LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, code, data):
+        content = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url_p = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url_p.query).items()}
+        command = url_p.path.strip('/') or 'status'
+
+        try:
+            func = getattr(self.server.app, 'api_' + command)
+        except AttributeError:
+            self._send_json(404, {'error': 'Unknown command: ' + command})
+            return
+
+        try:
+            self._send_json(200, func(params))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            _LOGGER.exception("Error on request %s", self.path)
+            self._send_json(500, {'error': str(e)})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Server(object):
+    """ Keep a PackagesManager warm in memory and answer queries on a local HTTP or Unix socket
+    """
+
+    def __init__(self, packages_manager):
+        self._packages_manager = packages_manager
+        # The lock protects the swap and the reads of the manager: the searches run outside this lock
+        self._lock = threading.RLock()
+        # A manager runs one search at a time
+        self._search_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._httpd = None
+        self._refresh_thread = None
+        self._last_refresh = None
+
+    def _get_packages(self, params, required=False, spk=False):
+        """ Return the packages of the parameter 'packages' (all packages if not set)
+        """
+        packages = [p.strip('/') for p in params.get('packages', params.get('package', '')).split(',') if p]
+        if not packages:
+            if required:
+                raise ValueError("Parameter 'packages' is required")
+            return self._packages_manager.get_packages_requested()
+
+        for package in packages:
+            if not self._packages_manager.has_package(package, spk):
+                raise ValueError("Package {} doesn't exist".format(package))
+
+        return packages
+
+    def _search(self, params):
+        """ Search the packages which were not searched yet and return the manager with their results
+        The other requests are answered during the search: the results of each package are set at once in the manager
+        A search of several packages starts a multiprocessing Manager and a Pool of nb_jobs workers from the request thread:
+        the searches (and the refresh) are serialized by _search_lock, so there is at most one pool at a time
+        """
+        with self._lock:
+            packages_manager = self._packages_manager
+            packages = self._get_packages(params)
+
+        with self._search_lock:
+            to_search = packages
+            if params.get('force') != '1':
+                to_search = [p for p in packages if not packages_manager.is_searched(p)]
+            if to_search:
+                packages_manager.check_update_packages(to_search)
+
+        return packages_manager, packages
+
+    def api_status(self, params):
+        with self._lock:
+            return {
+                'packages': len(self._packages_manager.get_packages_requested()),
+                'last_refresh': self._last_refresh,
+                'pid': os.getpid()
+            }
+
+    def api_search(self, params):
+        packages_manager, packages = self._search(params)
+        with self._lock:
+            return packages_manager.get_next_versions(packages)
+
+    def api_search_all(self, params):
+        packages_manager, packages = self._search(params)
+        with self._lock:
+            return packages_manager.get_all_new_versions(packages)
+
+    def api_deps(self, params):
+        with self._lock:
+            return [self._packages_manager.get_deps(p) for p in self._get_packages(params, True, True)]
+
+    def api_parent_deps(self, params):
+        with self._lock:
+            return [self._packages_manager.get_parent_deps(p) for p in self._get_packages(params, True, True)]
+
+    def api_unused(self, params):
+        with self._lock:
+            return self._packages_manager.get_unused()
+
+    def refresh(self):
+        """ Reload the packages list and search the new versions of all packages
+        """
+        _LOGGER.info("Server: Refresh packages")
+        # The queries are answered by the current manager during the refresh
+        packages_manager = PackagesManager()
+        # The Makefiles are parsed again: the packages list in cache would not see the changes
+        packages_manager.initialize([], use_cache=False)
+        # The searches of the queries write the same cache files
+        with self._search_lock:
+            packages_manager.check_update_packages()
+        with self._lock:
+            self._packages_manager = packages_manager
+            self._last_refresh = int(time.time())
+        _LOGGER.info("Server: Packages refreshed")
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                _LOGGER.exception("Server: Error during refresh")
+
+    def start(self):
+        """ Open the socket and start the background refresh
+        """
+        socket_path = Config.get('serve_socket')
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._httpd = UnixHTTPServer(socket_path, ServerRequestHandler)
+            _LOGGER.info("Server: Listen on %s", socket_path)
+        else:
+            self._httpd = ThreadingHTTPServer((Config.get('serve_address'), Config.get('serve_port')), ServerRequestHandler)
+            _LOGGER.info("Server: Listen on http://%s:%d", *self._httpd.server_address[0:2])
+        self._httpd.app = self
+
+        interval = Config.get('serve_refresh_interval')
+        if interval > 0:
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, args=(interval,), daemon=True)
+            self._refresh_thread.start()
+
+    def get_address(self):
+        """ Return the address of the socket
+        """
+        return self._httpd.server_address
+
+    def serve_forever(self):
+        """ Answer the requests until shutdown() is called or the process is interrupted
+        """
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def shutdown(self):
+        """ Stop serve_forever() from another thread
+        """
+        self._httpd.shutdown()
+
+    def stop(self):
+        """ Stop the background refresh and close the socket
+        """
+        self._stop.set()
+        self._httpd.server_close()
+        if isinstance(self._httpd, UnixHTTPServer) and os.path.exists(Config.get('serve_socket')):
+            os.remove(Config.get('serve_socket'))
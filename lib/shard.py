@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import re
+import hashlib
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Shard(object):
+    """ Part i/N of the packages, to split a search between several machines.
+    A package is in a shard according to the hash of its name, so the split is the same on all the machines
+    and a package stays in its shard when other packages are added or removed.
+    """
+
+    regex_shard = re.compile(r'^\s*(?P<index>[0-9]+)\s*/\s*(?P<count>[0-9]+)\s*$')
+
+    def __init__(self, index, count):
+        if count < 1 or index < 1 or index > count:
+            raise ValueError("Invalid shard {}/{}: 1 <= i <= N is required".format(index, count))
+        self.index = index
+        self.count = count
+
+    def __str__(self):
+        return '{}/{}'.format(self.index, self.count)
+
+    @staticmethod
+    def parse(value):
+        """ Return the shard of a value i/N (i from 1 to N)
+        """
+        match = Shard.regex_shard.match(value)
+        if not match:
+            raise ValueError("Invalid shard {}: i/N is expected".format(value))
+
+        return Shard(int(match.group('index')), int(match.group('count')))
+
+    def contains(self, key):
+        """ Return True if a key (package or group of packages) is in the shard
+        """
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return int(digest[0:8], 16) % self.count == self.index - 1
+
+    @staticmethod
+    def get_groups(packages, get_depends):
+        """ Return the group of each package: the first package (by name) of the packages linked by their dependencies
+        """
+        parents = {}
+
+        def find(package):
+            parents.setdefault(package, package)
+            while parents[package] != package:
+                parents[package] = parents[parents[package]]
+                package = parents[package]
+            return package
+
+        for package in packages:
+            for depend in get_depends(package):
+                root, root_depend = find(package), find(depend)
+                if root != root_depend:
+                    parents[max(root, root_depend)] = min(root, root_depend)
+
+        return {package: find(package) for package in packages}
+
+    def select(self, packages, get_depends=None):
+        """ Return the packages of the shard
+        With get_depends, a package is in the same shard as its dependencies and its parents
+        """
+        if get_depends is None:
+            return [package for package in packages if self.contains(package)]
+
+        groups = self.get_groups(packages, get_depends)
+        return [package for package in packages if self.contains(groups[package])]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import socketserver
+
+TREE = {
+    '/': [('pub', True)],
+    '/pub': [('zlib-1.2.10', True), ('zlib-1.2.11', True), ('zlib 1.2.11 notes.txt', False), ('current', True)],
+    '/pub/zlib-1.2.10': [('zlib-1.2.10.tar.gz', False)],
+    '/pub/zlib-1.2.11': [('zlib-1.2.11.tar.gz', False), ('zlib-1.2.11.tar.xz', False)],
+}
+
+
+class FtpHandler(socketserver.StreamRequestHandler):
+    """ Minimal FTP server: anonymous login, PASV, CWD, MLSD (optional) and LIST of the TREE, RETR of the files of the server
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        cwd = '/'
+        data_socket = None
+        self.reply('220 Stand-in FTP server')
+        for line in self.rfile:
+            line = line.decode('utf-8').rstrip('\r\n')
+            command, _, arg = line.partition(' ')
+            command = command.upper()
+            server.commands.append(command)
+
+            if command == 'USER':
+                self.reply('331 Password required')
+            elif command == 'PASS':
+                self.reply('230 Logged in')
+            elif command in ('TYPE', 'NOOP'):
+                self.reply('200 OK')
+            elif command == 'PWD':
+                self.reply('257 "{}"'.format(cwd))
+            elif command == 'CWD':
+                path = arg if arg.startswith('/') else cwd.rstrip('/') + '/' + arg
+                path = path.rstrip('/') or '/'
+                if path in TREE:
+                    cwd = path
+                    self.reply('250 OK')
+                else:
+                    self.reply('550 No such directory')
+            elif command == 'PASV':
+                data_socket = socket.socket()
+                data_socket.bind(('127.0.0.1', 0))
+                data_socket.listen(1)
+                port = data_socket.getsockname()[1]
+                self.reply('227 Entering Passive Mode (127,0,0,1,{},{})'.format(port >> 8, port & 0xff))
+            elif command in ('MLSD', 'LIST'):
+                if command == 'MLSD' and not server.mlsd:
+                    self.reply('500 Unknown command')
+                    continue
+                path = (arg or cwd).rstrip('/') or '/'
+                if command == 'MLSD':
+                    lines = ['type=cdir; .', 'type=pdir; ..'] + ['type={};size=1; {}'.format('dir' if d else 'file', n) for n, d in TREE[path]]
+                else:
+                    lines = ['total 4'] + [('drwxr-xr-x    2 ftp      ftp          4096 Mar 31  2012 {}' if d else
+                                            '-rw-r--r--    1 ftp      ftp        496597 Jul 18 10:30 {}').format(n) for n, d in TREE[path]]
+                    lines.append('lrwxrwxrwx    1 ftp      ftp            11 Jan 01  2018 latest -> zlib-1.2.11/')
+                self.reply('150 Opening data connection')
+                connection, _ = data_socket.accept()
+                connection.sendall(''.join(l + '\r\n' for l in lines).encode('utf-8'))
+                connection.close()
+                data_socket.close()
+                self.reply('226 Transfer complete')
+            elif command == 'RETR':
+                path = arg if arg.startswith('/') else cwd.rstrip('/') + '/' + arg
+                if path not in server.files:
+                    data_socket.close()
+                    self.reply('550 No such file')
+                    continue
+                self.reply('150 Opening data connection')
+                connection, _ = data_socket.accept()
+                connection.sendall(server.files[path])
+                connection.close()
+                data_socket.close()
+                self.reply('226 Transfer complete')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FtpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ Server of the tests listening on a free port of 127.0.0.1 and answering in a thread until stop() is called
+    The keyword arguments are set as attributes of the server, shared with the handlers (self.server.<name>)
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, **attributes):
+        super(FtpServer, self).__init__(('127.0.0.1', 0), FtpHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands = []
+        self.mlsd = True
+        # Path => content of the files downloaded by RETR
+        self.files = {}
+        self.__dict__.update(attributes)
+        self.port = self.server_address[1]
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """ Handler of the test servers: the requests are not logged
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpServer(ThreadingHTTPServer):
+    """ Server of the tests listening on a free port of 127.0.0.1 and answering in a thread until stop() is called
+    The keyword arguments are set as attributes of the server, shared with the handlers (self.server.<name>)
+    """
+
+    def __init__(self, handler, **attributes):
+        super(HttpServer, self).__init__(('127.0.0.1', 0), handler)
+        self.__dict__.update(attributes)
+        self.host = '127.0.0.1:{}'.format(self.server_address[1])
+        self.base_url = 'http://' + self.host
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+from lib.archive_fetcher import ArchiveFetcher
+from lib.ftp_pool import FtpPool
+from lib.host_scheduler import HostScheduler
+from lib.transport import Transport
+from lib.tests.ftp_server import FtpServer
+from lib.tests.http_server import QuietHandler, HttpServer
+
+ARCHIVES = {
+    '/zlib/zlib-1.2.12.tar.gz': os.urandom(300000),
+    '/zlib/zlib-1.3.0.tar.gz': os.urandom(1000),
+    '/foo/foo-2.0.tar.xz': b'',
+}
+
+
+class ArchiveHandler(QuietHandler):
+    """ Send the archives without Content-Length, in several writes
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/throttle':
+            self.send_response(429)
+            self.send_header('Retry-After', '30')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path not in ARCHIVES:
+            self.send_error(404)
+            return
+
+        content = ARCHIVES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i in range(0, len(content), 8192):
+            self.wfile.write(content[i:i + 8192])
+
+
+class TestArchiveFetcher(unittest.TestCase):
+    def setUp(self):
+        self.server = HttpServer(ArchiveHandler, requests=[])
+        self.base_url = self.server.base_url
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'downloads')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fetch(self):
+        fetcher = ArchiveFetcher(self.cache_dir, chunk_size=1024)
+        content = ARCHIVES['/zlib/zlib-1.2.12.tar.gz']
+        digests = fetcher.fetch(self.base_url + '/zlib/zlib-1.2.12.tar.gz')
+        for name in ['md5', 'sha1', 'sha256']:
+            self.assertEqual(digests[name], hashlib.new(name, content).hexdigest())
+        self.assertEqual(digests['size'], len(content))
+
+        with open(fetcher.get_path(digests['sha256']), 'rb') as f:
+            self.assertEqual(f.read(), content)
+        # Only the archive and the index are left in the cache
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), sorted([digests['sha256'][0:2], 'index.json']))
+
+    def test_cache(self):
+        url = self.base_url + '/zlib/zlib-1.3.0.tar.gz'
+        digests = ArchiveFetcher(self.cache_dir).fetch(url)
+        # A new run uses the index saved
+        self.assertEqual(ArchiveFetcher(self.cache_dir).fetch(url), digests)
+        self.assertEqual(self.server.requests, ['/zlib/zlib-1.3.0.tar.gz'])
+
+        # The archive is downloaded again if it was removed
+        os.unlink(ArchiveFetcher(self.cache_dir).get_path(digests['sha256']))
+        self.assertEqual(ArchiveFetcher(self.cache_dir).fetch(url), digests)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_fetch_all(self):
+        urls = [self.base_url + path for path in ARCHIVES] + [self.base_url + '/missing.tar.gz']
+        results = ArchiveFetcher(self.cache_dir, max_parallel=3).fetch_all(urls + urls)
+        self.assertEqual(list(results.keys()), urls)
+        for path, content in ARCHIVES.items():
+            self.assertEqual(results[self.base_url + path]['sha256'], hashlib.sha256(content).hexdigest())
+        self.assertIsNone(results[self.base_url + '/missing.tar.gz'])
+        # Each URL is requested once
+        self.assertEqual(sorted(self.server.requests), sorted(list(ARCHIVES) + ['/missing.tar.gz']))
+        # No temporary file left
+        self.assertFalse([f for f in os.listdir(self.cache_dir) if f.startswith('.')])
+
+    def test_scheduler(self):
+        scheduler = HostScheduler(rate=100, burst=100, retry_after_max=60)
+        fetcher = ArchiveFetcher(self.cache_dir, scheduler=mock.Mock(wraps=scheduler))
+        self.assertIsNotNone(fetcher.fetch(self.base_url + '/zlib/zlib-1.3.0.tar.gz'))
+        self.assertIsNone(fetcher.fetch_all([self.base_url + '/throttle'])[self.base_url + '/throttle'])
+
+        # The downloads take a slot of their host and the pause asked by the host is applied
+        self.assertEqual([c[0][0] for c in fetcher._scheduler.request.call_args_list], [self.server.host] * 2)
+        self.assertGreater(scheduler._try_acquire(self.server.host)[0], 20)
+
+    def test_transport(self):
+        transport = Transport.create('live', requests.Session(), FtpPool(timeout=5), None)
+        fetcher = ArchiveFetcher(self.cache_dir, transport=mock.Mock(wraps=transport))
+        content = ARCHIVES['/zlib/zlib-1.3.0.tar.gz']
+        self.assertEqual(fetcher.fetch(self.base_url + '/zlib/zlib-1.3.0.tar.gz')['sha256'], hashlib.sha256(content).hexdigest())
+        fetcher._transport.retrieve.assert_called_once()
+
+        # The archives are not replayed
+        transport = Transport.create('replay', None, None, os.path.join(self.tmp_dir, 'responses.sqlite'))
+        fetcher = ArchiveFetcher(self.cache_dir, transport=transport)
+        self.assertEqual(fetcher.fetch_all([self.base_url + '/zlib/zlib-1.2.12.tar.gz']), {self.base_url + '/zlib/zlib-1.2.12.tar.gz': None})
+
+    def test_ftp(self):
+        content = ARCHIVES['/zlib/zlib-1.2.12.tar.gz']
+        ftp_server = FtpServer(files={'/pub/zlib-1.2.12.tar.gz': content})
+        try:
+            url = 'ftp://127.0.0.1:{}/pub/zlib-1.2.12.tar.gz'.format(ftp_server.port)
+            results = ArchiveFetcher(self.cache_dir).fetch_all([url, url.replace('1.2.12', '1.2.13')])
+        finally:
+            ftp_server.stop()
+
+        self.assertEqual(results[url]['sha256'], hashlib.sha256(content).hexdigest())
+        self.assertEqual(results[url]['size'], len(content))
+        self.assertIsNone(results[url.replace('1.2.12', '1.2.13')])
+        self.assertIn('RETR', ftp_server.commands)
+
+    def test_write_digests(self):
+        path = os.path.join(self.tmp_dir, 'digests')
+        with open(path, 'w') as f:
+            f.write("zlib-1.2.11.tar.gz SHA1 aaa\n"
+                    "zlib-1.2.11.tar.gz MD5 bbb\n"
+                    "zlib-1.2.11.tar.gz SHA256 ccc\n"
+                    "patch.diff SHA1 ddd\n")
+
+        digests = {'sha1': '111', 'sha256': '222', 'md5': '333'}
+        ArchiveFetcher.write_digests(path, 'zlib-1.2.12.tar.gz', digests, 'zlib-1.2.11.tar.gz')
+        with open(path, 'r') as f:
+            self.assertEqual(f.read(), "zlib-1.2.12.tar.gz SHA1 111\n"
+                                       "zlib-1.2.12.tar.gz MD5 333\n"
+                                       "zlib-1.2.12.tar.gz SHA256 222\n"
+                                       "patch.diff SHA1 ddd\n")
+
+        # New digests file
+        path = os.path.join(self.tmp_dir, 'new_digests')
+        ArchiveFetcher.write_digests(path, 'foo-2.0.tar.xz', digests)
+        with open(path, 'r') as f:
+            self.assertEqual(f.read(), "foo-2.0.tar.xz SHA1 111\n"
+                                       "foo-2.0.tar.xz SHA256 222\n"
+                                       "foo-2.0.tar.xz MD5 333\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
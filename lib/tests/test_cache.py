@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from lib.config import Config
+from lib.cache import Cache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_enabled = Config.get('cache_enabled')
+        Config.set('cache_enabled', True)
+        self.cache = Cache(dir=self.tmp_dir, duration=60)
+
+    def tearDown(self):
+        Config.set('cache_enabled', self.cache_enabled)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save(self):
+        self.cache.save('cross/zlib/versions.pkl', {'1.2.12': {}})
+        self.cache.save('cross/zlib/versions.pkl', {'1.2.13': {}})
+        # The file is replaced and no temporary file is left
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir, 'cross', 'zlib')), ['versions.pkl'])
+        self.assertTrue(self.cache.check('cross/zlib/versions.pkl'))
+        self.assertEqual(self.cache.load('cross/zlib/versions.pkl'), {'1.2.13': {}})
+
+    def test_save_error(self):
+        self.cache.save('packages.pkl', {'cross/zlib': {}})
+        # On an error, the previous file is kept
+        with mock.patch('lib.cache.pickle.dump', side_effect=pickle.PicklingError('error')):
+            with self.assertRaises(pickle.PicklingError):
+                self.cache.save('packages.pkl', {'cross/curl': {}})
+        self.assertEqual(os.listdir(self.tmp_dir), ['packages.pkl'])
+        self.assertEqual(self.cache.load('packages.pkl'), {'cross/zlib': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import unittest
+
+from lib.content_matcher import ContentMatcher
+
+EXTENSIONS = ['tar.lz', 'tar.bz2', 'tar.gz', 'tar.xz', 'zip', 'rar', 'tgz', '7z']
+
+# Regex used before ContentMatcher by PackageSearchUpdate
+REGEX_VERSION = '(?P<version>[0-9]+([._-][0-9][0-9a-zA-Z]*|[._-][0-9a-zA-Z]*[0-9])*(-[a-zA-Z0-9_]+)*)'
+
+
+def legacy_regex(filename, path=None):
+    regex_path = '((([\\w/:]*)))'
+    if path is not None:
+        regex_path = re.escape(path).replace('XXXVERXXX', REGEX_VERSION)
+    regex = '(' + regex_path + '(?P<filename>' + re.escape(filename).replace('XXXVERXXX', REGEX_VERSION) + '))'
+    regex = re.sub('(' + '|'.join(re.escape(re.escape('.' + e)) for e in EXTENSIONS) + ')',
+                   '\\.(?P<extension>' + '|'.join(re.escape(e) for e in EXTENSIONS) + ')', regex)
+    return re.compile(regex)
+
+
+def groups(matches):
+    return [(m.group(0), m.group('filename'), m.group('version'), m.group('extension')) for m in matches]
+
+
+CONTENT = """
+<script>
+var files = ["/download/zlib-1.2.11.tar.gz", "https://zlib.net/fossils/zlib-1.2.8.tar.xz", 'zlib-1.2.12.zip'];
+var old = "zlib-1.2.3-beta_2.tar.bz2"; // zlib-1.2.tar zlib-.tar.gz zlib-1.2.11.txt
+document.write('<a href=/pub/zlib-1.3.0-rc1.tar.gz>zlib-1.3.0-rc1.tar.gz</a>zlib-1.2.7a.tgz');
+</script>
+"""
+
+
+class TestContentMatcher(unittest.TestCase):
+    def assertSameAsLegacy(self, template, content, path=None):
+        if path is None:
+            matcher = ContentMatcher(template, EXTENSIONS)
+        else:
+            matcher = ContentMatcher(path + template, EXTENSIONS, filename_start=len(path), with_path=False)
+        expected = groups(legacy_regex(template, path).finditer(content))
+        self.assertTrue(expected)
+        self.assertEqual(groups(matcher.finditer(content)), expected)
+
+    def test_same_as_legacy(self):
+        self.assertSameAsLegacy('zlib-XXXVERXXX.tar.gz', CONTENT)
+        self.assertSameAsLegacy('zlib-XXXVERXXX-src.tar.gz', 'zlib-1.2-src.tar.gz zlib-2.0-rc1-src.zip zlib-2.1-beta-src.tar.xz')
+        self.assertSameAsLegacy('zlib-XXXVERXXX.tar.gz', 'zlib-1.0.tar.gz/zlib-1.1.tar.gz;zlib-1.2.tar.gzzlib-1.3.zip')
+        self.assertSameAsLegacy('foo_XXXVERXXX.zip', 'foo_1_2_3.zip "foo_2_0.tar.gz" foo_beta.zip foo_1_2_3_4.7z')
+        self.assertSameAsLegacy('vXXXVERXXX.tar.gz', '<a href="/archive/v1.0.2.tar.gz">v1.0.2</a> /archive/v1.1.tar.gz')
+        self.assertSameAsLegacy('foo.tar.gz', '/pub/1.0/foo.tar.gz /pub/1.1/foo.zip /pub/test/foo.tar.gz', path='/pub/XXXVERXXX/')
+
+    def test_without_prefix(self):
+        matcher = ContentMatcher('XXXVERXXX.tar.gz', EXTENSIONS)
+        self.assertEqual(groups(matcher.finditer('files/2.0.1.tar.gz files/12.1.zip v3.0.tar.gz')), [
+            ('files/2.0.1.tar.gz', '2.0.1.tar.gz', '2.0.1', 'tar.gz'),
+            ('files/12.1.zip', '12.1.zip', '12.1', 'zip'),
+            ('v3.0.tar.gz', '3.0.tar.gz', '3.0', 'tar.gz'),
+        ])
+
+    def test_get_version_ends(self):
+        matcher = ContentMatcher('XXXVERXXX', EXTENSIONS)
+        content = '1.2.11-rc1.tar'
+        ends = [content[0:end] for end in matcher.get_version_ends(content, 0)]
+        self.assertEqual(ends, ['1', '1.2', '1.2.1', '1.2.11', '1.2.11-r', '1.2.11-rc', '1.2.11-rc1'])
+        self.assertEqual(matcher.get_version_ends('v1.0', 0), [])
+
+    def test_no_version(self):
+        matcher = ContentMatcher('zlib.tar.gz', EXTENSIONS)
+        self.assertEqual(list(matcher.finditer(CONTENT)), [])
+
+    def test_adversarial(self):
+        # Long versions which never end by the extension, and long words before the filename
+        content = ('zlib-' + '1.' * 5000 + 'x ') * 20 + 'a' * 100000 + 'zlib-1.2.11.tar.gz'
+        start = time.perf_counter()
+        matches = groups(ContentMatcher('zlib-XXXVERXXX.tar.gz', EXTENSIONS).finditer(content))
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(matches[0][2], '1.2.11')
+
+    def test_budget(self):
+        content = 'zlib-1.0 ' * 200000
+        matcher = ContentMatcher('zlib-XXXVERXXX.tar.gz', EXTENSIONS)
+        start = time.perf_counter()
+        self.assertEqual(list(matcher.finditer(content, budget=0.01)), [])
+        self.assertTrue(matcher.timed_out)
+        self.assertLess(time.perf_counter() - start, 1)
+
+        list(matcher.finditer('zlib-1.0.tar.gz', budget=1))
+        self.assertFalse(matcher.timed_out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+from urllib.parse import urlparse
+
+import requests
+from lib.forge_adapters import ForgeAdapter, GithubAdapter, PypiAdapter
+from lib.interning import Interning
+from lib.tests.http_server import QuietHandler, HttpServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures')
+
+
+class ForgeHandler(QuietHandler):
+    """ Answer the recorded JSON of the GitHub and PyPI APIs
+    """
+
+    routes = {
+        '/github/repos/example/project/tags?per_page=100': 'github_tags.json',
+        '/github/repos/example/project/releases?per_page=100': None,
+        '/github/repos/example/notags/tags?per_page=100': None,
+        '/github/repos/example/notags/releases?per_page=100': 'github_releases.json',
+        '/pypi/project/json': 'pypi.json',
+    }
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path not in self.routes:
+            self.send_error(404)
+            return
+
+        content = b'[]'
+        if self.routes[self.path]:
+            with open(os.path.join(FIXTURES_DIR, self.routes[self.path]), 'rb') as f:
+                content = f.read()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestForgeAdapters(unittest.TestCase):
+    def setUp(self):
+        self.server = HttpServer(ForgeHandler, requests=[])
+        self.base_url = self.server.base_url
+        self.api_urls = {'github': self.base_url + '/github', 'pypi': self.base_url + '/pypi'}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def _get_hrefs(self, url):
+        """ Return the hrefs parsed from all the API URLs of the adapter
+        """
+        adapter = ForgeAdapter.get_adapter(url, self.api_urls)
+        url_p = urlparse(url)
+        hrefs = []
+        for api_url in adapter.get_api_urls(url_p):
+            hrefs += adapter.parse(requests.get(api_url, headers=adapter.get_headers()).json(), url_p)
+        return [href['href'] for href in hrefs]
+
+    def test_get_adapter(self):
+        self.assertIsInstance(ForgeAdapter.get_adapter('https://github.com/example/project/archive', self.api_urls), GithubAdapter)
+        self.assertIsInstance(ForgeAdapter.get_adapter('https://files.pythonhosted.org/packages/source/p/project', self.api_urls), PypiAdapter)
+        self.assertIsNone(ForgeAdapter.get_adapter('https://example.com/project', self.api_urls))
+        # Disabled adapter
+        self.assertIsNone(ForgeAdapter.get_adapter('https://github.com/example/project/archive', {'pypi': self.api_urls['pypi']}))
+
+    def test_github_tags(self):
+        hrefs = self._get_hrefs('https://github.com/example/project/archive')
+        self.assertEqual(hrefs, [
+            'https://github.com/example/project/archive/v2.1.0.tar.gz',
+            'https://github.com/example/project/archive/v2.1.0.zip',
+            'https://github.com/example/project/archive/v2.0.1.tar.gz',
+            'https://github.com/example/project/archive/v2.0.1.zip',
+        ])
+        # The tags and the releases of the repository
+        self.assertEqual(self.server.requests, ['/github/repos/example/project/tags?per_page=100',
+                                                '/github/repos/example/project/releases?per_page=100'])
+
+    def test_github_releases(self):
+        hrefs = self._get_hrefs('https://github.com/example/notags/releases/download/release-1.3')
+        self.assertIn('https://github.com/example/notags/releases/download/release-1.4/project-1.4.tar.xz', hrefs)
+        self.assertIn('https://github.com/example/notags/archive/release-1.4.tar.gz', hrefs)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_github_token(self):
+        adapter = ForgeAdapter.get_adapter('https://github.com/example/project', self.api_urls, {'github': 'secret'})
+        self.assertEqual(adapter.get_headers()['Authorization'], 'token secret')
+        adapter = ForgeAdapter.get_adapter('https://github.com/example/project', self.api_urls, {'github': ''})
+        self.assertNotIn('Authorization', adapter.get_headers())
+
+    def test_pypi(self):
+        hrefs = self._get_hrefs('https://files.pythonhosted.org/packages/source/p/project')
+        self.assertEqual(sorted(hrefs), [
+            'https://files.pythonhosted.org/packages/11/22/33/project-1.3.0.tar.gz',
+            'https://files.pythonhosted.org/packages/aa/bb/cc/project-1.2.0.tar.gz',
+            'https://files.pythonhosted.org/packages/dd/ee/ff/project-1.3.0-py3-none-any.whl',
+        ])
+        self.assertEqual(self.server.requests, ['/pypi/project/json'])
+
+    def test_adapter(self):
+        # An adapter implements the requests and the parsing of its API
+        with self.assertRaises(TypeError):
+            ForgeAdapter(self.api_urls['github'])
+
+        url_p = Interning.urlparse('https://github.com/example/project')
+        href = GithubAdapter(self.api_urls['github']).parse([{'name': 'v1.0'}], url_p)[0]
+        self.assertEqual(href, Interning.href('https://github.com/example/project/archive/v1.0.tar.gz', 'v1.0'))
+        self.assertIs(href['href_p'].path, Interning.intern_string('/example/project/archive/v1.0.tar.gz'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import ftplib
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.ftp_pool import FtpPool
+from lib.tests.ftp_server import TREE, FtpServer
+
+
+class TestFtpPool(unittest.TestCase):
+    def setUp(self):
+        self.server = FtpServer(files={'/pub/zlib-1.2.11/zlib-1.2.11.tar.gz': b'zlib' * 10000})
+        self.port = self.server.port
+        self.pool = FtpPool(timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def test_mlsd(self):
+        entries = self.pool.list('127.0.0.1', '/pub', self.port)
+        self.assertEqual(entries, TREE['/pub'])
+        self.assertIn('MLSD', self.server.commands)
+        self.assertNotIn('LIST', self.server.commands)
+
+    def test_list_fallback(self):
+        self.server.mlsd = False
+        entries = self.pool.list('127.0.0.1', '/pub', self.port)
+        self.assertEqual(entries, TREE['/pub'] + [('latest', True)])
+        # MLSD is not tried again on the same server
+        self.pool.list('127.0.0.1', '/pub/zlib-1.2.11', self.port)
+        self.assertEqual(self.server.commands.count('MLSD'), 1)
+
+    def test_reuse_connection(self):
+        for path in ['/pub', '/pub/zlib-1.2.10', '/pub/zlib-1.2.11']:
+            self.assertEqual(self.pool.list('127.0.0.1', path, self.port), TREE[path])
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.commands.count('USER'), 1)
+
+    def test_reconnect(self):
+        self.pool.list('127.0.0.1', '/pub', self.port)
+        # The server closed the idle connection
+        for connections in self.pool._idle.values():
+            for ftp, _ in connections:
+                ftp.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.pool.list('127.0.0.1', '/pub', self.port), TREE['/pub'])
+        self.assertEqual(self.server.connections, 2)
+
+    def test_idle_timeout(self):
+        pool = FtpPool(timeout=5, idle_timeout=-1)
+        pool.list('127.0.0.1', '/pub', self.port)
+        pool.list('127.0.0.1', '/pub', self.port)
+        self.assertEqual(self.server.connections, 2)
+        pool.close()
+
+    def test_parallel(self):
+        paths = ['/pub/zlib-1.2.10', '/pub/zlib-1.2.11'] * 4
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda p: self.pool.list('127.0.0.1', p, self.port), paths))
+        self.assertEqual(results, [TREE[p] for p in paths])
+        self.assertLessEqual(self.server.connections, 4)
+        # Only max_idle connections are kept
+        self.assertLessEqual(sum(len(c) for c in self.pool._idle.values()), 2)
+
+    def test_retrieve(self):
+        blocks = []
+        self.pool.retrieve('127.0.0.1', '/pub/zlib-1.2.11/zlib-1.2.11.tar.gz', blocks.append, self.port, blocksize=8192)
+        self.assertEqual(b''.join(blocks), b'zlib' * 10000)
+        # The connection is reused for the listings
+        self.assertEqual(self.pool.list('127.0.0.1', '/pub', self.port), TREE['/pub'])
+        self.assertEqual(self.server.connections, 1)
+
+        with self.assertRaises(ftplib.error_perm):
+            self.pool.retrieve('127.0.0.1', '/pub/missing.tar.gz', blocks.append, self.port)
+
+    def test_parse_list(self):
+        lines = [
+            'total 12',
+            'drwxr-xr-x    2 ftp      ftp          4096 Mar 31  2012 old',
+            '-rw-r--r--    1 ftp      ftp        496597 Jul 18  2005 zlib-1.2.3.tar.gz',
+            '-rw-r--r--    1 ftp      ftp        496597 Jul 18 10:30 name with spaces.tar.gz',
+            '-rw-r--r--+   1 ftp      4096 Jul 18 10:30 nogroup.tar.gz',
+            'lrwxrwxrwx    1 ftp      ftp            11 Jan 01  2018 latest -> zlib-1.2.11/',
+            'lrwxrwxrwx    1 ftp      ftp            11 Jan 01  2018 zlib.tar.gz -> zlib-1.2.11.tar.gz',
+            '01-31-18  10:00AM       <DIR>          dos dir',
+            '01-31-18  10:00AM                 1024 dos-1.0.zip',
+            'drwxr-xr-x    2 ftp      ftp          4096 Mar 31  2012 .',
+            'unknown format file-1.0.tar.gz',
+        ]
+        self.assertEqual(FtpPool.parse_list(lines), [
+            ('old', True),
+            ('zlib-1.2.3.tar.gz', False),
+            ('name with spaces.tar.gz', False),
+            ('nogroup.tar.gz', False),
+            ('latest', True),
+            ('zlib.tar.gz', False),
+            ('dos dir', True),
+            ('dos-1.0.zip', False),
+            ('file-1.0.tar.gz', False),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import git as git
+from lib.git_mirrors import GitMirrors
+from lib.vcs_backend import VcsBackend, VcsError
+
+
+def commit(repo, filename, content):
+    with open(os.path.join(repo.working_tree_dir, filename), 'w') as f:
+        f.write(content)
+    repo.index.add([filename])
+    return repo.index.commit('Update ' + filename)
+
+
+def count_objects(path):
+    """ Return the number of objects stored in a repository (without its alternates)
+    """
+    stats = dict(line.split(': ') for line in git.Repo(path).git.count_objects('-v').splitlines())
+    return int(stats['count']) + int(stats['in-pack'])
+
+
+class TestGitMirrors(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # Upstream with a big history and a release tag
+        self.upstream = git.Repo.init(os.path.join(self.tmp_dir, 'alice', 'project'), initial_branch='main')
+        for i in range(20):
+            commit(self.upstream, 'file{}.txt'.format(i), 'content {}\n'.format(i) * 100)
+        self.upstream.create_tag('v1.0')
+        self.upstream_url = 'file://' + self.upstream.working_tree_dir
+        self.backend = VcsBackend(max_parallel=4, timeout=30)
+        self.mirrors = GitMirrors(os.path.join(self.tmp_dir, 'mirrors'), self.backend)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def update(self, url, since=None):
+        return self.backend.run_sync(self.mirrors.update(url, since))
+
+    def test_normalize_url(self):
+        for url in ['https://GitHub.com/owner/repo.git', 'https://github.com/owner/repo/', 'git@github.com:owner/repo.git',
+                    'ssh://git@github.com/owner/repo', 'git://github.com/owner/repo']:
+            self.assertEqual(GitMirrors.normalize_url(url), 'github.com/owner/repo')
+        self.assertEqual(GitMirrors.normalize_url('https://git.example.com:8443/repo'), 'git.example.com:8443/repo')
+        self.assertEqual(self.mirrors.get_path('https://github.com/owner/repo.git'), self.mirrors.get_path('git@github.com:owner/repo'))
+        self.assertNotEqual(self.mirrors.get_path('https://github.com/owner/repo'), self.mirrors.get_path('https://github.com/owner_repo'))
+
+    def test_update(self):
+        path = self.update(self.upstream_url)
+        repo = git.Repo(path)
+        self.assertTrue(repo.bare)
+        self.assertEqual(repo.head.commit, self.upstream.head.commit)
+        self.assertEqual([str(t) for t in repo.tags], ['v1.0'])
+        self.assertTrue(self.mirrors.exists(self.upstream_url.rstrip('/') + '.git'))
+
+        # Fetched once by run
+        run_started = time.time()
+        new_commit = commit(self.upstream, 'new.txt', 'new')
+        self.upstream.create_tag('v1.1')
+        self.assertEqual(self.update(self.upstream_url, run_started), path)
+        self.assertEqual(git.Repo(path).head.commit, new_commit)
+        commit(self.upstream, 'other.txt', 'other')
+        self.update(self.upstream_url, run_started)
+        self.assertEqual(git.Repo(path).head.commit, new_commit)
+
+        # The deleted tags are pruned
+        self.upstream.delete_tag('v1.1')
+        self.update(self.upstream_url)
+        self.assertEqual([str(t) for t in git.Repo(path).tags], ['v1.0'])
+        self.assertEqual(git.Repo(path).head.commit, self.upstream.head.commit)
+
+    def test_fork(self):
+        upstream_path = self.update(self.upstream_url)
+        fork = self.upstream.clone(os.path.join(self.tmp_dir, 'bob', 'project'))
+        fork_commit = commit(fork, 'fork.txt', 'fork')
+        fork.create_tag('v1.0-bob')
+
+        fork_path = self.update('file://' + fork.working_tree_dir)
+        self.assertEqual(self.mirrors.get_related('file://' + fork.working_tree_dir), [upstream_path])
+        with open(os.path.join(fork_path, 'objects', 'info', 'alternates'), 'r') as f:
+            self.assertEqual(f.read().strip(), os.path.join(os.path.abspath(upstream_path), 'objects'))
+
+        # Only the commit of the fork is downloaded: commit, tree and blob
+        self.assertGreaterEqual(count_objects(upstream_path), 60)
+        self.assertLessEqual(count_objects(fork_path), 3)
+        repo = git.Repo(fork_path)
+        self.assertEqual(repo.head.commit, fork_commit)
+        self.assertEqual(len(list(repo.iter_commits('v1.0..HEAD'))), 1)
+
+    def test_concurrent_updates(self):
+        # The packages using the same upstream wait for the mirror and don't fetch it again
+        commands = []
+        run = self.backend.run
+
+        async def run_logged(*command, cwd=None):
+            commands.append(command)
+            return await run(*command, cwd=cwd)
+        self.backend.run = run_logged
+
+        run_started = time.time()
+        paths = self.backend.run_all([self.mirrors.update(url, run_started) for url in [self.upstream_url, self.upstream_url + '/'] * 3])
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(len([c for c in commands if c[1] == 'fetch']), 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp_dir, 'mirrors'))), [os.path.basename(paths[0]), os.path.basename(paths[0]) + '.lock'])
+
+    def test_error(self):
+        with self.assertRaises(VcsError):
+            self.update('file://' + os.path.join(self.tmp_dir, 'missing'))
+        self.assertFalse(os.path.exists(self.mirrors.get_path('file://' + os.path.join(self.tmp_dir, 'missing'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
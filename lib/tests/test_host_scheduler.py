@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import unittest
+import multiprocessing
+
+import requests
+from lib.host_scheduler import HostScheduler
+from lib.tests.http_server import QuietHandler, HttpServer
+
+
+class ThrottlingHandler(QuietHandler):
+    """ Answer 429 with Retry-After when more than one request is in progress or when /throttle is requested
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.times.append(time.time())
+            throttle = server.in_flight > 1 or self.path == '/throttle' and server.throttled == 0
+            if throttle:
+                server.throttled += 1
+
+        time.sleep(0.05)
+
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+        with server.lock:
+            server.in_flight -= 1
+
+
+def _get(args):
+    scheduler, url, host = args
+    with scheduler.request(host) as slot:
+        slot['retry_after'] = scheduler.get_retry_after(requests.get(url))
+    return slot['retry_after']
+
+
+class TestHostScheduler(unittest.TestCase):
+    def setUp(self):
+        self.server = HttpServer(ThrottlingHandler, lock=threading.Lock(), in_flight=0, max_in_flight=0, throttled=0, times=[])
+        self.host = self.server.host
+        self.url = self.server.base_url + '/'
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_rate(self):
+        scheduler = HostScheduler(rate=10, burst=2, max_in_flight=10)
+        start = time.time()
+        for _ in range(6):
+            scheduler.acquire('host')
+            scheduler.release('host')
+        # 2 requests from the burst, then 4 requests at 10 requests per second
+        self.assertGreaterEqual(time.time() - start, 0.35)
+
+        # Another host is not limited by the first one
+        start = time.time()
+        scheduler.acquire('other')
+        self.assertLess(time.time() - start, 0.05)
+
+    def test_max_in_flight_threads(self):
+        scheduler = HostScheduler(rate=100, burst=100, max_in_flight=1)
+        threads = [threading.Thread(target=_get, args=((scheduler, self.url, self.host),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.max_in_flight, 1)
+        self.assertEqual(self.server.throttled, 0)
+
+    def test_max_in_flight_processes(self):
+        with multiprocessing.Manager() as manager:
+            scheduler = HostScheduler(rate=100, burst=100, max_in_flight=1, state=manager.dict(), lock=manager.Lock())
+            with multiprocessing.Pool(4) as pool:
+                results = pool.map(_get, [(scheduler, self.url, self.host)] * 8)
+
+        self.assertEqual(results, [None] * 8)
+        self.assertEqual(self.server.max_in_flight, 1)
+        self.assertEqual(len(self.server.times), 8)
+
+    def test_retry_after(self):
+        scheduler = HostScheduler(rate=100, burst=100, max_in_flight=2)
+        self.assertEqual(_get((scheduler, self.url + 'throttle', self.host)), 1.0)
+
+        # The host is paused during the delay asked
+        start = time.time()
+        self.assertIsNone(_get((scheduler, self.url + 'throttle', self.host)))
+        self.assertGreaterEqual(time.time() - start, 0.9)
+
+    def test_retry_after_max(self):
+        scheduler = HostScheduler(rate=10, retry_after_max=0.2)
+        scheduler.release('host', 60)
+        start = time.time()
+        scheduler.acquire('host')
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_lease(self):
+        scheduler = HostScheduler(rate=100, burst=100, max_in_flight=1, lease=0.2)
+        # The worker of the first request died: its slot is freed when its lease expires
+        lease = scheduler.acquire('host')
+        start = time.time()
+        other_lease = scheduler.acquire('host')
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertLess(time.time() - start, 1.0)
+
+        # The release of an expired lease doesn't free the slot of another request
+        scheduler.release('host', lease=lease)
+        start = time.time()
+        scheduler.acquire('host')
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        scheduler.release('host', lease=other_lease)
+
+    def test_rate_limit(self):
+        scheduler = HostScheduler()
+        response = requests.Response()
+        response.status_code = 403
+        response.headers['X-RateLimit-Remaining'] = '0'
+        response.headers['X-RateLimit-Reset'] = str(int(time.time()) + 60)
+        # The rate limit of the API is exhausted until its reset
+        self.assertAlmostEqual(scheduler.get_retry_after(response), 60, delta=2)
+
+        response.headers['X-RateLimit-Remaining'] = '10'
+        self.assertIsNone(scheduler.get_retry_after(response))
+
+    def test_interleave(self):
+        hosts = {'a1': 'a', 'a2': 'a', 'a3': 'a', 'b1': 'b', 'c1': 'c', 'c2': 'c'}
+        self.assertEqual(HostScheduler.interleave(sorted(hosts), hosts.get), ['a1', 'b1', 'c1', 'a2', 'c2', 'a3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import pickle
+import unittest
+import collections
+from urllib.parse import ParseResult
+
+from lib.interning import Interning
+
+
+def build(value):
+    """ Return an equal string which is not the same object
+    """
+    return ''.join(list(value))
+
+
+class TestInterning(unittest.TestCase):
+    def test_intern(self):
+        records = [{
+            'informations': {
+                'version': build('1.2.11'),
+                'all_depends': {build('cross/zlib'), build('native/nasm')},
+                'versions': collections.OrderedDict([(build('1.2.12'), {'urls': [(build('https'), build('zlib.net'))]})]),
+            },
+        } for _ in range(2)]
+        interned = Interning.intern(records)
+        self.assertEqual(interned, records)
+        self.assertIsInstance(interned[0]['informations']['versions'], collections.OrderedDict)
+        self.assertIsInstance(interned[0]['informations']['all_depends'], set)
+
+        first, second = interned[0]['informations'], interned[1]['informations']
+        self.assertIs(first['version'], second['version'])
+        self.assertIs(sorted(first['all_depends'])[0], sorted(second['all_depends'])[0])
+        self.assertIs(first['versions']['1.2.12']['urls'][0][1], second['versions']['1.2.12']['urls'][0][1])
+        self.assertLess(len(pickle.dumps(interned)), len(pickle.dumps(records)))
+
+    def test_long_strings(self):
+        content = build('x' * 1000)
+        self.assertIs(Interning.intern(content), content)
+
+    def test_href(self):
+        first, second = Interning.href(build('https://zlib.net/zlib-1.2.11.tar.gz')), Interning.href(build('https://zlib.net/fossils/'), 'fossils')
+        self.assertIsInstance(first['href_p'], ParseResult)
+        self.assertEqual(first['href_p'].path, '/zlib-1.2.11.tar.gz')
+        self.assertIs(first['href_p'].netloc, second['href_p'].netloc)
+        self.assertEqual(second['content'], 'fossils')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+from lib.job_queue import JobQueue
+
+PACKAGES = ['cross/package{:03d}'.format(i) for i in range(200)]
+
+
+def work(path, worker):
+    """ Claim and finish jobs until the queue is empty, return the packages claimed
+    """
+    queue = JobQueue(path)
+    claimed = []
+    while True:
+        packages = queue.claim(worker, 3)
+        if not packages:
+            break
+        claimed.extend(packages)
+        queue.finish(worker, packages)
+    queue.close()
+
+    return claimed
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'queue', 'jobs.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_claim(self):
+        queue = JobQueue(self.path, lease=60)
+        self.assertEqual(queue.add(PACKAGES[0:5]), 5)
+        self.assertEqual(queue.add(PACKAGES[0:6]), 1)
+
+        self.assertEqual(queue.claim('a', 2, now=1000), PACKAGES[0:2])
+        self.assertEqual(queue.claim('b', 10, now=1000), PACKAGES[2:6])
+        self.assertEqual(queue.claim('c', 10, now=1000), [])
+        queue.finish('a', PACKAGES[0:2])
+        self.assertEqual(queue.get_counts(), {'done': 2, 'running': 4})
+
+        # The jobs of the worker b are claimed again after the lease
+        queue.release('b', PACKAGES[2:3])
+        self.assertEqual(queue.claim('c', 10, now=1030), PACKAGES[2:3])
+        self.assertEqual(queue.claim('c', 10, now=1061), PACKAGES[3:6])
+        queue.finish('b', PACKAGES[3:6])
+        self.assertEqual(queue.get_counts(), {'done': 2, 'running': 4})
+        queue.finish('c', PACKAGES[2:6])
+        self.assertEqual(queue.get_counts(), {'done': 6})
+        queue.close()
+
+    def test_claim_longest_first(self):
+        queue = JobQueue(self.path)
+        queue.add(PACKAGES[0:5], {PACKAGES[0]: 1.0, PACKAGES[1]: 30.0, PACKAGES[3]: 5.0, PACKAGES[4]: 30.0})
+
+        # The packages never searched are claimed first, then the longest
+        self.assertEqual(queue.claim('a', 3), [PACKAGES[2], PACKAGES[1], PACKAGES[4]])
+        self.assertEqual(queue.claim('a', 3), [PACKAGES[3], PACKAGES[0]])
+        queue.close()
+
+    def test_max_attempts(self):
+        queue = JobQueue(self.path, lease=60, max_attempts=2)
+        queue.add(PACKAGES[0:1])
+        self.assertEqual(queue.claim('a', 1, now=1000), PACKAGES[0:1])
+        self.assertEqual(queue.claim('b', 1, now=1100), PACKAGES[0:1])
+        self.assertEqual(queue.claim('c', 1, now=1200), [])
+        queue.close()
+
+    def test_workers(self):
+        queue = JobQueue(self.path)
+        queue.add(PACKAGES)
+        with multiprocessing.Pool(4) as pool:
+            claimed = pool.starmap(work, [(self.path, 'worker{}'.format(i)) for i in range(4)])
+
+        # Each package is searched by only one worker
+        self.assertEqual(sorted(sum(claimed, [])), PACKAGES)
+        self.assertEqual(queue.get_counts(), {'done': len(PACKAGES)})
+        queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
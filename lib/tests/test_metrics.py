@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import time
+import pickle
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+from lib.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _worker_metrics(self, package, duration):
+        metrics = Metrics(package)
+        with metrics.span('download', host='example.com'):
+            time.sleep(0.01)
+        metrics.add_time('search', duration)
+        metrics.increment('pages_fetched')
+        metrics.increment('requests', 2, host='example.com')
+        metrics.observe('search', duration, 'common')
+        return metrics
+
+    def test_span(self):
+        metrics = self._worker_metrics('cross/zlib', 1.0)
+        phases = metrics.get_phases()
+        self.assertEqual(phases['download']['count'], 1)
+        self.assertGreaterEqual(phases['download']['time'], 0.01)
+        self.assertGreaterEqual(metrics.get_hosts()['example.com']['time'], 0.01)
+        self.assertEqual(metrics.get_hosts()['example.com']['requests'], 2)
+        self.assertEqual(metrics.get_counter('pages_fetched'), 1)
+        self.assertEqual(metrics.get_counter('unknown'), 0)
+
+    def test_histogram(self):
+        metrics = Metrics()
+        for value in [0.05, 0.7, 400.0]:
+            metrics.observe('search', value, 'git')
+        stats = metrics.get_histograms()['search']['git']
+        # The buckets are cumulative: a value is counted in all the buckets of upper bound >= value
+        self.assertEqual(stats['buckets'][0:4], [1, 1, 2, 2])
+        self.assertEqual(stats['buckets'][-1], 2)
+        self.assertEqual(stats['count'], 3)
+        self.assertAlmostEqual(stats['sum'], 400.75)
+
+    def test_merge(self):
+        metrics = Metrics()
+        # The data of the workers are pickled
+        for data in [pickle.loads(pickle.dumps(self._worker_metrics(p, d).get_data())) for p, d in [('cross/zlib', 1.0), ('cross/curl', 3.0)]]:
+            metrics.merge(data)
+
+        self.assertEqual(metrics.get_counter('pages_fetched'), 2)
+        self.assertEqual(metrics.get_hosts()['example.com']['requests'], 4)
+        self.assertEqual(metrics.get_phases()['search'], {'count': 2, 'time': 4.0})
+        self.assertEqual(metrics.get_packages_duration(), [('cross/curl', 3.0), ('cross/zlib', 1.0)])
+        self.assertEqual(metrics.get_histograms()['search']['common']['count'], 2)
+
+        metrics.reset()
+        self.assertEqual(metrics.get_data(), {'phases': {}, 'hosts': {}, 'counters': {}, 'histograms': {}})
+
+    def test_pickle(self):
+        metrics = pickle.loads(pickle.dumps(self._worker_metrics('cross/zlib', 1.0)))
+        metrics.increment('pages_fetched')
+        self.assertEqual(metrics.get_counter('pages_fetched'), 2)
+
+    def test_report(self):
+        metrics = Metrics()
+        metrics.merge(self._worker_metrics('cross/zlib', 1.0).get_data())
+        path = os.path.join(self.tmp_dir, 'report.json')
+        metrics.save_report(path)
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['counters'], {'pages_fetched': 1})
+        self.assertEqual(report['packages']['cross/zlib']['search'], {'count': 1, 'time': 1.0})
+        self.assertEqual(report['phases']['search'], {'count': 1, 'time': 1.0})
+        self.assertEqual(report['hosts']['example.com']['requests'], 2)
+
+    def test_summary(self):
+        metrics = Metrics()
+        metrics.merge(self._worker_metrics('cross/zlib', 1.0).get_data())
+        metrics.merge(self._worker_metrics('cross/curl', 3.0).get_data())
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            metrics.pprint_summary(top=1)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], 'Run summary:')
+        self.assertIn(' - pages_fetched                  2', lines)
+        # Only the slowest package
+        index = lines.index('Slowest packages:')
+        self.assertTrue(lines[index + 1].startswith(' - cross/curl'))
+        self.assertEqual(lines[index + 2], 'Slowest hosts:')
+        self.assertIn('4 requests', lines[index + 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
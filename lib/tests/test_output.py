@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+from lib.output import Output
+
+RECORDS = [
+    {'package': 'cross/zlib', 'version': '1.2.12', 'versions': ['1.2.13', '1.3']},
+    {'package': 'cross/curl', 'version': '7.60.0', 'versions': []},
+]
+
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'output')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, output_format, records, table=None, header=None):
+        output = Output(output_format, self.path)
+        if table:
+            output.set_table(table, header)
+        for record in records:
+            output.write(record)
+            # Each record is written as soon as it is available
+            with open(self.path) as f:
+                self.assertIn(record['package'], f.readlines()[-1])
+        output.close()
+
+        with open(self.path) as f:
+            return f.read()
+
+    def test_table(self):
+        content = self._write('table', RECORDS, lambda r: "{:<12} {}".format(r['package'], r['version']), "Package      Version")
+        self.assertEqual(content, "Package      Version\ncross/zlib   1.2.12\ncross/curl   7.60.0\n")
+
+        # The header of an empty table is written
+        self.assertEqual(self._write('table', [], str, "Package"), "Package\n")
+
+    def test_jsonl(self):
+        content = self._write('jsonl', RECORDS)
+        self.assertEqual([json.loads(line) for line in content.splitlines()], RECORDS)
+
+    def test_csv(self):
+        content = self._write('csv', RECORDS)
+        self.assertEqual(content, "package,version,versions\ncross/zlib,1.2.12,1.2.13 1.3\ncross/curl,7.60.0,\n")
+
+    def test_stdout(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            output = Output('jsonl')
+            output.write(RECORDS[0])
+            output.close()
+        self.assertEqual(json.loads(stdout.getvalue()), RECORDS[0])
+        self.assertFalse(stdout.closed)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Output('xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
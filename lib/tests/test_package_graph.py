@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lib.package_graph import PackageGraph
+
+
+class TestPackageGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = PackageGraph()
+        self.graph.add('spk/ffmpeg', ['cross/ffmpeg'])
+        self.graph.add('cross/ffmpeg', ['cross/x265', 'cross/zlib'])
+        self.graph.add('cross/x265', ['native/nasm', 'cross/zlib'])
+        self.graph.add('cross/zlib', [])
+        self.graph.add('native/nasm', [])
+        self.graph.add('cross/unused', ['cross/zlib', 'cross/missing'])
+        # Same package in the list of the SPK packages
+        self.graph.add('cross/ffmpeg', ['cross/zlib'])
+
+    def test_depends(self):
+        self.assertEqual(self.graph.get_depends('cross/ffmpeg'), ['cross/x265', 'cross/zlib'])
+        self.assertEqual(self.graph.get_depends('cross/missing'), [])
+        self.assertEqual(self.graph.get_depends('cross/unknown'), [])
+
+    def test_parents(self):
+        self.assertEqual(self.graph.get_parents('cross/zlib'), ['cross/ffmpeg', 'cross/unused', 'cross/x265'])
+        self.assertEqual(self.graph.get_parents('spk/ffmpeg'), [])
+        # Only the packages added have parents
+        self.assertEqual(self.graph.get_parents('cross/missing'), [])
+
+    def test_descendants(self):
+        self.assertEqual(self.graph.get_descendants(['spk/ffmpeg']), {'cross/ffmpeg', 'cross/x265', 'cross/zlib', 'native/nasm'})
+        # The dependencies of the packages not expandable are not followed
+        self.assertEqual(self.graph.get_descendants(['spk/ffmpeg'], ['cross/ffmpeg']), {'cross/ffmpeg', 'cross/x265', 'cross/zlib'})
+        self.assertEqual(self.graph.get_descendants(['cross/unknown']), set())
+
+    def test_cycle(self):
+        self.graph.add('cross/a', ['cross/b'])
+        self.graph.add('cross/b', ['cross/a'])
+        self.assertEqual(self.graph.get_descendants(['cross/a']), {'cross/a', 'cross/b'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lib.config import Config
+from lib.package_search_update import PackageSearchUpdate
+from lib.tests.http_server import QuietHandler, HttpServer
+
+MAKEFILE = """PKG_NAME = foo
+PKG_VERS = 1.0
+PKG_EXT = tar.xz
+PKG_DIST_NAME = $(PKG_NAME)-$(PKG_VERS).$(PKG_EXT)
+PKG_DIST_SITE = https://github.com/example/foo/releases/download/v$(PKG_VERS)
+"""
+
+TAGS = [{'name': 'v1.1'}, {'name': 'v1.0'}]
+
+RELEASES = [{
+    'tag_name': 'v1.1',
+    'assets': [{'name': 'foo-1.1.tar.xz', 'browser_download_url': 'https://github.com/example/foo/releases/download/v1.1/foo-1.1.tar.xz'}],
+}]
+
+
+class ApiHandler(QuietHandler):
+    """ Answer the routes of the server: a file for bytes, a HTML page for a string and JSON otherwise
+    A route can be a tuple (content, headers)
+    """
+
+    def _send(self, with_content):
+        self.server.requests.append(self.command + ' ' + self.path)
+        if self.path not in self.server.routes:
+            self.send_error(404)
+            return
+
+        content = self.server.routes[self.path]
+        headers = {}
+        if isinstance(content, tuple):
+            content, headers = content
+        if isinstance(content, bytes):
+            content_type = 'application/octet-stream'
+        elif isinstance(content, str):
+            content_type = 'text/html'
+            content = content.encode('utf-8')
+        else:
+            content_type = 'application/json'
+            content = json.dumps(content).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if with_content:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self._send(True)
+
+    def do_HEAD(self):
+        self._send(False)
+
+
+class TestPackageSearchUpdate(unittest.TestCase):
+    configs = {
+        'probe_enabled': False,
+        'scheduler_enabled': False,
+        'transport_mode': 'live',
+        'forge_pypi_api': '',
+        'forge_github_token': '',
+        'forge_github_anonymous': True,
+        'forge_max_pages': 10,
+        'crawl_max_parallel': 4,
+    }
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.makefile_path = os.path.join(self.tmp_dir, 'cross', 'foo', 'Makefile')
+        os.makedirs(os.path.dirname(self.makefile_path))
+        with open(self.makefile_path, 'w') as f:
+            f.write(MAKEFILE)
+
+        self.server = HttpServer(ApiHandler, requests=[], routes={})
+
+        configs = dict(self.configs)
+        configs['cache_dir'] = os.path.join(self.tmp_dir, 'cache')
+        configs['forge_github_api'] = self.server.base_url + '/github'
+        self.values = {key: Config.get(key) for key in configs}
+        for key, value in configs.items():
+            Config.set(key, value)
+
+    def tearDown(self):
+        for key, value in self.values.items():
+            Config.set(key, value)
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def _search(self):
+        return PackageSearchUpdate('cross/foo', self.makefile_path).search_updates()
+
+    def test_forge_release_asset(self):
+        self.server.routes = {
+            '/github/repos/example/foo/tags?per_page=100': TAGS,
+            '/github/repos/example/foo/releases?per_page=100': RELEASES,
+        }
+        with mock.patch.object(PackageSearchUpdate, '_get_url_data', return_value=False) as get_url_data:
+            versions = self._search()
+
+        # The file attached to the release is found with the tags of the repository, without crawling the pages
+        self.assertEqual(sorted(versions.keys()), ['1.1'])
+        self.assertEqual(versions['1.1']['urls'][0]['full'], '//github.com/example/foo/releases/download/v1.1/foo-1.1.tar.xz')
+        self.assertEqual(len(self.server.requests), 2)
+        get_url_data.assert_not_called()
+
+    def test_forge_pages(self):
+        next_url = self.server.base_url + '/github/repos/example/foo/tags?per_page=100&page={}'
+        self.server.routes = {
+            '/github/repos/example/foo/tags?per_page=100': ([{'name': 'v1.0'}], {'Link': '<{}>; rel="next"'.format(next_url.format(2))}),
+            '/github/repos/example/foo/tags?per_page=100&page=2': ([{'name': 'v1.1'}], {'Link': '<{}>; rel="next"'.format(next_url.format(3))}),
+            '/github/repos/example/foo/tags?per_page=100&page=3': ([{'name': 'v1.2'}], {'Link': '<{}>; rel="next"'.format(next_url.format(4))}),
+            '/github/repos/example/foo/releases?per_page=100': [],
+        }
+        Config.set('forge_max_pages', 3)
+        with mock.patch.object(PackageSearchUpdate, '_get_url_data', return_value=False):
+            PackageSearchUpdate('cross/foo', self.makefile_path)._get_forge_data('https://github.com/example/foo/releases/download/v1.0')
+
+        # The next pages are followed until forge_max_pages
+        self.assertEqual(self.server.requests, [
+            'GET /github/repos/example/foo/tags?per_page=100',
+            'GET /github/repos/example/foo/releases?per_page=100',
+            'GET /github/repos/example/foo/tags?per_page=100&page=2',
+            'GET /github/repos/example/foo/tags?per_page=100&page=3',
+        ])
+
+    def test_forge_anonymous(self):
+        # Without token, the GitHub API is used only if forge_github_anonymous is enabled
+        Config.set('forge_github_anonymous', False)
+        with mock.patch.object(PackageSearchUpdate, '_get_url_data', return_value=False) as get_url_data:
+            self._search()
+        self.assertEqual(self.server.requests, [])
+        get_url_data.assert_any_call('https://github.com/example/foo/releases/download/v1.0', 0)
+
+        self.server.routes = {
+            '/github/repos/example/foo/tags?per_page=100': TAGS,
+            '/github/repos/example/foo/releases?per_page=100': RELEASES,
+        }
+        Config.set('forge_github_token', 'secret')
+        PackageSearchUpdate('cross/foo', self.makefile_path).clear_cache()
+        with mock.patch.object(PackageSearchUpdate, '_get_url_data', return_value=False):
+            self.assertEqual(sorted(self._search().keys()), ['1.1'])
+
+    def test_forge_no_file(self):
+        self.server.routes = {
+            '/github/repos/example/foo/tags?per_page=100': TAGS,
+            '/github/repos/example/foo/releases?per_page=100': [],
+        }
+        with mock.patch.object(PackageSearchUpdate, '_get_url_data', return_value=False) as get_url_data:
+            self._search()
+
+        # Only the archives of the tags are found: the pages are crawled
+        get_url_data.assert_any_call('https://github.com/example/foo/releases/download/v1.0', 0)
+
+    def test_prefetch_contents(self):
+        self.server.routes = {
+            '/foo/1.1/': '<a href="foo-1.1.tar.xz">foo-1.1.tar.xz</a>',
+            '/foo/1.2/': '<a href="foo-1.2.tar.xz">foo-1.2.tar.xz</a>',
+        }
+        base_url = self.server.base_url + '/foo/'
+        urls = [base_url + '1.1/?sort=name', base_url + '1.2/']
+        search_update = PackageSearchUpdate('cross/foo', self.makefile_path)
+        search_update._prefetch_contents(urls)
+        for url in urls:
+            self.assertTrue(search_update._get_url_data(url, 0, False))
+
+        # The pages prefetched are the pages requested by _get_url_data
+        self.assertEqual(sorted(self.server.requests), ['GET /foo/1.1/', 'GET /foo/1.2/'])
+        self.assertEqual(search_update._prefetched, {})
+        self.assertEqual(sorted(search_update._urls_downloaded.keys()), [base_url + '1.1/', base_url + '1.2/'])
+
+    def _search_site(self, files):
+        """ Search the versions of a package whose files are listed in the page /foo of the server
+        """
+        Config.set('probe_enabled', True)
+        with open(self.makefile_path, 'w') as f:
+            f.write(MAKEFILE.replace('https://github.com/example/foo/releases/download/v$(PKG_VERS)',
+                                     self.server.base_url + '/foo'))
+        self.server.routes = {'/foo/' + name: b'data' for name in files}
+        self.server.routes['/foo'] = ''.join('<a href="foo/{0}">{0}</a>'.format(name) for name in files)
+
+        return self._search()
+
+    def test_get_next_versions(self):
+        self.assertEqual(PackageSearchUpdate.get_next_versions('1.2.3'), ['1.2.4', '1.3.0', '2.0.0'])
+        self.assertEqual(PackageSearchUpdate.get_next_versions('1_2_09'), ['1_2_10', '1_3_00', '2_0_00'])
+        self.assertEqual(PackageSearchUpdate.get_next_versions('1.0'), ['1.0.1', '1.1', '2.0'])
+        self.assertEqual(PackageSearchUpdate.get_next_versions('2-09'), ['2-09-1', '2-10', '3-00'])
+        self.assertEqual(PackageSearchUpdate.get_next_versions('1.2rc1'), [])
+        self.assertEqual(PackageSearchUpdate.get_next_versions('20180131'), [])
+
+    def test_probe_next_version(self):
+        versions = self._search_site(['foo-1.0.tar.xz', 'foo-1.1.tar.xz'])
+        self.assertEqual(sorted(versions.keys()), ['1.0', '1.1'])
+        # The files are found with HEAD requests, without crawling the pages
+        self.assertNotIn('GET /foo', self.server.requests)
+
+    def test_probe_patch_version(self):
+        versions = self._search_site(['foo-1.0.tar.xz', 'foo-1.0.1.tar.xz'])
+        self.assertEqual(sorted(versions.keys()), ['1.0', '1.0.1'])
+        self.assertNotIn('GET /foo', self.server.requests)
+
+    def test_probe_skipped_version(self):
+        # The next version is not a bump of the current version (1.0.1, 1.1 or 2.0): the pages are crawled
+        versions = self._search_site(['foo-1.0.tar.xz', 'foo-1.0.2.tar.xz'])
+        self.assertEqual(sorted(versions.keys()), ['1.0', '1.0.2'])
+        self.assertIn('HEAD /foo/foo-1.0.1.tar.xz', self.server.requests)
+        self.assertIn('HEAD /foo/foo-1.1.tar.xz', self.server.requests)
+        self.assertIn('GET /foo', self.server.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from multiprocessing import Pool
+
+from lib.config import Config
+from lib.output import Output
+from lib.job_queue import JobQueue
+from lib.packages_manager import PackagesManager
+
+MAKEFILE = """PKG_NAME = {name}
+PKG_VERS = {version}
+PKG_EXT = tar.gz
+PKG_DIST_NAME = $(PKG_NAME)-$(PKG_VERS).$(PKG_EXT)
+PKG_DIST_SITE = https://example.com/{name}
+DEPENDS = {depends}
+"""
+
+
+def search_update(manager, package):
+    """ Search run by a worker of the pool
+    """
+    informations = dict(manager._packages[package]['informations'])
+    version = {'cross/zlib': '1.2.13', 'cross/curl': '7.61.0'}[package]
+    informations['versions'] = {version: {'version': version, 'is_prerelease': False}}
+    return [package, informations, {'phases': {}, 'hosts': {}, 'counters': {}}, 0.1]
+
+
+class TestPackagesManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        configs = {
+            'spksrc_git_dir': os.path.join(self.tmp_dir, 'spksrc'),
+            'cache_dir': os.path.join(self.tmp_dir, 'cache'),
+            'versions_database': '',
+            'report_file': '',
+            'nb_jobs': 2,
+            'queue_batch_size': 1,
+            'schedule_longest_first': True,
+        }
+        self.values = {key: Config.get(key) for key in configs}
+        for key, value in configs.items():
+            Config.set(key, value)
+
+        os.makedirs(os.path.join(self.tmp_dir, 'spksrc', 'native'))
+        self._write('cross/zlib', '1.2.12')
+        self._write('cross/curl', '7.60.0', 'cross/zlib')
+        self._write('spk/curl', '7.60.0', 'cross/curl')
+
+        self.manager = PackagesManager()
+        self.manager.initialize([])
+
+    def tearDown(self):
+        for key, value in self.values.items():
+            Config.set(key, value)
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, package, version, depends=''):
+        path = os.path.join(self.tmp_dir, 'spksrc', package, 'Makefile')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(MAKEFILE.format(name=os.path.basename(package), version=version, depends=depends))
+
+    def test_reindex_packages(self):
+        self.assertEqual(self.manager.get_packages_requested(), ['cross/curl', 'cross/zlib'])
+        self.assertEqual(self.manager.get_parent_deps('cross/zlib'), {'package': 'cross/zlib', 'depends': [
+            {'package': 'cross/curl', 'depends': [{'package': 'spk/curl', 'depends': []}]}]})
+
+        self._write('cross/zlib', '1.2.13')
+        self._write('cross/openssl', '3.0.0')
+        self._write('cross/curl', '7.60.0', 'cross/openssl')
+        shutil.rmtree(os.path.join(self.tmp_dir, 'spksrc', 'spk', 'curl'))
+
+        changed = self.manager.reindex_packages(['cross/curl', 'cross/openssl', 'cross/zlib', 'spk/curl'])
+        # The spk/ packages are not searched
+        self.assertEqual(changed, ['cross/curl', 'cross/openssl', 'cross/zlib'])
+        self.assertEqual(self.manager.get_packages_requested(), ['cross/curl', 'cross/openssl', 'cross/zlib'])
+        self.assertEqual(self.manager._packages['cross/zlib']['informations']['version'], '1.2.13')
+        # The dependencies graph is built again
+        self.assertEqual(self.manager.get_parent_deps('cross/zlib'), {'package': 'cross/zlib', 'depends': []})
+        self.assertEqual(self.manager.get_parent_deps('cross/openssl'), {'package': 'cross/openssl', 'depends': [
+            {'package': 'cross/curl', 'depends': []}]})
+        self.assertFalse(self.manager.has_package('spk/curl', True))
+
+        # The packages list in cache is updated
+        manager = PackagesManager()
+        manager.initialize([])
+        self.assertEqual(manager.get_packages_requested(), ['cross/curl', 'cross/openssl', 'cross/zlib'])
+
+        shutil.rmtree(os.path.join(self.tmp_dir, 'spksrc', 'cross', 'openssl'))
+        self.assertEqual(self.manager.reindex_packages(['cross/openssl']), [])
+        self.assertEqual(self.manager.get_packages_requested(), ['cross/curl', 'cross/zlib'])
+
+    def test_check_update_packages_output(self):
+        path = os.path.join(self.tmp_dir, 'output.jsonl')
+        output = Output('jsonl', path)
+        written = []
+
+        def callback(package):
+            output.write(self.manager.get_next_versions([package])[0])
+            # The records are written while the results of the pool are received
+            with open(path) as f:
+                written.append(len(f.readlines()))
+
+        with mock.patch.object(PackagesManager, '_package_search_update', search_update):
+            self.manager.check_update_packages(callback=callback)
+        output.close()
+
+        self.assertEqual(written, [1, 2])
+        with open(path) as f:
+            records = sorted((json.loads(line) for line in f), key=lambda r: r['package'])
+        self.assertEqual(records, [
+            {'package': 'cross/curl', 'is_new': True, 'version': '7.60.0', 'next_version': '7.61.0'},
+            {'package': 'cross/zlib', 'is_new': True, 'version': '1.2.12', 'next_version': '1.2.13'},
+        ])
+
+    def test_run_worker(self):
+        queue = JobQueue(os.path.join(self.tmp_dir, 'queue.sqlite'))
+        searched = []
+        with mock.patch.object(PackagesManager, '_package_search_update', search_update), \
+                mock.patch('lib.packages_manager.Pool', wraps=Pool) as pool:
+            self.manager.run_worker(queue, searched.append)
+
+        # The pool is started once for all the batches claimed
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(sorted(searched), ['cross/curl', 'cross/zlib'])
+        self.assertEqual(queue.get_counts(), {'done': 2})
+        self.assertEqual(self.manager.get_next_versions(['cross/zlib'])[0]['next_version'], '1.2.13')
+        queue.close()
+
+    def test_order_packages(self):
+        hosts = {'a1': 'a', 'a2': 'a', 'a3': 'a', 'b1': 'b', 'b2': 'b', 'c1': 'c', 'new': 'c'}
+        durations = {'a1': 40.0, 'a2': 35.0, 'b1': 33.0, 'a3': 10.0, 'b2': 9.0, 'c1': 0.01}
+        searches = {package: {'duration': duration} for package, duration in durations.items()}
+        with mock.patch.object(self.manager, '_get_package_host', side_effect=hosts.get):
+            # Longest first by bands of durations (32-64s, 8-16s, less than 0.2s), the hosts alternate in a band
+            self.assertEqual(self.manager._order_packages(sorted(hosts), searches), ['new', 'a1', 'b1', 'a2', 'a3', 'b2', 'c1'])
+
+            Config.set('schedule_longest_first', False)
+            self.assertEqual(self.manager._order_packages(sorted(hosts), searches), ['a1', 'b1', 'c1', 'a2', 'b2', 'new', 'a3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+import multiprocessing
+
+from lib.profiler import Profiler
+
+
+def fibonacci(n):
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+def task(args):
+    directory, name = args
+    return Profiler(directory).run(name, fibonacci, 10)
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiler = Profiler(os.path.join(self.tmp_dir, 'profile'))
+        self.profiler.prepare()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _get_calls(self, stats, function):
+        return [value[1] for key, value in stats.stats.items() if key[2] == function][0]
+
+    def test_merge(self):
+        # The tasks run in two workers of a pool
+        with multiprocessing.Pool(2) as pool:
+            results = pool.map(task, [(self.profiler._directory, 'cross/zlib'), (self.profiler._directory, 'cross/curl')])
+        self.assertEqual(results, [55, 55])
+        self.assertEqual(len(self.profiler.get_stats_files()), 2)
+
+        output = os.path.join(self.tmp_dir, 'profile.pstats')
+        stats = self.profiler.merge(output)
+        self.assertTrue(os.path.exists(output))
+        # The calls of both tasks are counted: 177 calls of fibonacci(10) by task
+        self.assertEqual(self._get_calls(stats, 'fibonacci'), 2 * 177)
+
+        summary = io.StringIO()
+        with contextlib.redirect_stdout(summary):
+            Profiler.pprint_summary(stats, 5)
+        self.assertIn('fibonacci', summary.getvalue())
+
+    def test_prepare(self):
+        self.profiler.run('cross/zlib', fibonacci, 5)
+        self.assertEqual(len(self.profiler.get_stats_files()), 1)
+        self.profiler.prepare()
+        self.assertEqual(self.profiler.get_stats_files(), [])
+        self.assertIsNone(self.profiler.merge(os.path.join(self.tmp_dir, 'profile.pstats')))
+
+    def test_run_error(self):
+        # The stats are written when the task fails
+        with self.assertRaises(ZeroDivisionError):
+            self.profiler.run('cross/zlib', lambda: 1 / 0)
+        self.assertEqual(len(self.profiler.get_stats_files()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lib.metrics import Metrics
+from lib.prometheus_exporter import PrometheusExporter
+
+# Line of a sample in the text exposition format: name{label="value",...} value
+SAMPLE_REGEX = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*",?)*\})? (\S+)$')
+
+
+class TestPrometheusExporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'textfile', 'spksrc.prom')
+
+        self.metrics = Metrics('cross/zlib')
+        self.metrics.add_time('run', 12.5)
+        self.metrics.increment('packages_checked', 2)
+        self.metrics.increment('cache_hits', 3)
+        self.metrics.increment('cache_misses', 1)
+        self.metrics.increment('requests', 4, host='example.com')
+        self.metrics.increment('errors', host='example.com')
+        self.metrics.increment('requests', host='quote"d.org')
+        self.metrics.observe('search', 0.3, 'http')
+        self.metrics.observe('search', 4.0, 'http')
+        self.metrics.observe('search', 500.0, 'http')
+        self.metrics.observe('search', 1.0, 'git')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _parse(self, content):
+        """ Return the types of the metrics and the samples by name and labels, failing on a malformed line
+        """
+        types = {}
+        samples = {}
+        for line in content.splitlines():
+            if line.startswith('# TYPE '):
+                _, _, name, kind = line.split(' ')
+                types[name] = kind
+            elif line.startswith('# HELP '):
+                self.assertTrue(line.split(' ', 3)[3])
+            else:
+                match = SAMPLE_REGEX.match(line)
+                self.assertIsNotNone(match, line)
+                samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+
+        return types, samples
+
+    def test_write(self):
+        PrometheusExporter(self.metrics).write(self.path)
+        with open(self.path) as f:
+            content = f.read()
+        self.assertTrue(content.endswith('\n'))
+        types, samples = self._parse(content)
+
+        prefix = PrometheusExporter.prefix
+        self.assertEqual(types[prefix + 'run_duration_seconds'], 'gauge')
+        self.assertEqual(types[prefix + 'search_duration_seconds'], 'histogram')
+        self.assertEqual(samples[(prefix + 'run_duration_seconds', '')], 12.5)
+        self.assertEqual(samples[(prefix + 'packages_checked', '')], 2)
+        self.assertEqual(samples[(prefix + 'cache_hit_ratio', '')], 0.75)
+        self.assertEqual(samples[(prefix + 'host_requests', '{host="example.com"}')], 4)
+        self.assertEqual(samples[(prefix + 'host_requests', '{host="quote\\"d.org"}')], 1)
+        self.assertEqual(samples[(prefix + 'host_errors', '{host="example.com"}')], 1)
+
+        # The buckets are cumulative and the +Inf bucket is the count
+        name = prefix + 'search_duration_seconds'
+        buckets = [samples[(name + '_bucket', '{{method="http",le="{}"}}'.format(bound))] for bound in Metrics.buckets]
+        self.assertEqual(buckets, [0, 1, 1, 1, 2, 2, 2, 2, 2, 2])
+        self.assertEqual(samples[(name + '_bucket', '{method="http",le="+Inf"}')], 3)
+        self.assertEqual(samples[(name + '_count', '{method="http"}')], 3)
+        self.assertAlmostEqual(samples[(name + '_sum', '{method="http"}')], 504.3)
+        self.assertEqual(samples[(name + '_bucket', '{method="git",le="1.0"}')], 1)
+        self.assertEqual(samples[(name + '_bucket', '{method="git",le="0.5"}')], 0)
+
+    def test_write_replace(self):
+        PrometheusExporter(Metrics()).write(self.path)
+        PrometheusExporter(self.metrics).write(self.path)
+        # The file is replaced and no temporary file is left
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['spksrc.prom'])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+        with open(self.path) as f:
+            self.assertIn('packages_checked 2\n', f.read())
+
+        # On an error, the previous file is kept
+        with mock.patch.object(PrometheusExporter, 'generate', side_effect=ValueError('error')):
+            with self.assertRaises(ValueError):
+                PrometheusExporter(Metrics()).write(self.path)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['spksrc.prom'])
+        with open(self.path) as f:
+            self.assertIn('packages_checked 2\n', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import unittest
+from unittest import mock
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+from lib.config import Config
+from lib.server import Server
+
+
+class FakePackagesManager(object):
+    """ Packages manager answering from a dict of versions: searches wait for the event 'release' when it is set
+    """
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.searched = set()
+        self.searches = []
+        self.search_started = threading.Event()
+        self.release = None
+        self.initialize_args = None
+
+    def initialize(self, packages_requested, use_cache=True):
+        self.initialize_args = (packages_requested, use_cache)
+
+    def get_packages_requested(self):
+        return sorted(self.versions.keys())
+
+    def has_package(self, package, spk=False):
+        return package in self.versions or spk and package.startswith('spk/')
+
+    def is_searched(self, package):
+        return package in self.searched
+
+    def check_update_packages(self, packages_requested=None, callback=None):
+        packages_requested = packages_requested or self.get_packages_requested()
+        self.searches.append(list(packages_requested))
+        self.search_started.set()
+        if self.release:
+            self.release.wait(5)
+        self.searched.update(packages_requested)
+
+    def get_next_versions(self, packages_requested=None):
+        return {package: self.versions[package] for package in packages_requested}
+
+    def get_all_new_versions(self, packages_requested=None):
+        return {package: [self.versions[package]] for package in packages_requested}
+
+    def get_deps(self, package):
+        return {package: ['cross/zlib']}
+
+    def get_parent_deps(self, package):
+        return {package: ['spk/ffmpeg']}
+
+    def get_unused(self):
+        return ['cross/unused']
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.manager = FakePackagesManager({'cross/zlib': '1.2.12', 'cross/curl': '7.60.0'})
+        self.server = Server(self.manager)
+
+    def test_search(self):
+        self.assertEqual(self.server.api_search({'packages': 'cross/zlib'}), {'cross/zlib': '1.2.12'})
+        self.assertEqual(self.server.api_search_all({'packages': 'cross/zlib,cross/curl'}),
+                         {'cross/zlib': ['1.2.12'], 'cross/curl': ['7.60.0']})
+        # Only the packages not searched yet are searched, unless force=1
+        self.assertEqual(self.manager.searches, [['cross/zlib'], ['cross/curl']])
+        self.server.api_search({'packages': 'cross/zlib', 'force': '1'})
+        self.assertEqual(self.manager.searches[-1], ['cross/zlib'])
+        self.server.api_search({})
+        self.assertEqual(len(self.manager.searches), 3)
+
+        with self.assertRaises(ValueError):
+            self.server.api_search({'packages': 'cross/unknown'})
+
+    def test_deps(self):
+        self.assertEqual(self.server.api_deps({'packages': 'spk/ffmpeg'}), [{'spk/ffmpeg': ['cross/zlib']}])
+        self.assertEqual(self.server.api_parent_deps({'packages': 'cross/zlib'}), [{'cross/zlib': ['spk/ffmpeg']}])
+        self.assertEqual(self.server.api_unused({}), ['cross/unused'])
+        with self.assertRaises(ValueError):
+            self.server.api_deps({})
+
+    def test_status_during_search(self):
+        self.manager.release = threading.Event()
+        search = threading.Thread(target=self.server.api_search, args=({},))
+        search.start()
+        try:
+            self.assertTrue(self.manager.search_started.wait(5))
+            # The other requests are not blocked by the search
+            results = []
+            status = threading.Thread(target=lambda: results.append(self.server.api_status({})))
+            status.start()
+            status.join(2)
+            self.assertFalse(status.is_alive())
+            self.assertEqual(results[0]['packages'], 2)
+            self.assertEqual(self.server.api_deps({'packages': 'cross/zlib'}), [{'cross/zlib': ['cross/zlib']}])
+        finally:
+            self.manager.release.set()
+            search.join(5)
+
+    def test_refresh(self):
+        refreshed = FakePackagesManager({'cross/zlib': '1.2.13'})
+        with mock.patch('lib.server.PackagesManager', return_value=refreshed):
+            self.server.refresh()
+        # The Makefiles are parsed again and the new manager answers the queries
+        self.assertEqual(refreshed.initialize_args, ([], False))
+        self.assertEqual(refreshed.searches, [['cross/zlib']])
+        self.assertEqual(self.server.api_search({'packages': 'cross/zlib'}), {'cross/zlib': '1.2.13'})
+        self.assertIsNotNone(self.server.api_status({})['last_refresh'])
+
+    def test_refresh_during_search(self):
+        self.manager.release = threading.Event()
+        refreshed = FakePackagesManager({'cross/zlib': '1.2.13'})
+        search = threading.Thread(target=self.server.api_search, args=({},))
+        search.start()
+        try:
+            self.assertTrue(self.manager.search_started.wait(5))
+            with mock.patch('lib.server.PackagesManager', return_value=refreshed):
+                refresh = threading.Thread(target=self.server.refresh)
+                refresh.start()
+                # The search of the refresh waits for the end of the search of the query
+                refresh.join(0.5)
+                self.assertTrue(refresh.is_alive())
+                self.assertEqual(refreshed.searches, [])
+                self.manager.release.set()
+                refresh.join(5)
+        finally:
+            self.manager.release.set()
+            search.join(5)
+        self.assertEqual(refreshed.searches, [['cross/zlib']])
+
+    def test_http(self):
+        values = {key: Config.get(key) for key in ('serve_address', 'serve_port', 'serve_refresh_interval')}
+        Config.set('serve_address', '127.0.0.1')
+        Config.set('serve_port', 0)
+        Config.set('serve_refresh_interval', 0)
+        try:
+            self.server.start()
+            thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            thread.start()
+            url = 'http://127.0.0.1:{}/'.format(self.server.get_address()[1])
+
+            with urlopen(url + 'search?packages=cross/curl') as response:
+                self.assertEqual(json.loads(response.read().decode('utf-8')), {'cross/curl': '7.60.0'})
+            with self.assertRaises(HTTPError) as context:
+                urlopen(url + 'search?packages=cross/unknown')
+            self.assertEqual(context.exception.code, 400)
+            with self.assertRaises(HTTPError) as context:
+                urlopen(url + 'unknown')
+            self.assertEqual(context.exception.code, 404)
+
+            self.server.shutdown()
+            thread.join(5)
+        finally:
+            for key, value in values.items():
+                Config.set(key, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
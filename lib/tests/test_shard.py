@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lib.shard import Shard
+
+PACKAGES = ['cross/package{:03d}'.format(i) for i in range(300)]
+
+
+class TestShard(unittest.TestCase):
+    def test_parse(self):
+        shard = Shard.parse(' 2/4 ')
+        self.assertEqual((shard.index, shard.count), (2, 4))
+        self.assertEqual(str(shard), '2/4')
+        for value in ['0/4', '5/4', '1/0', '2', 'a/b', '-1/2']:
+            with self.assertRaises(ValueError):
+                Shard.parse(value)
+
+    def test_select(self):
+        shards = [Shard(i, 4).select(PACKAGES) for i in range(1, 5)]
+        # Each package is in one shard, the shards have close sizes
+        self.assertEqual(sorted(sum(shards, [])), PACKAGES)
+        for packages in shards:
+            self.assertGreater(len(packages), 50)
+
+        # A package stays in its shard when other packages are added
+        self.assertEqual(Shard(1, 4).select(PACKAGES + ['cross/new'])[0:len(shards[0])], shards[0])
+
+    def test_select_groups(self):
+        depends = {'cross/package001': ['cross/package002'], 'cross/package003': ['cross/package002'],
+                   'cross/package004': ['native/tool']}
+        groups = Shard.get_groups(PACKAGES, lambda p: depends.get(p, []))
+        self.assertEqual(groups['cross/package003'], 'cross/package001')
+        self.assertEqual(groups['cross/package002'], 'cross/package001')
+        self.assertEqual(groups['cross/package004'], 'cross/package004')
+
+        shards = [Shard(i, 3).select(PACKAGES, lambda p: depends.get(p, [])) for i in range(1, 4)]
+        self.assertEqual(sorted(sum(shards, [])), PACKAGES)
+        shard = next(s for s in shards if 'cross/package001' in s)
+        self.assertIn('cross/package002', shard)
+        self.assertIn('cross/package003', shard)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import os
+import ftplib
+import shutil
+import tempfile
+import unittest
+
+import requests
+from lib.tests.http_server import QuietHandler, HttpServer
+from lib.transport import Transport, LiveTransport, RecordTransport, ReplayTransport, TransportArchive
+
+PAGES = {
+    '/zlib/': ('text/html; charset=iso-8859-1', '<a href="zlib-1.2.11.tar.gz">zlib-1.2.11.tar.gz</a> \xa9 Jean-loup'.encode('latin-1')),
+    '/api.json': ('application/json', b'{"releases": ["1.0"]}'),
+}
+
+
+class PagesHandler(QuietHandler):
+    def _answer(self, body=True):
+        self.server.requests.append((self.command, self.path))
+        if self.path == '/old':
+            self.send_response(301)
+            self.send_header('Location', '/zlib/')
+            self.end_headers()
+            return
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+
+        content_type, content = PAGES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self._answer()
+
+    def do_HEAD(self):
+        self._answer(False)
+
+
+class FakeFtpPool(object):
+    def list(self, host, path, port=None, user=None, password=None):
+        if path == '/missing':
+            raise ftplib.error_perm('550 No such directory')
+        return [('zlib-1.2.11', True), ('zlib-1.2.11.tar.gz', False)]
+
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = HttpServer(PagesHandler, requests=[])
+        self.base_url = self.server.base_url
+        self.tmp_dir = tempfile.mkdtemp()
+        self.archive_path = os.path.join(self.tmp_dir, 'archive', 'responses.sqlite')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def _record(self):
+        transport = Transport.create('record', requests.Session(), FakeFtpPool(), self.archive_path)
+        self.assertIsInstance(transport, RecordTransport)
+        responses = {
+            'page': transport.get(self.base_url + '/zlib/'),
+            'redirect': transport.get(self.base_url + '/old'),
+            'json': transport.get(self.base_url + '/api.json', {'Accept': 'application/json'}),
+            'not_found': transport.get(self.base_url + '/missing'),
+            'head': transport.head(self.base_url + '/zlib/'),
+            'ftp': transport.list_ftp('ftp.example.com', '/pub'),
+        }
+        with self.assertRaises(ftplib.Error):
+            transport.list_ftp('ftp.example.com', '/missing')
+        transport.close()
+
+        return responses
+
+    def test_replay(self):
+        recorded = self._record()
+        nb_requests = len(self.server.requests)
+
+        transport = Transport.create('replay', None, None, self.archive_path)
+        self.assertIsInstance(transport, ReplayTransport)
+        for name, path in [('page', '/zlib/'), ('redirect', '/old'), ('json', '/api.json'), ('not_found', '/missing')]:
+            replayed = transport.get(self.base_url + path)
+            self.assertEqual(replayed.status_code, recorded[name].status_code)
+            self.assertEqual(replayed.url, recorded[name].url)
+            self.assertEqual(replayed.content, recorded[name].content)
+            self.assertEqual(replayed.text, recorded[name].text)
+            self.assertEqual(len(replayed.history), len(recorded[name].history))
+
+        self.assertEqual(transport.get(self.base_url + '/api.json').json(), {'releases': ['1.0']})
+        self.assertEqual(transport.head(self.base_url + '/zlib/').headers['content-type'], 'text/html; charset=iso-8859-1')
+        self.assertEqual(transport.list_ftp('ftp.example.com', '/pub'), recorded['ftp'])
+        with self.assertRaises(ftplib.Error):
+            transport.list_ftp('ftp.example.com', '/missing')
+        # The servers are not requested
+        self.assertEqual(len(self.server.requests), nb_requests)
+
+    def test_replay_not_recorded(self):
+        transport = Transport.create('replay', None, None, self.archive_path)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            transport.get(self.base_url + '/zlib/')
+        with self.assertRaises(ftplib.Error):
+            transport.list_ftp('ftp.example.com', '/pub')
+        self.assertEqual(self.server.requests, [])
+
+    def test_record_error(self):
+        # Nothing listens on the port of a closed server
+        sock_server = HttpServer(PagesHandler, requests=[])
+        url = sock_server.base_url + '/zlib/'
+        sock_server.stop()
+
+        transport = Transport.create('record', requests.Session(), None, self.archive_path)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            transport.get(url)
+
+        transport = Transport.create('replay', None, None, self.archive_path)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            transport.get(url)
+        self.assertEqual(TransportArchive(self.archive_path).load('GET', url)[0], TransportArchive.status_error)
+
+    def test_create(self):
+        self.assertIsInstance(Transport.create('live', requests.Session(), None, self.archive_path), LiveTransport)
+        self.assertFalse(os.path.exists(self.archive_path))
+        with self.assertRaises(ValueError):
+            Transport.create('offline', None, None, self.archive_path)
+
+    def test_abstract(self):
+        class GetTransport(Transport):
+            def get(self, url, headers=None):
+                return None
+
+        # A transport implements all the requests
+        with self.assertRaises(TypeError):
+            GetTransport()
+        with self.assertRaises(TypeError):
+            Transport()
+
+
+if __name__ == '__main__':
+    unittest.main()
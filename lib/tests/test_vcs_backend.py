@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+import git as git
+from lib.vcs_backend import VcsBackend, VcsError
+
+
+def commit(repo, filename):
+    with open(os.path.join(repo.working_tree_dir, filename), 'w') as f:
+        f.write(filename)
+    repo.index.add([filename])
+    return str(repo.index.commit('Add ' + filename))
+
+
+class TestVcsBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.backend = VcsBackend(max_parallel=2, timeout=30)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run(self):
+        self.assertEqual(self.backend.run_sync(self.backend.run(sys.executable, '-c', 'print("ok")')), 'ok\n')
+        self.assertEqual(self.backend.run_sync(self.backend.run('pwd', cwd=self.tmp_dir)).strip(), os.path.realpath(self.tmp_dir))
+
+    def test_error(self):
+        with self.assertRaises(VcsError) as context:
+            self.backend.run_sync(self.backend.git('log', cwd=self.tmp_dir))
+        self.assertEqual(context.exception.returncode, 128)
+        self.assertIn('not a git repository', context.exception.stderr)
+
+        with self.assertRaises(VcsError):
+            self.backend.run_sync(self.backend.run(os.path.join(self.tmp_dir, 'missing')))
+
+    def test_timeout(self):
+        backend = VcsBackend(timeout=0.2)
+        start = time.perf_counter()
+        with self.assertRaises(VcsError) as context:
+            backend.run_sync(backend.run(sys.executable, '-c', 'import time; time.sleep(10)'))
+        self.assertIn('Timeout', str(context.exception))
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_max_parallel(self):
+        # 6 commands of 0.3s: 3 rounds with 2 commands at the same time
+        results = []
+        start = time.perf_counter()
+        self.backend.run_all([self.backend.run(sys.executable, '-c', 'import time; time.sleep(0.3)') for _ in range(6)], results.append)
+        duration = time.perf_counter() - start
+        self.assertEqual(len(results), 6)
+        self.assertGreaterEqual(duration, 0.9)
+        self.assertLess(duration, 1.8)
+
+        # A second event loop has its own semaphore
+        self.assertEqual(self.backend.run_sync(self.backend.run(sys.executable, '-c', 'print(1)')), '1\n')
+
+    def test_run_all_iterator(self):
+        def iterator():
+            for i in range(3):
+                time.sleep(0.1)
+                yield i
+
+        # The items of the blocking iterator are passed to the callback while the commands run
+        results = []
+        self.backend.run_all([self.backend.run(sys.executable, '-c', 'import time; time.sleep(1); print("done")')], results.append, iterator())
+        self.assertEqual(results, [0, 1, 2, 'done\n'])
+
+    def test_git_new_versions(self):
+        repo = git.Repo.init(os.path.join(self.tmp_dir, 'upstream'), initial_branch='main')
+        with repo.config_writer() as config:
+            config.set_value('user', 'name', 'Test')
+            config.set_value('user', 'email', 'test@example.com')
+        first = commit(repo, 'a')
+        second = commit(repo, 'b')
+        third = commit(repo, 'c')
+        mirror = os.path.join(self.tmp_dir, 'mirror.git')
+        git.Repo.clone_from(repo.working_tree_dir, mirror, bare=True)
+
+        # Without tags: the new commits
+        versions = self.backend.run_sync(self.backend.git_new_versions(mirror, first))
+        self.assertEqual(list(versions.items()), [(third, {'hash': third}), (second, {'hash': second})])
+        self.assertEqual(list(self.backend.run_sync(self.backend.git_new_versions(mirror, 'main'))), [])
+
+        # With tags: the new tags, an annotated tag is peeled to its commit
+        repo.create_tag('v1.0', ref=first)
+        repo.create_tag('v1.1', ref=second, message='Release 1.1')
+        repo.create_tag('v1.2', ref=third)
+        repo.create_tag('latest', ref=third)
+        git.Repo(mirror).git.fetch(repo.working_tree_dir, '+refs/tags/*:refs/tags/*')
+        versions = self.backend.run_sync(self.backend.git_new_versions(mirror, first))
+        self.assertEqual(list(versions.items()), [('latest', {'hash': 'latest'}), ('v1.1', {'hash': 'v1.1'})])
+
+        with self.assertRaises(VcsError):
+            self.backend.run_sync(self.backend.git_new_versions(mirror, 'unknown'))
+
+
+if __name__ == '__main__':
+    unittest.main()
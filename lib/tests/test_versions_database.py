@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lib.versions_database import VersionsDatabase
+
+
+class TestVersionsDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.database = VersionsDatabase(os.path.join(self.tmp_dir, 'versions.sqlite'))
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _run(self, now, durations, versions):
+        run_id = self.database.start_run(now)
+        for package, duration in durations.items():
+            self.database.add_versions(run_id, package, {v: {} for v in versions.get(package, [])}, now)
+            self.database.add_search(run_id, package, duration, now)
+        self.database.finish_run(run_id, now)
+
+    def test_searches(self):
+        self._run(1000, {'cross/zlib': 10.0, 'cross/curl': 2.0}, {'cross/zlib': ['1.2.11']})
+        searches = self.database.get_searches()
+        self.assertEqual(searches['cross/zlib']['duration'], 10.0)
+        self.assertEqual(searches['cross/zlib']['last_changed'], 1000)
+        self.assertIsNone(searches['cross/curl']['last_changed'])
+
+        # Expected duration: moving average, changed only when a version is found for the first time
+        self._run(2000, {'cross/zlib': 20.0, 'cross/curl': 4.0}, {'cross/zlib': ['1.2.11'], 'cross/curl': ['7.60.0']})
+        searches = self.database.get_searches()
+        self.assertEqual(searches['cross/zlib']['duration'], 15.0)
+        self.assertEqual(searches['cross/zlib']['last_duration'], 20.0)
+        self.assertEqual(searches['cross/zlib']['searches'], 2)
+        self.assertEqual(searches['cross/zlib']['last_searched'], 2000)
+        self.assertEqual(searches['cross/zlib']['last_changed'], 1000)
+        self.assertEqual(searches['cross/curl']['duration'], 3.0)
+        self.assertEqual(searches['cross/curl']['last_changed'], 2000)
+        # The first search is kept for the packages without version
+        self.assertEqual(searches['cross/curl']['first_searched'], 1000)
+        self.assertEqual(searches['cross/zlib']['first_searched'], 1000)
+
+    def test_add_versions(self):
+        run_id = self.database.start_run(1000)
+        self.database.add_versions(run_id, 'cross/zlib', {
+            '1.2.12': {'is_prerelease': False, 'urls': [{'full': 'https://zlib.net/zlib-1.2.12.tar.gz'}]},
+            '1.3-rc1': {'is_prerelease': True},
+        }, 1000)
+        self.database.finish_run(run_id, 1000)
+
+        # The first discovery is kept, the last one and the URLs are updated
+        run_id = self.database.start_run(2000)
+        self.database.add_versions(run_id, 'cross/zlib', {
+            '1.2.12': {'urls': [{'full': 'https://zlib.net/fossils/zlib-1.2.12.tar.gz'}]},
+            '1.2.13': {},
+        }, 2000)
+        self.database.finish_run(run_id, 2000)
+
+        versions = {v['version']: v for v in self.database.get_new_versions(since=0)}
+        self.assertEqual(sorted(versions.keys()), ['1.2.12', '1.2.13', '1.3-rc1'])
+        self.assertEqual((versions['1.2.12']['first_seen'], versions['1.2.12']['first_run']), (1000, 1))
+        self.assertEqual((versions['1.2.12']['last_seen'], versions['1.2.12']['last_run']), (2000, 2))
+        self.assertEqual(versions['1.2.12']['urls'], ['https://zlib.net/fossils/zlib-1.2.12.tar.gz'])
+        self.assertFalse(versions['1.2.12']['is_prerelease'])
+        self.assertTrue(versions['1.3-rc1']['is_prerelease'])
+        self.assertEqual(versions['1.3-rc1']['last_run'], 1)
+
+    def test_get_new_versions(self):
+        self._run(1000, {'cross/zlib': 1.0, 'cross/curl': 1.0}, {'cross/zlib': ['1.2.12'], 'cross/curl': ['7.60.0']})
+        self._run(2000, {'cross/zlib': 1.0, 'cross/curl': 1.0}, {'cross/zlib': ['1.2.12', '1.2.13'], 'cross/curl': ['7.60.0', '7.61.0']})
+        # A run not finished is ignored
+        run_id = self.database.start_run(3000)
+        self.database.add_versions(run_id, 'cross/zlib', {'1.3': {}}, 3000)
+
+        def get_versions(records):
+            return [(record['package'], record['version']) for record in records]
+
+        # Versions of the last run by default
+        self.assertEqual(get_versions(self.database.get_new_versions()), [('cross/curl', '7.61.0'), ('cross/zlib', '1.2.13')])
+        self.assertEqual(get_versions(self.database.get_new_versions(run_id=1)), [('cross/curl', '7.60.0'), ('cross/zlib', '1.2.12')])
+        self.assertEqual(get_versions(self.database.get_new_versions(since=2000)),
+                         [('cross/curl', '7.61.0'), ('cross/zlib', '1.2.13'), ('cross/zlib', '1.3')])
+
+    def test_set_package(self):
+        self._run(1000, {'cross/zlib': 1.0}, {'cross/zlib': ['1.2.12', '1.2.13']})
+        self.database.set_package('cross/zlib', '1.2.12', '1.2.13', 3000)
+        self.database.set_package('cross/curl', '7.60.0', None, 3000)
+        self.database.set_package('cross/openssl', '3.0.0', '3.0.0', 3000)
+        # Outdated since the first discovery of the next version
+        self.assertEqual([p['package'] for p in self.database.get_outdated(0, 3000)], ['cross/zlib'])
+        self.assertEqual(self.database.get_outdated(0, 3000)[0]['outdated_since'], 1000)
+
+        # A new next version doesn't change the date while the current version is the same
+        self._run(5000, {'cross/zlib': 1.0}, {'cross/zlib': ['1.2.14']})
+        self.database.set_package('cross/zlib', '1.2.12', '1.2.14', 5000)
+        self.assertEqual(self.database.get_outdated(0, 5000)[0]['outdated_since'], 1000)
+        self.assertEqual(self.database.get_outdated(0, 5000)[0]['next_version'], '1.2.14')
+
+        # The package is updated but not to the last version: outdated since the discovery of this version
+        self.database.set_package('cross/zlib', '1.2.13', '1.2.14', 6000)
+        self.assertEqual(self.database.get_outdated(0, 6000)[0]['outdated_since'], 5000)
+        # Next version never searched
+        self.database.set_package('cross/curl', '7.60.0', '7.61.0', 6000)
+        self.assertEqual(self.database.get_outdated(0, 6000)[1]['outdated_since'], 6000)
+
+        # Up to date
+        self.database.set_package('cross/zlib', '1.2.14', '1.2.14', 7000)
+        self.assertEqual([p['package'] for p in self.database.get_outdated(0, 7000)], ['cross/curl'])
+
+    def test_get_outdated(self):
+        self.database.set_package('cross/zlib', '1.2.12', '1.2.13', 1000)
+        self.database.set_package('cross/curl', '7.60.0', '7.61.0', 1000 + 86400)
+        self.assertEqual([p['package'] for p in self.database.get_outdated(1, 1000 + 86400)], ['cross/zlib'])
+        self.assertEqual([p['package'] for p in self.database.get_outdated(1, 1000 + 2 * 86400)], ['cross/zlib', 'cross/curl'])
+        self.assertEqual(self.database.get_outdated(2, 1000 + 86400), [])
+
+    def test_concurrent_runs(self):
+        # The writes of a run don't lock the database until its end
+        run_id = self.database.start_run(1000)
+        self.database.add_versions(run_id, 'cross/zlib', {'1.2.12': {}}, 1000)
+        self.database.set_package('cross/zlib', '1.2.12', '1.2.12', 1000)
+        self.database.add_search(run_id, 'cross/zlib', 1.0, 1000)
+        self.database.commit()
+
+        with mock.patch.object(VersionsDatabase, 'timeout', 0.1):
+            database = VersionsDatabase(os.path.join(self.tmp_dir, 'versions.sqlite'))
+        try:
+            other_run_id = database.start_run(1100)
+            self.assertNotEqual(other_run_id, run_id)
+            self.assertEqual(list(database.get_searches().keys()), ['cross/zlib'])
+            database.finish_run(other_run_id, 1200)
+        finally:
+            database.close()
+        self.database.finish_run(run_id, 1300)
+        self.assertEqual(self.database.get_last_run(), other_run_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
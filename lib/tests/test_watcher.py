@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from lib.watcher import Watcher
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp_dir, 'native'))
+        self._write('cross/zlib')
+        self._write('cross/curl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, package, mtime=None):
+        path = os.path.join(self.tmp_dir, package, 'Makefile')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('PKG_NAME = {}\n'.format(os.path.basename(package)))
+        if mtime:
+            os.utime(path, ns=(mtime, mtime))
+
+    def test_polling(self):
+        watcher = Watcher(self.tmp_dir, ['cross', 'native', 'spk'], interval=0.01, debounce=0.01, use_inotify=False)
+        self._write('cross/zlib', 10 ** 9)
+        self._write('native/cmake')
+        shutil.rmtree(os.path.join(self.tmp_dir, 'cross', 'curl'))
+
+        self.assertEqual(watcher.wait_changes(), ['cross/curl', 'cross/zlib', 'native/cmake'])
+
+    def test_debounce(self):
+        watcher = Watcher(self.tmp_dir, ['cross'], use_inotify=False)
+        # Each wait is followed by a step of the burst: the changes are returned once a wait finds no change
+        steps = [lambda: self._write('cross/zlib', 10 ** 9), lambda: self._write('cross/openssl'), lambda: None]
+
+        def wait_event(timeout):
+            steps.pop(0)()
+            return True
+
+        with mock.patch.object(watcher, '_wait_event', side_effect=wait_event) as mock_wait_event:
+            self.assertEqual(watcher.wait_changes(), ['cross/openssl', 'cross/zlib'])
+        self.assertEqual([c[0][0] for c in mock_wait_event.call_args_list], [2.0, 1.0, 1.0])
+        self.assertEqual(steps, [])
+
+    def test_inotify_timeout(self):
+        inotify = mock.Mock()
+        # No event is received: the Makefile is created before its new directory is watched
+        inotify.read.side_effect = [[]] * 5
+        with mock.patch('lib.watcher.INotify', return_value=inotify), mock.patch('lib.watcher.flags', create=True):
+            watcher = Watcher(self.tmp_dir, ['cross'], interval=0.01, debounce=0.01)
+            self._write('cross/openssl')
+            self.assertEqual(watcher.wait_changes(), ['cross/openssl'])
+
+        inotify.read.assert_any_call(timeout=10)
+        watched = [c[0][0] for c in inotify.add_watch.call_args_list]
+        self.assertIn(os.path.join(self.tmp_dir, 'cross', 'openssl'), watched)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import os
+import abc
+import json
+import zlib
+import ftplib
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlparse, unquote
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Response(object):
+    """ Response replayed from an archive, with the attributes of requests.Response used by the searches
+    """
+
+    def __init__(self, url, status_code, headers, content, encoding=None, history=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        # URLs of the redirections
+        self.history = history or []
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    @property
+    def links(self):
+        """ Links of the header Link by relation (e.g. the next page of an API)
+        """
+        result = {}
+        if self.headers.get('link'):
+            for link in requests.utils.parse_header_links(self.headers['link']):
+                result[link.get('rel') or link.get('url')] = link
+        return result
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Transport(abc.ABC):
+    """ Send the requests of the searches: the transport of a mode can record or replay the responses
+    """
+
+    mode = None
+
+    @abc.abstractmethod
+    def get(self, url, headers=None):
+        """ Return the response of a GET request (redirections followed)
+        """
+
+    @abc.abstractmethod
+    def head(self, url, timeout=None):
+        """ Return the response of a HEAD request (redirections followed)
+        """
+
+    @abc.abstractmethod
+    def list_ftp(self, host, path, port=None, user=None, password=None):
+        """ Return the entries (name, is_dir) of a FTP directory
+        """
+
+    @abc.abstractmethod
+    def retrieve(self, url, callback, chunk_size=65536, timeout=None):
+        """ Download a file (HTTP or FTP): callback is called with each chunk of data
+        An error of the server raises requests.exceptions.HTTPError (HTTP) or ftplib.Error (FTP)
+        """
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def create(mode, session, ftp_pool, archive_path):
+        """ Return the transport of a mode: live, record or replay
+        """
+        if mode == 'record':
+            return RecordTransport(session, ftp_pool, TransportArchive(archive_path))
+        if mode == 'replay':
+            return ReplayTransport(TransportArchive(archive_path))
+        if mode != 'live':
+            raise ValueError("Unknown transport mode: " + mode)
+
+        return LiveTransport(session, ftp_pool)
+
+
+class LiveTransport(Transport):
+    """ Send the requests to the servers: HTTP with a session of requests, FTP with a pool of connections
+    """
+
+    mode = 'live'
+
+    def __init__(self, session, ftp_pool):
+        self._session = session
+        self._ftp_pool = ftp_pool
+
+    def get(self, url, headers=None):
+        return self._session.get(url, allow_redirects=True, headers=headers)
+
+    def head(self, url, timeout=None):
+        return self._session.head(url, allow_redirects=True, timeout=timeout)
+
+    def list_ftp(self, host, path, port=None, user=None, password=None):
+        return self._ftp_pool.list(host, path, port, user, password)
+
+    def retrieve(self, url, callback, chunk_size=65536, timeout=None):
+        url_p = urlparse(url)
+        if url_p.scheme == 'ftp':
+            self._ftp_pool.retrieve(url_p.hostname, unquote(url_p.path), callback, url_p.port, url_p.username, url_p.password, chunk_size)
+            return
+
+        with self._session.get(url, stream=True, allow_redirects=True, timeout=timeout) as req:
+            req.raise_for_status()
+            for chunk in req.iter_content(chunk_size=chunk_size):
+                callback(chunk)
+
+
+class TransportArchive(object):
+    """ Responses saved in a SQLite file, the bodies are compressed with zlib.
+    The archive can be written by several processes: each one opens its own connection.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            method TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            final_url TEXT NOT NULL,
+            headers TEXT NOT NULL,
+            encoding TEXT,
+            history TEXT NOT NULL,
+            body BLOB NOT NULL,
+            PRIMARY KEY (method, url)
+        );
+    """
+
+    # Status of a request which raised an error (the body is the message)
+    status_error = 0
+
+    def __init__(self, path):
+        self._path = path
+        self._connection = None
+        self._connection_pid = None
+        self._responses = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        if self._connection is None or self._connection_pid != os.getpid():
+            parent_dir = os.path.dirname(os.path.abspath(self._path))
+            if not os.path.exists(parent_dir):
+                os.makedirs(parent_dir)
+            self._connection = sqlite3.connect(self._path, timeout=60, check_same_thread=False)
+            self._connection.executescript(TransportArchive.schema)
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+    def save(self, method, url, status, final_url='', headers=None, encoding=None, history=None, body=b''):
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+                method, url, status, final_url or url, json.dumps(dict(headers or {})), encoding,
+                json.dumps(history or []), zlib.compress(body)))
+            connection.commit()
+
+    def load(self, method, url):
+        """ Return the row (status, final_url, headers, encoding, history, body) of a request or None if it was not recorded
+        All the responses are read in memory at the first call
+        """
+        with self._lock:
+            if self._responses is None:
+                self._responses = {}
+                if os.path.exists(self._path):
+                    for row in self._get_connection().execute("SELECT * FROM responses"):
+                        self._responses[(row[0], row[1])] = row[2:]
+
+        row = self._responses.get((method, url))
+        if row is None:
+            return None
+
+        status, final_url, headers, encoding, history, body = row
+        return status, final_url, json.loads(headers), encoding, json.loads(history), zlib.decompress(body)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+class RecordTransport(LiveTransport):
+    """ Send the requests to the servers and save the responses (and the errors) in an archive
+    The files downloaded by retrieve() are not saved
+    """
+
+    mode = 'record'
+
+    def __init__(self, session, ftp_pool, archive):
+        super().__init__(session, ftp_pool)
+        self._archive = archive
+
+    def _request(self, method, func, url):
+        try:
+            req = func()
+        except requests.exceptions.RequestException as e:
+            self._archive.save(method, url, TransportArchive.status_error, body=str(e).encode('utf-8'))
+            raise
+
+        self._archive.save(method, url, req.status_code, req.url, req.headers, req.encoding or req.apparent_encoding,
+                           [r.url for r in req.history], req.content if method == 'GET' else b'')
+        return req
+
+    def get(self, url, headers=None):
+        return self._request('GET', lambda: super(RecordTransport, self).get(url, headers), url)
+
+    def head(self, url, timeout=None):
+        return self._request('HEAD', lambda: super(RecordTransport, self).head(url, timeout), url)
+
+    def list_ftp(self, host, path, port=None, user=None, password=None):
+        key = 'ftp://{}:{}{}'.format(host, port or 21, path)
+        try:
+            entries = super().list_ftp(host, path, port, user, password)
+        except (ftplib.Error, OSError, EOFError) as e:
+            self._archive.save('LIST', key, TransportArchive.status_error, body=str(e).encode('utf-8'))
+            raise
+
+        self._archive.save('LIST', key, 226, body=json.dumps(entries).encode('utf-8'))
+        return entries
+
+    def close(self):
+        self._archive.close()
+
+
+class ReplayTransport(Transport):
+    """ Serve the responses saved in an archive without any request to the servers
+    A request which was not recorded fails like a server not found
+    """
+
+    mode = 'replay'
+
+    def __init__(self, archive):
+        self._archive = archive
+
+    def _load(self, method, url):
+        row = self._archive.load(method, url)
+        if row is None:
+            _LOGGER.debug("Not recorded: %s %s", method, url)
+            raise requests.exceptions.ConnectionError("Request not recorded in the archive: {} {}".format(method, url))
+        if row[0] == TransportArchive.status_error:
+            raise requests.exceptions.ConnectionError(row[5].decode('utf-8'))
+
+        status, final_url, headers, encoding, history, body = row
+        return Response(final_url, status, headers, body, encoding, history)
+
+    def get(self, url, headers=None):
+        return self._load('GET', url)
+
+    def head(self, url, timeout=None):
+        return self._load('HEAD', url)
+
+    def list_ftp(self, host, path, port=None, user=None, password=None):
+        key = 'ftp://{}:{}{}'.format(host, port or 21, path)
+        row = self._archive.load('LIST', key)
+        if row is None:
+            raise ftplib.Error("Listing not recorded in the archive: {}".format(key))
+        if row[0] == TransportArchive.status_error:
+            raise ftplib.Error(row[5].decode('utf-8'))
+
+        return [(name, is_dir) for name, is_dir in json.loads(row[5].decode('utf-8'))]
+
+    def retrieve(self, url, callback, chunk_size=65536, timeout=None):
+        raise requests.exceptions.ConnectionError("Files downloaded are not recorded in the archive: {}".format(url))
+
+    def close(self):
+        self._archive.close()
+
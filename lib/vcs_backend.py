@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import os
+import asyncio
+import logging
+import collections
+import xml.etree.ElementTree as ElementTree
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class VcsError(Exception):
+    """ Error of a git or svn command
+    """
+
+    def __init__(self, command, returncode, stderr):
+        super().__init__("Command '{}' failed ({}): {}".format(' '.join(command), returncode, stderr.strip()))
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class VcsBackend(object):
+    """ Run the git and svn commands with asyncio subprocesses.
+    The commands waiting on the network overlap, up to max_parallel at the same time,
+    without taking a worker of the pool used to parse and match.
+    """
+
+    # The commands never ask a password
+    environment = {'GIT_TERMINAL_PROMPT': '0', 'GIT_ASKPASS': 'echo', 'LC_ALL': 'C'}
+
+    def __init__(self, max_parallel=16, timeout=600):
+        self._max_parallel = max_parallel
+        self._timeout = timeout
+        # Semaphore and locks of the running event loop
+        self._loop = None
+        self._semaphore = None
+        self._locks = {}
+
+    def _get_loop_state(self):
+        """ Create the semaphore and the locks for the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._max_parallel)
+            self._locks = {}
+
+        return self._semaphore, self._locks
+
+    def lock(self, key):
+        """ Return the lock of a key (e.g. a repository) for the coroutines of the running event loop
+        """
+        _, locks = self._get_loop_state()
+        if key not in locks:
+            locks[key] = asyncio.Lock()
+
+        return locks[key]
+
+    async def run(self, *command, cwd=None):
+        """ Run a command and return its output
+        Raise VcsError if the command fails or lasts more than timeout
+        """
+        semaphore, _ = self._get_loop_state()
+        async with semaphore:
+            _LOGGER.debug("Run: %s", ' '.join(command))
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, cwd=cwd, stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    env=dict(os.environ, **self.environment))
+            except OSError as e:
+                raise VcsError(command, None, str(e))
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), self._timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise VcsError(command, None, 'Timeout after {}s'.format(self._timeout))
+
+        if process.returncode != 0:
+            raise VcsError(command, process.returncode, stderr.decode('utf-8', 'replace'))
+
+        return stdout.decode('utf-8', 'replace')
+
+    async def git(self, *args, cwd=None):
+        return await self.run('git', *args, cwd=cwd)
+
+    async def svn(self, *args, cwd=None):
+        return await self.run('svn', '--non-interactive', *args, cwd=cwd)
+
+    async def git_new_versions(self, path, git_hash):
+        """ Return the new versions of a git repository after a hash, in the order of git log
+        With tags: the tagged commits (name of the tag), otherwise all the commits (hash)
+        """
+        # Peeled hash (*objectname) is the commit of an annotated tag
+        refs = await self.git('for-each-ref', '--format=%(refname:short) %(objectname) %(*objectname)', 'refs/tags', cwd=path)
+        tags = {}
+        for line in refs.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                # The first tag in the order of the names
+                tags.setdefault(parts[-1], parts[0])
+
+        new_versions = collections.OrderedDict()
+        for commit in (await self.git('rev-list', git_hash + '..HEAD', cwd=path)).split():
+            if not tags:
+                new_versions[commit] = {'hash': commit}
+            elif commit in tags:
+                new_versions[tags[commit]] = {'hash': tags[commit]}
+
+        return new_versions
+
+    async def svn_new_revisions(self, path, revision):
+        """ Return the revisions of the /tags directory of a svn working copy from a revision, in ascending order
+        """
+        log = await self.svn('log', '--xml', '-r', '{}:HEAD'.format(revision), '^/tags', cwd=path)
+
+        return [entry.get('revision') for entry in ElementTree.fromstring(log).iter('logentry')]
+
+    def run_sync(self, coroutine):
+        """ Run a coroutine in a new event loop and return its result
+        """
+        return asyncio.run(coroutine)
+
+    def run_all(self, coroutines, callback=None, iterator=None):
+        """ Run coroutines concurrently and return their results in the order of completion
+        callback is called with each result as soon as it is available
+        iterator: blocking iterator (e.g. the results of a pool) whose items are also passed to callback while the coroutines run.
+        The callback is always called in the thread of the event loop.
+        """
+        async def drain():
+            loop = asyncio.get_running_loop()
+            end = object()
+            while True:
+                item = await loop.run_in_executor(None, next, iterator, end)
+                if item is end:
+                    return
+                if callback:
+                    callback(item)
+
+        async def gather():
+            drain_task = asyncio.ensure_future(drain()) if iterator is not None else None
+            results = []
+            for future in asyncio.as_completed(coroutines):
+                result = await future
+                if callback:
+                    callback(result)
+                results.append(result)
+
+            if drain_task:
+                await drain_task
+
+            return results
+
+        return self.run_sync(gather())
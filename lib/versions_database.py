@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class VersionsDatabase(object):
+    """ Persistent history of the upstream versions found by the searches.
+    A version keeps the date (and the run) of its first and last discovery,
+    a package keeps the date since it has a new version available.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started REAL NOT NULL,
+            finished REAL
+        );
+        CREATE TABLE IF NOT EXISTS versions (
+            package TEXT NOT NULL,
+            version TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            first_run INTEGER NOT NULL,
+            last_run INTEGER NOT NULL,
+            is_prerelease INTEGER NOT NULL DEFAULT 0,
+            urls TEXT NOT NULL DEFAULT '[]',
+            PRIMARY KEY (package, version)
+        );
+        CREATE INDEX IF NOT EXISTS versions_first_seen ON versions (first_seen);
+        CREATE INDEX IF NOT EXISTS versions_first_run ON versions (first_run);
+        CREATE TABLE IF NOT EXISTS packages (
+            package TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            next_version TEXT,
+            checked REAL NOT NULL,
+            outdated_since REAL
+        );
+        CREATE INDEX IF NOT EXISTS packages_outdated_since ON packages (outdated_since);
+        CREATE TABLE IF NOT EXISTS searches (
+            package TEXT PRIMARY KEY,
+            duration REAL NOT NULL,
+            last_duration REAL NOT NULL,
+            searches INTEGER NOT NULL,
+            first_searched REAL,
+            last_searched REAL NOT NULL,
+            last_changed REAL
+        );
+    """
+
+    # Weight of the last search in the expected duration of a package
+    duration_weight = 0.5
+
+    # Seconds waited for the lock of a database written by another process (workers, serve and watch)
+    timeout = 60.0
+
+    def __init__(self, path):
+        self._path = path
+        parent_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+
+        self._connection = sqlite3.connect(path, timeout=VersionsDatabase.timeout)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(VersionsDatabase.schema)
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def commit(self):
+        """ Commit the writes of a package: the database is not locked for the other processes during the whole run
+        """
+        self._connection.commit()
+
+    def start_run(self, now=None):
+        """ Register a new run and return its id
+        """
+        cursor = self._connection.execute("INSERT INTO runs (started) VALUES (?)", (now or time.time(),))
+        self._connection.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, now=None):
+        """ Set the end of a run
+        """
+        self._connection.execute("UPDATE runs SET finished = ? WHERE id = ?", (now or time.time(), run_id))
+        self._connection.commit()
+
+    def get_last_run(self):
+        """ Return the id of the last finished run
+        """
+        row = self._connection.execute("SELECT MAX(id) FROM runs WHERE finished IS NOT NULL").fetchone()
+        return row[0]
+
+    def add_versions(self, run_id, package, versions, now=None):
+        """ Add or update the versions found for a package
+        """
+        now = now or time.time()
+        self._connection.executemany("""
+            INSERT INTO versions (package, version, first_seen, last_seen, first_run, last_run, is_prerelease, urls)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (package, version) DO UPDATE SET
+                last_seen = excluded.last_seen, last_run = excluded.last_run, urls = excluded.urls
+        """, [(package, version, now, now, run_id, run_id, int(bool(info.get('is_prerelease', False))),
+               json.dumps([url['full'] for url in info.get('urls', [])]))
+              for version, info in versions.items()])
+
+    def set_package(self, package, version, next_version, now=None):
+        """ Set the current and the next version of a package
+        A package is outdated since the first discovery of its next version
+        """
+        now = now or time.time()
+        outdated_since = None
+        if next_version and next_version != version:
+            row = self._connection.execute("SELECT version, outdated_since FROM packages WHERE package = ?", (package,)).fetchone()
+            if row and row['version'] == version and row['outdated_since'] is not None:
+                outdated_since = row['outdated_since']
+            else:
+                row = self._connection.execute("SELECT first_seen FROM versions WHERE package = ? AND version = ?", (package, next_version)).fetchone()
+                outdated_since = row['first_seen'] if row else now
+
+        self._connection.execute("""
+            INSERT OR REPLACE INTO packages (package, version, next_version, checked, outdated_since)
+            VALUES (?, ?, ?, ?, ?)
+        """, (package, version, next_version or None, now, outdated_since))
+
+    def add_search(self, run_id, package, duration, now=None):
+        """ Add the duration of the search of a package, after its versions
+        The expected duration is a moving average of the durations of the searches,
+        the package changed if a version was found for the first time during the run.
+        The history of a package starts with its first search: the versions found by this search are a change.
+        """
+        now = now or time.time()
+        changed = self._connection.execute("SELECT 1 FROM versions WHERE package = ? AND first_run = ? LIMIT 1", (package, run_id)).fetchone()
+        row = self._connection.execute("SELECT * FROM searches WHERE package = ?", (package,)).fetchone()
+        if row:
+            expected = self.duration_weight * duration + (1 - self.duration_weight) * row['duration']
+            searches = row['searches'] + 1
+            first_searched = row['first_searched']
+            last_changed = now if changed else row['last_changed']
+        else:
+            expected, searches, first_searched, last_changed = duration, 1, now, now if changed else None
+
+        self._connection.execute("""
+            INSERT OR REPLACE INTO searches (package, duration, last_duration, searches, first_searched, last_searched, last_changed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (package, expected, duration, searches, first_searched, now, last_changed))
+
+    def get_searches(self):
+        """ Return the history of the searches of the packages: package => expected duration, first and last search, last change
+        """
+        return {row['package']: self._row_to_dict(row) for row in self._connection.execute("SELECT * FROM searches")}
+
+    def get_new_versions(self, since=None, run_id=None):
+        """ Return the versions found for the first time since a date, or during a run (the last one by default)
+        """
+        if since is not None:
+            query = "SELECT * FROM versions WHERE first_seen >= ? ORDER BY package, first_seen"
+            args = (since,)
+        else:
+            query = "SELECT * FROM versions WHERE first_run = ? ORDER BY package, first_seen"
+            args = (run_id or self.get_last_run(),)
+
+        return [self._row_to_dict(row) for row in self._connection.execute(query, args)]
+
+    def get_outdated(self, days, now=None):
+        """ Return the packages with a new version available for more than some days
+        """
+        limit = (now or time.time()) - days * 86400
+        query = "SELECT * FROM packages WHERE outdated_since IS NOT NULL AND outdated_since <= ? ORDER BY outdated_since, package"
+
+        return [self._row_to_dict(row) for row in self._connection.execute(query, (limit,))]
+
+    @staticmethod
+    def _row_to_dict(row):
+        result = dict(row)
+        if 'urls' in result:
+            result['urls'] = json.loads(result['urls'])
+        if 'is_prerelease' in result:
+            result['is_prerelease'] = bool(result['is_prerelease'])
+
+        return result
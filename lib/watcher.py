@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import logging
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Watcher(object):
+    """ Watch the Makefiles of the packages of a spksrc directory.
+    inotify is used when inotify_simple is installed, otherwise the Makefiles are polled.
+    In both cases the changes are found by comparing the modification times of the Makefiles.
+    """
+
+    def __init__(self, root, directories, interval=2.0, debounce=1.0, use_inotify=True):
+        self._root = root
+        self._directories = directories
+        self._interval = interval
+        self._debounce = debounce
+        self._inotify = None
+        if use_inotify and INotify is not None:
+            self._inotify = INotify()
+        self._snapshot = self._get_snapshot()
+
+        _LOGGER.info("Watcher: Watch %d packages with %s", len(self._snapshot), 'inotify' if self._inotify else 'polling')
+
+    def _get_snapshot(self):
+        """ Return the modification time of the Makefile of each package
+        """
+        snapshot = {}
+        for directory in self._directories:
+            path = os.path.join(self._root, directory)
+            if not os.path.isdir(path):
+                continue
+
+            if self._inotify:
+                self._inotify.add_watch(path, flags.CREATE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM)
+
+            for filename in os.listdir(path):
+                package_path = os.path.join(path, filename)
+                makefile = os.path.join(package_path, 'Makefile')
+                try:
+                    snapshot[directory + os.path.sep + filename] = os.stat(makefile).st_mtime_ns
+                except OSError:
+                    continue
+
+                if self._inotify:
+                    self._inotify.add_watch(package_path, flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.MOVED_TO)
+
+        return snapshot
+
+    def _get_changes(self):
+        """ Return the packages added, modified or deleted since the last snapshot
+        """
+        snapshot = self._get_snapshot()
+        changes = set(snapshot.keys()) ^ set(self._snapshot.keys())
+        changes |= set(p for p, mtime in snapshot.items() if p in self._snapshot and self._snapshot[p] != mtime)
+        self._snapshot = snapshot
+
+        return changes
+
+    def _wait_event(self, timeout):
+        """ Wait for a file system event (or the timeout when polling)
+        Return True if an event was received
+        """
+        if self._inotify:
+            return len(self._inotify.read(timeout=int(timeout * 1000))) > 0
+
+        time.sleep(timeout)
+        return True
+
+    def wait_changes(self):
+        """ Block until some Makefiles are changed and return the packages changed
+        A burst of changes is returned once no change happens during the debounce delay
+        """
+        while True:
+            # The Makefiles are compared on a timeout of inotify too: a Makefile created in a new directory
+            # is missed when it is written before the directory is watched
+            self._wait_event(self._interval)
+            changes = self._get_changes()
+            if not changes:
+                continue
+
+            # Debounce: wait until the files stop changing
+            while self._wait_event(self._debounce):
+                new_changes = self._get_changes()
+                if not new_changes:
+                    break
+                changes |= new_changes
+
+            return sorted(changes)
@@ -0,0 +1,2 @@
+#!/usr/bin/env bash
+python benchmarks/run_benchmarks.py "$@"
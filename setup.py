@@ -23,7 +23,6 @@ setup(
         'pyparsing>=2.2.0',
         'python-dateutil>=2.7.2',
         'requests>=2.18.4',
-        'svn>=0.3.44',
     ],
     package_dir={'spksrc_updater': 'lib'},
     packages=["spksrc_updater"],